@@ -0,0 +1,19 @@
+"""benchmarks for dtactions
+
+These scripts generate synthetic inifiles and time the inivars (and action) machinery.
+They run offline, also on Linux, and are not collected by pytest (see testpaths in pyproject.toml).
+
+Run one benchmark as a module from the root of the project, eg:
+
+```
+python -m benchmarks.bench_snapshot
+```
+
+The suite of inivars (parse, lookup, typed access, quoting and write) writes its results
+to a JSON file, to compare runs over time:
+
+```
+python -m benchmarks.suite --output before.json
+python -m benchmarks.suite --compare before.json
+```
+"""
@@ -0,0 +1,139 @@
+"""benchmark the action compiler: parse action strings at each call, or take the cached plans
+
+python -m benchmarks.bench_actions
+
+The actions of the sample unimacroactions.ini are performed on a recording backend
+(outputbackend.RecordingBackend, which only records the keystrokes, commands and
+Dragon scripts), with the meta actions resolved via the sample inifile, so the time
+is the time of parsing and dispatching.
+"""
+import time
+from pathlib import Path
+
+import dtactions
+from dtactions import inivars
+from dtactions import actioncompiler
+from dtactions import outputbackend
+
+commandNames = ['W', 'SSK', 'MP', 'RW', 'WTC', 'COPYNAME', 'COPYPATH', 'TASKMAX', 'TASKMIN',
+                'TASKRESTORE', 'TASKOD', 'ALERT', 'WINKEY', 'PRINT', 'F']
+natspeakCommands = ['HeardWord', 'SendSystemKeys']
+
+def makeCommands(backend):
+    """return a dict name -> function for the USC commands (recording their calls)"""
+    def makeCommand(name):
+        def command(*args, **kw):
+            backend.record('command', name, args)
+            return 1
+        command.__name__ = 'do_' + name
+        return command
+    return {name: makeCommand(name) for name in commandNames}
+
+def runSteps(compiler, steps, ini, sectionList, backend, metaCache=None):
+    """perform steps as doAction does (without the pauses), return the number of steps done
+
+    the meta actions are looked up in ini, or via metaCache (a MetaActionCache) if given
+    """
+    n = 0
+    for step in steps:
+        kind = type(step)
+        if kind is actioncompiler.Keystrokes:
+            for chunk in compiler.compileKeystrokes(step.keys).chunks:
+                backend.sendKeys(chunk)
+        elif kind is actioncompiler.MetaAction:
+            if metaCache is None:
+                A, number, _actionName = actioncompiler.parseMetaName(step.name)
+                expansion = ini.get(sectionList, A, None)
+                if expansion and number:
+                    expansion = actioncompiler.metaNumberBack.sub(number, expansion)
+            else:
+                expansion = metaCache.get(step.name, sectionList, getMetaLookup(ini))
+            if expansion:
+                n += runSteps(compiler, compiler.compileExpansion(expansion), ini, sectionList, backend,
+                              metaCache)
+        elif kind is actioncompiler.Command:
+            if isinstance(backend, outputbackend.BatchingBackend):
+                backend.flush()   # a USC command is a boundary of the keystroke batches
+            step.func(*(step.args or ()))
+        elif kind is actioncompiler.Sequence:
+            n += runSteps(compiler, step.steps, ini, sectionList, backend, metaCache)
+        else:
+            backend.execScript(step.script)
+        n += 1
+    return n
+
+def getMetaLookup(ini):
+    """return the lookup function of a MetaActionCache for ini"""
+    def lookup(A, sectionList):
+        return ini.get(sectionList, A, None)
+    return lookup
+
+def getSampleActions(ini):
+    """return all (non empty) actions of the sample inifile, and a few composed ones"""
+    actions = [ini.get(s, k) for s in ini.get() if not s.startswith(('bringup', 'positions'))
+               for k in ini.get(s)]
+    actions = [a for a in actions if a and not a.replace('.', '').isdigit()]
+    actions += ['<<realhome>>{shift+down}; <<copy>>; W 0.1; <<paste>>', 'SSK({enter}); HeardWord hello',
+                '{ctrl+home}{extdown 4}{shift+end}', '<<selectline>> USC <<duplicate>>',
+                '<<selectdown 3>>', '<<selectup 12>>']
+    return actions
+
+def run(rounds=20):
+    """return a list of (name, microseconds per action)
+    """
+    ini = inivars.IniVars(Path(dtactions.getDtactionsDirectory())/'samples'/'unimacroactions.ini')
+    actions = getSampleActions(ini)
+    sectionList = ['excel', 'default']
+    backend = outputbackend.RecordingBackend()
+    compiler = actioncompiler.ActionCompiler(makeCommands(backend).get, natspeakCommands)
+    metaCache = actioncompiler.MetaActionCache()
+    results = []
+    for name, clear, cache in [('parse each time', True, None), ('cached plans', False, None),
+                               ('+ meta cache', False, metaCache)]:
+        compiler.clear()
+        best = None
+        for _i in range(rounds):
+            t0 = time.perf_counter()
+            for action in actions:
+                if clear:
+                    compiler.clear()
+                plan = compiler.compile(action)
+                runSteps(compiler, plan.steps, ini, sectionList, backend, cache)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+            backend.clear()
+        results.append((name, best/len(actions)*1e6))
+    return results
+
+def countOutput():
+    """return a list of (name, keystroke events, sendKeys calls) for all sample actions,
+    sending each keystroke part, or batching the keystrokes of an action (BatchingBackend)
+    """
+    ini = inivars.IniVars(Path(dtactions.getDtactionsDirectory())/'samples'/'unimacroactions.ini')
+    actions = getSampleActions(ini)
+    sectionList = ['excel', 'default']
+    results = []
+    for name, batching in [('per part', False), ('batched', True)]:
+        recorder = outputbackend.RecordingBackend()
+        backend = outputbackend.BatchingBackend(recorder)
+        compiler = actioncompiler.ActionCompiler(makeCommands(recorder).get, natspeakCommands)
+        for action in actions:
+            if batching:
+                backend.begin()
+            runSteps(compiler, compiler.compile(action).steps, ini, sectionList, backend)
+            backend.end()
+        metrics = backend.getMetrics()
+        results.append((name, metrics['keyEvents'], metrics['keyCalls']))
+    return results
+
+def main():
+    print('%18s %16s'% ('sample actions', 'us per action'))
+    for name, micro in run():
+        print('%18s %16.2f'% (name, micro))
+    print()
+    print('%18s %16s %16s'% ('keystrokes', 'events', 'sendkeys calls'))
+    for name, events, calls in countOutput():
+        print('%18s %16s %16s'% (name, events, calls))
+
+if __name__ == "__main__":
+    main()
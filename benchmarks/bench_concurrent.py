@@ -0,0 +1,80 @@
+"""stress test: many reader threads and one writer, read throughput with and without ConcurrentIniVars
+
+python -m benchmarks.bench_concurrent
+
+The readers do the lookups of an action (get via a section list, getList and
+getSectionsWithPrefix with a window title), the writer changes keys and adds and
+deletes sections all the time. Errors of the readers (eg a dict changed during
+iteration) are counted.
+"""
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from dtactions import inivars
+from benchmarks.inifiles import writeIniFile
+
+def stress(ini, nReaders=8, seconds=1.0):
+    """return (reads per second, number of writes, list of errors) of nReaders readers and one writer
+    """
+    stop = threading.Event()
+    counts = [0]*nReaders
+    errors = []
+    sectionList = ['code project 20', 'code', 'default']
+
+    def reader(i):
+        n = 0
+        try:
+            while not stop.is_set():
+                ini.get(sectionList, 'key 9 1')
+                ini.getList('chrome', 'key 3 2')
+                ini.getSectionsWithPrefix('code', 'project 20 - code')
+                n += 1
+        except Exception as exc:   #pylint:disable=W0703
+            errors.append(exc)
+        counts[i] = n
+
+    writes = [0]
+    def writer():
+        n = 0
+        while not stop.is_set():
+            ini.set('code', 'key 9 1', '{ctrl+%s}'% (n % 10))
+            ini.set('code extra %s'% n, 'key', 'value')
+            if n:
+                ini.delete('code extra %s'% (n - 1))
+            n += 1
+            time.sleep(0.0005)
+        writes[0] = n
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(nReaders)]
+    threads.append(threading.Thread(target=writer))
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    return sum(counts)/elapsed, writes[0], errors
+
+def run(nLines=20000, nReaders=8, seconds=1.0):
+    """return a list of (name, reads per second, writes, number of reader errors)
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        iniPath = writeIniFile(Path(tmp)/'actions.ini', nLines)
+        for name, ini in [('IniVars', inivars.IniVars(iniPath)),
+                          ('ConcurrentIniVars', inivars.IniVars.openConcurrent(iniPath))]:
+            readsPerSecond, writes, errors = stress(ini, nReaders=nReaders, seconds=seconds)
+            results.append((name, readsPerSecond, writes, len(errors)))
+    return results
+
+def main():
+    print('%18s %14s %10s %10s'% ('8 readers', 'reads/s', 'writes', 'errors'))
+    for name, readsPerSecond, writes, nErrors in run():
+        print('%18s %14.0f %10s %10s'% (name, readsPerSecond, writes, nErrors))
+
+if __name__ == "__main__":
+    main()
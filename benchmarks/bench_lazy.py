@@ -0,0 +1,52 @@
+"""compare opening an inifile lazily (IniVars.openLazy) with a full parse (IniVars)
+
+python -m benchmarks.bench_lazy
+
+For each file size: the time to open and get one key from one section, and the peak
+memory (tracemalloc) of doing so.
+"""
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from dtactions import inivars
+from benchmarks.inifiles import writeIniFile, timeIt
+
+sizes = [10000, 100000, 1000000]
+
+def openAndGet(opener, iniPath, section):
+    ini = opener(iniPath)
+    return ini.get(section, ini.get(section)[0])
+
+def measurePeak(func):
+    """return the peak memory in bytes of calling func"""
+    tracemalloc.start()
+    try:
+        func()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def run(sizes=None, repeat=3):
+    """return a list of (nLines, megabytes, name, seconds, peak bytes)
+    """
+    results = []
+    openers = [('full', inivars.IniVars), ('lazy', inivars.IniVars.openLazy)]
+    with tempfile.TemporaryDirectory() as tmp:
+        for nLines in sizes or globals()['sizes']:
+            iniPath = writeIniFile(Path(tmp)/('bench%s.ini'% nLines), nLines)
+            megabytes = iniPath.stat().st_size/1e6
+            section = inivars.IniVars.openLazy(iniPath).get()[-1]
+            for name, opener in openers:
+                func = lambda opener=opener: openAndGet(opener, iniPath, section)
+                results.append((nLines, megabytes, name, timeIt(func, repeat=repeat), measurePeak(func)))
+    return results
+
+def main():
+    print('%10s %8s %6s %12s %12s'% ('lines', 'MB', 'open', 'time (ms)', 'peak (MB)'))
+    for nLines, megabytes, name, seconds, peak in run():
+        print('%10s %8.1f %6s %12.2f %12.2f'% (nLines, megabytes, name, seconds*1000, peak/1e6))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""startup benchmark: load 50 generated inifiles one by one, or with IniVars.loadMany
+
+python -m benchmarks.bench_loadmany
+"""
+import os
+import tempfile
+from pathlib import Path
+
+from dtactions import inivars
+from benchmarks.inifiles import writeIniFile, timeIt
+
+def run(nFiles=50, nLines=2000, workers=None, repeat=3):
+    """return a list of (name, seconds to load all files)
+    """
+    workers = workers or min(8, os.cpu_count() or 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        files = [writeIniFile(Path(tmp)/('grammar%s.ini'% i), nLines, seed=i) for i in range(nFiles)]
+        return [('sequential', timeIt(lambda: [inivars.IniVars(f) for f in files], repeat=repeat)),
+                ('threads (%s)'% workers,
+                 timeIt(lambda: inivars.IniVars.loadMany(files, workers=workers), repeat=repeat)),
+                ('processes (%s)'% workers,
+                 timeIt(lambda: inivars.IniVars.loadMany(files, workers=workers, processes=True), repeat=repeat))]
+
+def main():
+    print('%18s %12s'% ('50 files', 'time (ms)'))
+    for name, seconds in run():
+        print('%18s %12.1f'% (name, seconds*1000))
+
+if __name__ == "__main__":
+    main()
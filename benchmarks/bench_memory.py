@@ -0,0 +1,75 @@
+"""measure the memory of a parsed inifile (tracemalloc) and the time of item access
+
+python -m benchmarks.bench_memory
+
+Two shapes of inifiles: the synthetic unimacroactions like file (see inifiles.py)
+and a word list like file, with many small sections that have the same keys.
+"""
+import gc
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from dtactions import inivars
+from benchmarks.inifiles import writeIniFile, timeIt
+
+wordListKeys = ['word', 'spoken form', 'written form', 'property']
+
+def writeWordListFile(path, nSections):
+    """write an inifile with nSections sections, each with the keys of wordListKeys
+    """
+    lines = []
+    for i in range(nSections):
+        lines.append('[word %s]'% i)
+        lines.extend('%s = value %s %s'% (k, i, j) for j, k in enumerate(wordListKeys))
+        lines.append('')
+    path = Path(path)
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return path
+
+def measureMemory(iniPath):
+    """return (retained bytes, peak bytes) of parsing iniPath into an IniVars instance
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        ini = inivars.IniVars(iniPath)
+        ini._rawtext = ''     # the text of the file is not counted
+        gc.collect()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del ini
+    return retained, peak
+
+def measureAccess(iniPath, repeat=3):
+    """return the time in seconds of one get through the mapping API (ini[section][key])
+    """
+    ini = inivars.IniVars(iniPath)
+    pairs = [(' %s '% s, '%s '% k) for s in ini.get() for k in ini.get(s)]
+    def access():
+        for s, k in pairs:
+            _value = ini[s][k]
+    return timeIt(access, repeat=repeat)/len(pairs)
+
+def run(sizes=None):
+    """return a list of (name, nSections, retained bytes, peak bytes, seconds per access)
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for nSections in sizes or [1000, 10000]:
+            paths = [('unimacro', writeIniFile(Path(tmp)/('bench%s.ini'% nSections), nSections*16)),
+                     ('wordlist', writeWordListFile(Path(tmp)/('words%s.ini'% nSections), nSections))]
+            for name, iniPath in paths:
+                n = len(inivars.IniVars(iniPath).get())
+                retained, peak = measureMemory(iniPath)
+                results.append((name, n, retained, peak, measureAccess(iniPath)))
+    return results
+
+def main():
+    print('%10s %10s %14s %14s %14s'% ('file', 'sections', 'retained (kB)', 'peak (kB)', 'access (us)'))
+    for name, n, retained, peak, seconds in run():
+        print('%10s %10s %14.0f %14.0f %14.3f'% (name, n, retained/1024, peak/1024, seconds*1e6))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""benchmark getKeysOrderedFromSections and get(list of sections) on many sections and keys
+
+python -m benchmarks.bench_mergekeys
+
+listMerge is the former list based merge (membership test on a list), as a reference.
+"""
+import random
+
+from dtactions import inivars
+from benchmarks.inifiles import timeIt
+
+def makeIniVars(nSections, nKeys, nDistinct, seed=1):
+    """return an (in memory) IniVars instance, nSections sections with nKeys keys each,
+    taken from nDistinct different key names (so many keys are in more sections)
+    """
+    rand = random.Random(seed)
+    ini = inivars.IniVars('bench_mergekeys.ini')
+    for s in range(nSections):
+        section = inivars.IniSection(parent=ini)
+        for k in rand.sample(range(nDistinct), nKeys):
+            dict.__setitem__(section, 'key %s'% k, 'value')
+        ini['section %s'% s] = section
+    return ini
+
+def listMerge(ini, sectionList):
+    """the former implementation of getKeysOrderedFromSections"""
+    allKeys = []
+    D = {}
+    for s in sectionList:
+        D[s] = []
+        for k in ini.get(s):
+            if k not in allKeys:
+                D[s].append(k)
+                allKeys.append(k)
+    return D
+
+cases = [(100, 100, 5000), (300, 100, 20000)]
+
+def run(repeat=3):
+    """return a list of (nSections, total keys, seconds list merge, seconds ordered, seconds get(list))
+    """
+    results = []
+    for nSections, nKeys, nDistinct in cases:
+        ini = makeIniVars(nSections, nKeys, nDistinct)
+        sectionList = ini.get()
+        assert listMerge(ini, sectionList) == ini.getKeysOrderedFromSections(sectionList)
+        results.append((nSections, nSections*nKeys,
+                        timeIt(lambda: listMerge(ini, sectionList), repeat=repeat),
+                        timeIt(lambda: ini.getKeysOrderedFromSections(sectionList), repeat=repeat),
+                        timeIt(lambda: ini.get(sectionList), repeat=repeat)))
+    return results
+
+def main():
+    print('%10s %10s %16s %16s %16s'% ('sections', 'keys', 'list merge (ms)', 'ordered (ms)', 'get(list) (ms)'))
+    for nSections, nKeys, old, new, getList in run():
+        print('%10s %10s %16.1f %16.2f %16.2f'% (nSections, nKeys, old*1000, new*1000, getList*1000))
+
+if __name__ == "__main__":
+    main()
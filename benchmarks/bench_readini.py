@@ -0,0 +1,31 @@
+"""benchmark the throughput of IniVars._readIni in lines per second
+
+python -m benchmarks.bench_readini
+"""
+import tempfile
+from pathlib import Path
+
+from dtactions import inivars
+from benchmarks.inifiles import writeIniFile, timeIt
+
+sizes = [1000, 10000, 100000]
+
+def run(sizes=None, repeat=3):
+    """return a list of (nLines, seconds, linesPerSecond)
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for nLines in sizes or globals()['sizes']:
+            iniPath = writeIniFile(Path(tmp)/('bench%s.ini'% nLines), nLines)
+            realLines = len(iniPath.read_text(encoding='utf-8').split('\n'))
+            seconds = timeIt(lambda: inivars.IniVars(iniPath), repeat=repeat)
+            results.append((realLines, seconds, realLines/seconds))
+    return results
+
+def main():
+    print('%10s %12s %14s'% ('lines', 'parse (ms)', 'lines/second'))
+    for nLines, seconds, speed in run():
+        print('%10s %12.2f %14.0f'% (nLines, seconds*1000, speed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""compare repeated getInt/getList/getBool calls with the attributes of a compiled schema
+
+python -m benchmarks.bench_schema
+"""
+import tempfile
+from pathlib import Path
+
+from dtactions import inivars
+from benchmarks.inifiles import timeIt
+
+settingsText = """[general]
+pause between keys = 10
+pause between actions = 25
+programs = word; excel; chrome; code
+debug = F
+"""
+schema = {'general': {'pause between keys': int, 'pause between actions': int,
+                      'programs': list, 'debug': bool}}
+
+def run(nReads=100000, repeat=3):
+    """return a list of (name, seconds per read of the four settings)
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        iniPath = Path(tmp)/'settings.ini'
+        iniPath.write_text(settingsText, encoding='utf-8')
+        ini = inivars.IniVars(iniPath)
+
+        def withGetters():
+            for _i in range(nReads):
+                ini.getInt('general', 'pause between keys')
+                ini.getInt('general', 'pause between actions')
+                ini.getList('general', 'programs')
+                ini.getBool('general', 'debug')
+
+        settings = ini.compileSchema(schema)
+        def withSchema():
+            general = settings.general
+            for _i in range(nReads):
+                _a = general.pause_between_keys
+                _b = general.pause_between_actions
+                _c = general.programs
+                _d = general.debug
+
+        compileTime = timeIt(lambda: ini.compileSchema(schema), repeat=repeat)
+        return [('get functions', timeIt(withGetters, repeat=repeat)/nReads),
+                ('schema', timeIt(withSchema, repeat=repeat)/nReads),
+                ('compileSchema (once)', compileTime)]
+
+def main():
+    print('%22s %16s'% ('', 'time (us)'))
+    for name, seconds in run():
+        print('%22s %16.3f'% (name, seconds*1e6))
+
+if __name__ == "__main__":
+    main()
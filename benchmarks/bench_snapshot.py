@@ -0,0 +1,37 @@
+"""benchmark the parsed-snapshot cache of IniVars: cold parse versus warm load
+
+python -m benchmarks.bench_snapshot
+"""
+import tempfile
+from pathlib import Path
+
+from dtactions import inivars
+from benchmarks.inifiles import writeIniFile, timeIt
+
+sizes = [1000, 10000, 100000]
+
+def run(sizes=None, repeat=3):
+    """return a list of (nLines, coldSeconds, warmSeconds)
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmpPath = Path(tmp)
+        cacheDir = tmpPath/'cache'
+        for nLines in sizes or globals()['sizes']:
+            iniPath = writeIniFile(tmpPath/('bench%s.ini'% nLines), nLines)
+            cold = timeIt(lambda: inivars.IniVars(iniPath), repeat=repeat)
+            inivars.IniVars(iniPath, snapshotCache=cacheDir)   # write the snapshot
+            def warmLoad():
+                ini = inivars.IniVars(iniPath, snapshotCache=cacheDir)
+                assert ini._fromSnapshot
+            warm = timeIt(warmLoad, repeat=repeat)
+            results.append((nLines, cold, warm))
+    return results
+
+def main():
+    print('%10s %12s %12s %8s'% ('lines', 'cold (ms)', 'warm (ms)', 'speedup'))
+    for nLines, cold, warm in run():
+        print('%10s %12.2f %12.2f %8.1f'% (nLines, cold*1000, warm*1000, cold/warm))
+
+if __name__ == "__main__":
+    main()
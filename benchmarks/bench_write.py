@@ -0,0 +1,53 @@
+"""benchmark writing a large inifile when one key changes per write
+
+compares the round-trip writer (only the changed section is rendered again)
+with rendering all sections sorted (the previous behaviour of _writeIni).
+
+python -m benchmarks.bench_write
+"""
+import tempfile
+from pathlib import Path
+
+from dtactions import inivars
+from benchmarks.inifiles import writeIniFile, timeIt
+
+sizes = [10000, 100000]
+
+def run(sizes=None, nWrites=20):
+    """return a list of (nLines, sortedSeconds, roundTripSeconds, writeIfChangedSeconds), per write
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for nLines in sizes or globals()['sizes']:
+            iniPath = writeIniFile(Path(tmp)/('bench%s.ini'% nLines), nLines)
+            ini = inivars.IniVars(iniPath)
+            sections = ini.get()
+            counter = iter(range(10**9))
+            def changeOneKey():
+                i = next(counter)
+                s = sections[i % len(sections)]
+                ini.set(s, 'changed key', str(i))
+
+            def sortedWrite():
+                changeOneKey()
+                ini._rwfile.writeAnything(iniPath, ini._renderIniSorted())
+            def roundTripWrite():
+                changeOneKey()
+                ini.write()
+            def writeIfChanged():
+                changeOneKey()
+                ini.writeIfChanged()
+            sortedTime = timeIt(sortedWrite, repeat=nWrites)
+            ini = inivars.IniVars(iniPath)
+            roundTripTime = timeIt(roundTripWrite, repeat=nWrites)
+            ifChangedTime = timeIt(writeIfChanged, repeat=nWrites)
+            results.append((nLines, sortedTime, roundTripTime, ifChangedTime))
+    return results
+
+def main():
+    print('%10s %14s %16s %18s'% ('lines', 'sorted (ms)', 'round trip (ms)', 'writeIfChanged (ms)'))
+    for nLines, sortedTime, roundTripTime, ifChangedTime in run():
+        print('%10s %14.2f %16.2f %18.2f'% (nLines, sortedTime*1000, roundTripTime*1000, ifChangedTime*1000))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""generate synthetic inifiles for the benchmarks
+
+The files resemble unimacroactions.ini and grammar inifiles: sections "prog title"
+and "default ...", short keystroke values, lists, dicts and multiline values.
+"""
+import random
+import time
+from pathlib import Path
+
+progs = ['code', 'excel', 'chrome', 'emacs', 'notepad', 'winword', 'natspeak', 'cmd']
+titleWords = ['document', 'project', 'mail', 'inbox', 'readme', 'python', 'settings', 'search']
+
+def makeIniLines(nLines, seed=1):
+    """return a list of about nLines lines of a valid inifile
+    """
+    rand = random.Random(seed)
+    lines = []
+    nSection = 0
+    while len(lines) < nLines:
+        prog = progs[nSection % len(progs)]
+        if nSection < len(progs):
+            lines.append('[%s]'% prog)
+        else:
+            lines.append('[%s %s %s]'% (prog, rand.choice(titleWords), nSection))
+        nSection += 1
+        for nKey in range(rand.randint(5, 25)):
+            kind = rand.random()
+            key = 'key %s %s'% (nSection, nKey)
+            if kind < 0.6:
+                lines.append('%s = {ctrl+%s}{extdown %s}'% (key, rand.choice('abcdefgh'), nKey))
+            elif kind < 0.8:
+                lines.append('%s = %s'% (key, '; '.join(rand.sample(titleWords, 4))))
+            elif kind < 0.9:
+                lines.append('%s = a, b: %s'% (key, rand.choice(titleWords)))
+            else:
+                lines.append('%s ='% key)
+                lines.extend('    line %s of %s'% (i, key) for i in range(rand.randint(2, 5)))
+        lines.append('')
+    return lines
+
+def makeIniText(nLines, seed=1):
+    """return the text of a synthetic inifile of about nLines lines
+    """
+    return '\n'.join(makeIniLines(nLines, seed=seed)) + '\n'
+
+def makeWindowTitles(sectionNames, n, seed=1):
+    """return a list of n (prog, window title) pairs for the sections of an inifile of makeIniLines
+
+    about half of the titles contain the postfix of a "prog title" section, eg
+    ('chrome', 'mail 10 - Inbox - chrome'), the others match no section.
+    """
+    rand = random.Random(seed)
+    progSections = [s.split(' ', 1) for s in sectionNames if ' ' in s]
+    titles = []
+    for _i in range(n):
+        prog, postfix = rand.choice(progSections)
+        if rand.random() >= 0.5:
+            postfix = ' '.join(rand.sample(titleWords, 2))
+        titles.append((prog, '%s - %s - %s'% (postfix, rand.choice(titleWords).capitalize(), prog)))
+    return titles
+
+def writeIniFile(path, nLines, seed=1):
+    """write a synthetic inifile of about nLines lines to path, return path
+    """
+    path = Path(path)
+    path.write_text(makeIniText(nLines, seed=seed), encoding='utf-8')
+    return path
+
+def timeIt(func, repeat=5):
+    """call func repeat times, return the best time in seconds
+    """
+    best = None
+    for _i in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
@@ -0,0 +1,254 @@
+"""benchmark suite of inivars: parse, lookup, typed access, quoting and write
+
+python -m benchmarks.suite [--lines 10000] [--filter get] [--output results.json] [--compare old.json]
+
+Each benchmark (see the functions with @benchmark below) gets the context of a synthetic
+inifile (see inifiles.py) and returns the function to be timed. As with pytest-benchmark,
+the function is called in rounds (with a number of iterations per round, calibrated so a
+round takes about 10 ms) and min, max, mean, median and stddev (per call) are reported.
+
+The results are written to a JSON file (by default in the directory ".benchmarks", with the
+date and time in the name), together with the version of python, the platform and the git
+commit, so runs can be compared over time (--compare: the ratio with the median of a
+previous run).
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from dtactions import inivars
+from benchmarks.inifiles import writeIniFile, makeWindowTitles
+
+benchmarks = []   # (name, group, function), in the order of definition
+
+def benchmark(group):
+    """register a benchmark function of group, called with a Context, returning the function to time
+    """
+    def register(func):
+        benchmarks.append((func.__name__, group, func))
+        return func
+    return register
+
+class Context:
+    """the synthetic inifile of nLines lines, and the inputs of the benchmarks
+    """
+    def __init__(self, directory, nLines, seed=1):
+        self.nLines = nLines
+        self.iniPath = writeIniFile(Path(directory)/('bench%s.ini'% nLines), nLines, seed=seed)
+        self.ini = inivars.IniVars(self.iniPath)
+        self.sections = self.ini.get()
+        self.titles = makeWindowTitles(self.sections, 200, seed=seed)
+        # section lists as unimacroactions makes them: matching "prog title" sections, prog, default:
+        self.sectionLists = [self.ini.getSectionsWithPrefix(prog, title) + [prog, 'default']
+                             for prog, title in self.titles]
+        self.keys = [(s, k) for s in self.sections for k in self.ini.get(s)]
+        self.rawValues = [self.ini.get(s, k, stripping=None) for s, k in self.keys]
+        self.listKeys = [(s, k) for (s, k), v in zip(self.keys, self.rawValues) if ';' in v]
+        self.dictKeys = [(s, k) for (s, k), v in zip(self.keys, self.rawValues) if ':' in v]
+        self.quotedValues = [inivars.quoteSpecial(v) for v in self.rawValues]
+
+@benchmark('parse')
+def readIni(ctx):
+    """parse the inifile (IniVars(File), so _readIni)"""
+    return lambda: inivars.IniVars(ctx.iniPath)
+
+@benchmark('lookup')
+def getSectionList(ctx):
+    """get a key via a section list (200 lists)"""
+    ini, sectionLists = ctx.ini, ctx.sectionLists
+    keys = [ini.get(sectionList[0]) for sectionList in sectionLists]
+    pairs = [(sectionList, k[len(k)//2] if k else 'missing') for sectionList, k in zip(sectionLists, keys)]
+    def func():
+        for sectionList, key in pairs:
+            ini.get(sectionList, key)
+    return func
+
+@benchmark('lookup')
+def getSectionsWithPrefix(ctx):
+    """find the sections of a prog that match a window title (200 titles)"""
+    ini, titles = ctx.ini, ctx.titles
+    def func():
+        for prog, title in titles:
+            ini.getSectionsWithPrefix(prog, title)
+    return func
+
+@benchmark('typed')
+def getList(ctx):
+    """getList of all list values (cached decoded values)"""
+    ini, keys = ctx.ini, ctx.listKeys
+    def func():
+        for s, k in keys:
+            ini.getList(s, k)
+    return func
+
+@benchmark('typed')
+def getDict(ctx):
+    """getDict of all dict values (cached decoded values)"""
+    ini, keys = ctx.ini, ctx.dictKeys
+    def func():
+        for s, k in keys:
+            ini.getDict(s, k)
+    return func
+
+@benchmark('typed')
+def decodeList(ctx):
+    """getList of all list values, decoding each time (cache dropped)"""
+    ini, keys = ctx.ini, ctx.listKeys
+    def func():
+        ini._invalidateDecoded()
+        for s, k in keys:
+            ini.getList(s, k)
+    return func
+
+@benchmark('typed')
+def decodeDict(ctx):
+    """getDict of all dict values, decoding each time (cache dropped)"""
+    ini, keys = ctx.ini, ctx.dictKeys
+    def func():
+        ini._invalidateDecoded()
+        for s, k in keys:
+            ini.getDict(s, k)
+    return func
+
+@benchmark('quoting')
+def quoteSpecial(ctx):
+    """quoteSpecial of all values"""
+    values = ctx.rawValues
+    quote = inivars.quoteSpecial
+    def func():
+        for v in values:
+            quote(v)
+    return func
+
+@benchmark('quoting')
+def stripSpecial(ctx):
+    """stripSpecial of all (quoted) values"""
+    values = ctx.quotedValues
+    strip = inivars.stripSpecial
+    def func():
+        for v in values:
+            strip(v)
+    return func
+
+@benchmark('write')
+def writeIni(ctx):
+    """_writeIni after a change of one key"""
+    ini = inivars.IniVars(ctx.iniPath)
+    sections = ctx.sections
+    counter = iter(range(10**9))
+    def func():
+        i = next(counter)
+        ini.set(sections[i % len(sections)], 'changed key', str(i))
+        ini._writeIni(ctx.iniPath)
+    return func
+
+def measure(func, minTime=0.2, minRounds=5, maxRounds=1000, roundTime=0.01):
+    """call func in rounds, return the statistics (seconds per call) as a dict
+    """
+    t0 = time.perf_counter()
+    func()
+    once = time.perf_counter() - t0
+    iterations = max(1, int(roundTime/once)) if once > 0 else 1000
+    times = []
+    total = 0.0
+    while len(times) < minRounds or (total < minTime and len(times) < maxRounds):
+        t0 = time.perf_counter()
+        for _i in range(iterations):
+            func()
+        elapsed = time.perf_counter() - t0
+        total += elapsed
+        times.append(elapsed/iterations)
+    mean = statistics.fmean(times)
+    return {'min': min(times), 'max': max(times), 'mean': mean,
+            'median': statistics.median(times),
+            'stddev': statistics.stdev(times) if len(times) > 1 else 0.0,
+            'rounds': len(times), 'iterations': iterations,
+            'ops': 1/mean if mean else None}
+
+def run(nLines=10000, names=None, minTime=0.2):
+    """run the benchmarks (all, or those with a name containing one of names)
+
+    return a list of dicts with name, group, description and stats
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        ctx = Context(tmp, nLines)
+        for name, group, setup in benchmarks:
+            if names and not any(n.lower() in name.lower() for n in names):
+                continue
+            func = setup(ctx)
+            results.append({'name': name, 'group': group, 'description': setup.__doc__,
+                            'stats': measure(func, minTime=minTime)})
+    return results
+
+def getCommit():
+    """return the git commit of the project, None if not known"""
+    try:
+        out = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                             cwd=Path(__file__).parent, timeout=10, check=True)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+def getMachineInfo():
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpuCount': os.cpu_count()}
+
+def saveResults(results, path, params):
+    """write the results (see run) with machine info, commit, date and params to the JSON file path
+    """
+    data = {'datetime': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': getCommit(),
+            'machine': getMachineInfo(),
+            'params': params,
+            'benchmarks': results}
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, indent=2) + '\n', encoding='utf-8')
+    return path
+
+def loadResults(path):
+    """return the benchmarks of a JSON file of saveResults, as a dict name -> stats"""
+    data = json.loads(Path(path).read_text(encoding='utf-8'))
+    return {b['name']: b['stats'] for b in data['benchmarks']}
+
+def defaultOutputPath():
+    return Path('.benchmarks')/('inivars-%s.json'% datetime.datetime.now().strftime('%Y%m%d-%H%M%S'))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark suite of inivars')
+    parser.add_argument('--lines', type=int, default=10000, help='lines of the synthetic inifile')
+    parser.add_argument('--filter', action='append', help='run only benchmarks with this in the name')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds per benchmark')
+    parser.add_argument('--output', help='JSON file for the results (default: .benchmarks/inivars-<datetime>.json)')
+    parser.add_argument('--compare', help='JSON file of a previous run')
+    args = parser.parse_args(argv)
+
+    results = run(nLines=args.lines, names=args.filter, minTime=args.min_time)
+    previous = loadResults(args.compare) if args.compare else {}
+    print('%22s %8s %12s %12s %12s %8s'% ('benchmark', 'group', 'min (us)', 'median (us)', 'stddev (us)',
+                                          'ratio' if previous else ''))
+    for result in results:
+        stats = result['stats']
+        ratio = ''
+        if result['name'] in previous:
+            ratio = '%.2f'% (stats['median']/previous[result['name']]['median'])
+        print('%22s %8s %12.2f %12.2f %12.2f %8s'% (result['name'], result['group'], stats['min']*1e6,
+                                                   stats['median']*1e6, stats['stddev']*1e6, ratio))
+    path = saveResults(results, args.output or defaultOutputPath(),
+                       {'lines': args.lines, 'minTime': args.min_time})
+    print('results written to: %s'% path)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
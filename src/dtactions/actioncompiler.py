@@ -0,0 +1,656 @@
+"""compile action strings of unimacroactions (doAction) into plans of steps
+
+An action string like "<<realhome>>{enter}{extup}; W 0.5; <<paste>>" is parsed once
+into a Plan: a tuple of steps, with the pause between actions after each step.
+The steps are:
+
+    Keystrokes(keys, chunks, ...)              keystrokes, split at the {...} parts
+    MetaAction(name)                           <<name>>, resolved at run time (depends on the program)
+    Command(name, func, args)                  a USC command (do_W, do_SSK, ...) with converted args
+    NatspeakCommand(script)                    a Dragon (dvc) command
+    Sequence(steps)                            an action with meta actions inside (pause after each step)
+
+The plans (and the expansions of meta actions and the keystroke splits) are cached by text
+in an ActionCompiler, so a repeated voice command does no string parsing.
+unimacroactions clears the cache when the inifile is reloaded (see swapIni).
+The values of the meta actions (MetaActionCache) and the section list and settings of a
+window (WindowSettingsCache) are cached in the same way. The meta actions inside the values
+of meta actions are expanded when the inifile is loaded, where possible (MetaActionTable).
+
+Example (the commands are given by a lookup function, as unimacroactions does with its do_ functions):
+>>> def do_W(t=None, **kw):
+...     pass
+>>> compiler = ActionCompiler(getCommand={'W': do_W}.get, natspeakCommands=['HeardWord'])
+>>> plan = compiler.compile('<<realhome>>{enter}{extup}; W 0.5; HeardWord hello')
+>>> for step in plan.steps:   #doctest: +ELLIPSIS
+...     print(step)
+Sequence(steps=(MetaAction(name='realhome'), Keystrokes(keys='{enter}{extup}', chunks=('{enter}', '{extup}'), exact=False, keyPart=None, braces=True)))
+Command(name='W', func=<function do_W at ...>, args=(0.5,))
+NatspeakCommand(script='HeardWord hello')
+>>> compiler.compile('<<realhome>>{enter}{extup}; W 0.5; HeardWord hello') is plan
+True
+"""
+#pylint:disable=C0209
+import re
+from collections import namedtuple, OrderedDict
+
+from dtactions import inivars
+from dtactions import utilsqh
+
+metaActions = re.compile(r'(<<[^>]+>>)')
+metaAction = re.compile(r'<<([^>]+)>>$')
+metaNumber = re.compile(r' ([0-9]+)$')
+metaNumberBack = re.compile(r'\bn\b')
+# for keystroke matching and splitting:
+braceExact = re.compile (r'[{][^}]+[}]$')
+hasBraces = re.compile (r'([{].+?[}])')
+BracesExtractKey = re.compile (r'^[{]((alt|ctrl|shift)[+])*(?P<k>[^ ]+?)( [0-9]+)?[}]$', re.I)
+# keystrokes after which the window needs to settle (clipboard write or window switch):
+settlingKeys = re.compile(r'[{]((ctrl[+](c|x|insert|tab|shift[+]tab|f4|f6))|shift[+]delete|'
+                          r'alt[+](tab|shift[+]tab|esc|f4)|win[^}]*)[}]', re.I)
+
+Plan = namedtuple('Plan', 'action steps')
+Keystrokes = namedtuple('Keystrokes', 'keys chunks exact keyPart braces')
+MetaAction = namedtuple('MetaAction', 'name')
+Command = namedtuple('Command', 'name func args')
+NatspeakCommand = namedtuple('NatspeakCommand', 'script')
+Sequence = namedtuple('Sequence', 'steps')
+
+def splitAction(action):
+    """return the parts of an action string: split as a list (see inivars.getIniList) and at USC
+
+>>> splitAction('{ctrl+c}; W 0.5')
+['{ctrl+c}', 'W 0.5']
+>>> splitAction('RW USC {ctrl+p}')
+['RW', '{ctrl+p}']
+    """
+    parts = list(inivars.getIniList(action))
+    if action.find('USC') >= 0:
+        split = []
+        for a in parts:
+            if a.find('USC') >= 0:
+                split.extend(a.split('USC'))
+            else:
+                split.append(a)
+        parts = [t.strip() for t in split if t]
+    return parts
+
+def splitCommand(action):
+    """return (command name, rest) of an action, "W 0.5" or "W(0.5)" gives ('W', '0.5')
+    """
+    if action.find('(') > 0 and action.strip().endswith(')'):
+        com, rest = tuple([t.strip() for t in action.split('(', 1)])
+        rest = rest.strip()[:-1]
+    elif action.find(' ') > 0:
+        com, rest = tuple([t.strip() for t in action.split(' ',1)])
+    else:
+        com, rest = action.strip(), ''
+    return com, rest
+
+def compileKeystrokes(keys):
+    """return the Keystrokes step of keys, with the splits doKeystroke needs
+
+>>> compileKeystrokes('{ctrl+tab}')
+Keystrokes(keys='{ctrl+tab}', chunks=('{ctrl+tab}',), exact=True, keyPart='{tab}', braces=True)
+    """
+    chunks = tuple(k for k in hasBraces.split(keys) if k)
+    exact = bool(braceExact.match(keys))
+    keyPart = None
+    if exact:
+        m = BracesExtractKey.match(keys)
+        if m:
+            keyPart = m.group(0).lower()
+            for mod in 'shift+', 'ctrl+', 'alt+':
+                if keyPart.find(mod)>0: keyPart = keyPart.replace(mod, '')
+    return Keystrokes(keys, chunks, exact, keyPart, bool(hasBraces.search(keys)))
+
+class ActionCompiler:
+    """compile action strings into plans, cached by text
+
+    getCommand: function, returns the function of a USC command name (eg 'W' -> do_W), or None
+    natspeakCommands: the names of the Dragon commands
+    convertArgs: function, converts the arguments text of a USC command into a tuple (or None),
+                 default utilsqh.convertToPythonArgs
+    convertDvcArgs: function, converts the arguments text of a Dragon command (default: unchanged)
+    settlingCommands: the names of the USC and Dragon commands after which the window needs
+                 to settle (see settles)
+    maxSize: the number of entries of each cache (LRU), as the keystrokes of dictated text,
+                 dates and the clipboard are compiled as well
+
+>>> compiler = ActionCompiler({}.get, maxSize=2)
+>>> for text in 'a', 'b', 'a', 'c':
+...     _plan = compiler.compile(text)
+>>> list(compiler._plans)
+['a', 'c']
+    """
+    def __init__(self, getCommand, natspeakCommands=(), convertArgs=None, convertDvcArgs=None,
+                 settlingCommands=(), maxSize=1000):
+        self.getCommand = getCommand
+        self.natspeakCommands = set(natspeakCommands)
+        self.settlingCommands = set(settlingCommands)
+        self.convertArgs = convertArgs or utilsqh.convertToPythonArgs
+        self.convertDvcArgs = convertDvcArgs or str.strip
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self.clear()
+
+    def clear(self):
+        """forget all compiled plans (eg when the inifile or the commands change)
+
+        (the caches are replaced, not changed, as in MetaActionCache)
+        """
+        self._plans = OrderedDict()
+        self._steps = OrderedDict()
+        self._expansions = OrderedDict()
+        self._keystrokes = OrderedDict()
+        self._settlingKeys = OrderedDict()
+
+    def _get(self, cache, key):
+        """return the value of key in cache (an LRU OrderedDict), None if not there"""
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+    def _put(self, cache, key, value):
+        """put value in cache, drop the least recently used entry if there are more than maxSize"""
+        cache[key] = value
+        if len(cache) > self.maxSize:
+            cache.popitem(last=False)
+        return value
+
+    def getCacheInfo(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'plans': len(self._plans), 'steps': len(self._steps),
+                'expansions': len(self._expansions), 'keystrokes': len(self._keystrokes)}
+
+    def compile(self, action):
+        """return the Plan of a (complete) action string, each step is followed by the pause between actions
+        """
+        plans = self._plans
+        plan = self._get(plans, action)
+        if plan is not None:
+            self.hits += 1
+            return plan
+        self.misses += 1
+        plan = Plan(action, tuple(self.compileStep(a) for a in splitAction(action) if a))
+        return self._put(plans, action, plan)
+
+    def compileExpansion(self, text):
+        """return the steps (a tuple) of the expansion of a meta action, no pause between them
+        """
+        expansions = self._expansions
+        steps = self._get(expansions, text)
+        if steps is None:
+            steps = self._put(expansions, text, tuple(self.compileStep(a) for a in inivars.getIniList(text) if a))
+        return steps
+
+    def compileKeystrokes(self, keys):
+        """return the (cached) Keystrokes step of keys, see compileKeystrokes"""
+        keystrokes = self._keystrokes
+        step = self._get(keystrokes, keys)
+        if step is None:
+            step = self._put(keystrokes, keys, compileKeystrokes(keys))
+        return step
+
+    def settles(self, step):
+        """return True if the window needs to settle after step (the pause between actions)
+
+        keystrokes that write the clipboard or switch windows ({ctrl+c}, {alt+tab}, ...),
+        and the settlingCommands. Meta actions and sequences settle by their parts.
+
+>>> compiler = ActionCompiler(getCommand={}.get, settlingCommands=['TASK'])
+>>> compiler.settles(compiler.compileStep('{ctrl+c}')), compiler.settles(compiler.compileStep('{ctrl+v}'))
+(True, False)
+>>> compiler.settles(Command('TASK', None, (2,))), compiler.settles(MetaAction('copy'))
+(True, False)
+        """
+        kind = type(step)
+        if kind is Keystrokes:
+            cache = self._settlingKeys
+            result = self._get(cache, step.keys)
+            if result is None:
+                result = self._put(cache, step.keys, bool(settlingKeys.search(step.keys)))
+            return result
+        if kind is Command:
+            return step.name.upper() in self.settlingCommands
+        if kind is NatspeakCommand:
+            return step.script.split(' ', 1)[0] in self.settlingCommands
+        return False
+
+    def compileStep(self, action):
+        """return the step of one part of an action (cached)
+
+        tried in the order of doAction: exactly a meta action, a USC command,
+        meta actions inside (a Sequence), a Dragon command, and else keystrokes.
+        """
+        steps = self._steps
+        step = self._get(steps, action)
+        if step is None:
+            step = self._put(steps, action, self._compileStep(action))
+        return step
+
+    def _compileStep(self, action):
+        m = metaAction.match(action)
+        if m:
+            return MetaAction(m.group(1))
+        com, rest = splitCommand(action)
+        func = self.getCommand(com)
+        if func is not None:
+            return Command(com, func, self.convertArgs(rest))
+        if metaActions.search(action):
+            parts = [t.strip() for t in metaActions.split(action)]
+            return Sequence(tuple(self.compileStep(a) for a in parts if a))
+        if com in self.natspeakCommands:
+            return NatspeakCommand(com + ' ' + self.convertDvcArgs(rest))
+        return self.compileKeystrokes(action)
+
+def parseMetaName(a):
+    """return (name in the inifile, number, name of the function) of meta action a
+
+    a number at the end is replaced by "n" (number 0 if there is no number):
+>>> parseMetaName('gotoline 5')
+('gotoline n', '5', 'gotoline')
+>>> parseMetaName('real home')
+('real home', 0, 'realhome')
+    """
+    m = metaNumber.search(a)
+    if m:
+        number = m.group(1)
+        A = a.replace(number, 'n')
+        actionName = a.replace(number, '')
+        actionName = actionName.replace(' ', '')
+    else:
+        A = a
+        number = 0
+        actionName = a.replace(' ', '')
+    return A, number, actionName
+
+class MetaActionCache:
+    """LRU cache of the meta actions: (tuple(sectionList), name) -> the value in the inifile
+
+    Numbered meta actions ("gotoline 5") are looked up (and cached) as "gotoline n", the template,
+    the number is substituted in the template. Not found (None) is cached as well.
+    The entries of a section are dropped when it changes (see invalidate), or all by clear.
+
+>>> values = {'gotoline n': '{ctrl+home}{extdown n}', 'copy': '{ctrl+c}'}
+>>> lookups = []
+>>> def lookup(name, sectionList):
+...     lookups.append(name)
+...     return values.get(name)
+>>> cache = MetaActionCache(maxSize=10)
+>>> cache.get('gotoline 5', ['excel', 'default'], lookup)
+'{ctrl+home}{extdown 5}'
+>>> cache.get('gotoline 12', ['excel', 'default'], lookup), cache.get('missing', ['default'], lookup)
+('{ctrl+home}{extdown 12}', None)
+>>> cache.get('missing', ['default'], lookup), lookups
+(None, ['gotoline n', 'missing'])
+>>> cache.invalidate('excel')
+>>> cache.get('gotoline 5', ['excel', 'default'], lookup), lookups
+('{ctrl+home}{extdown 5}', ['gotoline n', 'missing', 'gotoline n'])
+    """
+    def __init__(self, maxSize=1000):
+        self.maxSize = maxSize
+        self._templates = OrderedDict()
+        self._names = {}
+        self.hits = 0
+        self.misses = 0
+
+    def parseName(self, a):
+        """parseMetaName, cached (the cache is emptied when it has maxSize names)"""
+        names = self._names
+        result = names.get(a)
+        if result is None:
+            if len(names) >= self.maxSize:
+                names.clear()
+            result = names[a] = parseMetaName(a)
+        return result
+
+    def get(self, a, sectionList, lookup):
+        """return the value of meta action a (with the number substituted), None if not found
+
+        lookup(name, sectionList) gives the value in the inifile (or None), at a miss.
+        """
+        A, number, _actionName = self.parseName(a)
+        templates = self._templates  # replaced (not changed) by invalidate and clear, see there
+        key = (tuple(sectionList), A)
+        try:
+            template = templates[key]
+        except KeyError:
+            self.misses += 1
+            template = lookup(A, sectionList)
+            templates[key] = template
+            if len(templates) > self.maxSize:
+                templates.popitem(last=False)
+        else:
+            self.hits += 1
+            templates.move_to_end(key)
+        if template and number:
+            return metaNumberBack.sub(number, template)
+        return template
+
+    def invalidate(self, *sections):
+        """drop the values of the section lists that contain one of sections
+
+        (the cache is replaced, so invalidate can be called from another thread, eg the reload thread)
+        """
+        if not sections:
+            return
+        sections = set(sections)
+        self._templates = OrderedDict((key, template) for key, template in list(self._templates.items())
+                                      if sections.isdisjoint(key[0]))
+
+    def clear(self):
+        self._templates = OrderedDict()
+        self._names = {}
+
+    def getCacheInfo(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._templates)}
+
+class MetaActionTable:
+    """the meta actions of the inifile, with the nested meta actions expanded at load time
+
+    sections: dict section -> dict key -> value (the meta actions of the inifile)
+    compiler: the ActionCompiler, to tell keystrokes from commands
+    deferredNames: the names of the meta action functions of the programs (metaaction_name),
+                   meta actions with these names are resolved at run time
+
+    A meta action <<y>> inside the value of a key of section S is replaced by the (expanded)
+    value of y when y resolves to S in every section list with S. A section list has the
+    sections of a program first (their names start with the program name), then the default
+    sections, so y must be in S, and not in the other sections of the program (for a default
+    section: not in any other section). Other meta actions are kept (resolved at run time).
+    A meta action that is a complete part of the value ("<<y>>; W") is replaced by the parts
+    of y, inside keystrokes ("<<y>>{enter}") only when y is keystrokes.
+
+    Meta actions that (via expanded meta actions) refer to themselves are reported in cycles:
+    (section, key) -> the keys of the cycle, these keys are not expanded.
+
+    The table remembers which meta actions each expansion looked up, so after a change of
+    a key (or section) update expands only that key again, and the keys that used it.
+
+>>> compiler = ActionCompiler({'W': lambda t=None, **kw: 1}.get)
+>>> table = MetaActionTable({'default': {'realhome': '{home}', 'lineinsert': '<<realhome>>{enter}{extup}',
+...                                      'copy': '{ctrl+c}', 'duplicate': '<<copy>>; W; <<paste>>',
+...                                      'loop': '{a}<<again>>', 'again': '<<loop>>'},
+...                          'emacs': {'copy': '{alt+w}', 'paste': '{ctrl+y}'}}, compiler)
+>>> table.get('default', 'lineinsert'), table.get('default', 'duplicate')
+('{home}{enter}{extup}', '<<copy>>; W; <<paste>>')
+>>> table.get('emacs', 'copy'), table.get('emacs', 'missing')
+('{alt+w}', None)
+>>> for (section, key), path in sorted(table.cycles.items()):
+...     print('[%s] %s: %s'% (section, key, ' -> '.join(path)))
+[default] again: again -> loop -> again
+[default] loop: loop -> again -> loop
+>>> sorted(table.update('default', dict(table.sections['default'], realhome='{extHome}'), 'realhome'))
+[('default', 'lineinsert'), ('default', 'realhome')]
+>>> table.get('default', 'lineinsert')
+'{extHome}{enter}{extup}'
+    """
+    def __init__(self, sections, compiler, deferredNames=()):
+        self.sections = dict(sections)
+        self.compiler = compiler
+        self.deferredNames = set(deferredNames)
+        self.flattened = {}   # (section, key) -> expanded value (only the changed values)
+        self.cycles = {}      # (section, key) -> the keys of the cycle
+        self._owners = {}     # key -> the sections with key
+        self._users = {}      # key -> the (section, key) whose expansion looked up key
+        self._uses = {}       # (section, key) -> the keys looked up by its expansion
+        for section, keys in sections.items():
+            for key in keys:
+                self._owners.setdefault(key, set()).add(section)
+        self._expand(((section, key) for section, keys in sections.items() for key in keys), None)
+
+    def copy(self):
+        """return a copy, that can be updated without changing this table"""
+        table = MetaActionTable.__new__(MetaActionTable)
+        table.sections = dict(self.sections)     # (the dicts of keys are replaced, not changed, by update)
+        table.compiler = self.compiler
+        table.deferredNames = self.deferredNames
+        table.flattened = dict(self.flattened)
+        table.cycles = dict(self.cycles)
+        table._owners = {key: set(owners) for key, owners in self._owners.items()}
+        table._users = {key: set(users) for key, users in self._users.items()}
+        table._uses = dict(self._uses)
+        return table
+
+    def update(self, section, keys, key=None):
+        """expand again after a change of key in section (key None: the whole section)
+
+        keys: dict key -> value, the keys of section after the change (None if the section is deleted),
+        with key only the value of key is taken (so the changes of a diff can be given one by one).
+        return the set of (section, key) that are expanded again (the changed keys,
+        and the keys that looked up a changed key, via other keys as well).
+        """
+        old = self.sections.get(section) or {}
+        if key is None:
+            changed = set(old).union(keys or ())
+        else:
+            changed = {key}
+            if keys is not None or old:
+                keys, value = dict(old), (keys or {}).get(key)
+                if value is None:
+                    keys.pop(key, None)
+                else:
+                    keys[key] = value
+        new = keys or {}
+        if keys is None:
+            self.sections.pop(section, None)
+        else:
+            self.sections[section] = keys
+        for k in changed:
+            owners = self._owners.setdefault(k, set())
+            if k in new:
+                owners.add(section)
+            else:
+                owners.discard(section)
+                if not owners:
+                    del self._owners[k]
+        stale = set()
+        todo = [(section, k) for k in changed]
+        while todo:
+            node = todo.pop()
+            if node not in stale:
+                stale.add(node)
+                todo.extend(self._users.get(node[1], ()))
+        for node in stale:
+            self.flattened.pop(node, None)
+            self.cycles.pop(node, None)
+            for name in self._uses.pop(node, ()):
+                users = self._users.get(name)
+                if users:
+                    users.discard(node)
+                    if not users:
+                        del self._users[name]
+        self._expand(stale, stale)
+        return stale
+
+    def get(self, section, key, default=None):
+        """return the (expanded) value of key in section, default if not there"""
+        try:
+            return self.flattened[(section, key)]
+        except KeyError:
+            return self.sections.get(section, {}).get(key, default)
+
+    def _expand(self, nodes, stale):
+        """expand the values of nodes ((section, key) pairs), stale: the nodes that are expanded
+        again (the others are taken from the table), None: all
+        """
+        self._done = {}
+        self._stale = stale
+        try:
+            for section, key in nodes:
+                value = self.sections.get(section, {}).get(key)
+                if value and '<<' in value:
+                    self._flatten(section, key, ())
+            for node in self.cycles:
+                self.flattened.pop(node, None)
+        finally:
+            del self._done, self._stale
+
+    def _flatten(self, section, key, path):
+        """return the expanded value of key in section (path: the keys that expand to it)"""
+        node = (section, key)
+        if node in self._done:
+            return self._done[node]
+        if self._stale is not None and node not in self._stale:
+            return self.get(section, key)
+        value = self.sections[section][key]
+        if not value or '<<' not in value:
+            return value
+        path = path + (key,)
+        parts = [part for part in inivars.getIniList(value) if part]
+        numbered = bool(metaNumberBack.search(key))
+        newParts = []
+        for part in parts:
+            m = metaAction.match(part)
+            if m:
+                expansion = self._resolve(section, m.group(1), path, numbered)
+                newParts.extend(expansion or [part])
+                continue
+            pieces = metaActions.split(part)
+            for i, piece in enumerate(pieces):
+                m = metaAction.match(piece)
+                if not m:
+                    continue
+                expansion = self._resolve(section, m.group(1), path, numbered)
+                if expansion and len(expansion) == 1 and \
+                        type(self.compiler.compileStep(expansion[0])) is Keystrokes:
+                    pieces[i] = expansion[0]
+            newParts.append(''.join(pieces))
+        newValue = value
+        if newParts != parts:
+            joined = '; '.join(newParts)
+            # only if the parts come back as they are:
+            if [part for part in inivars.getIniList(joined) if part] == newParts:
+                newValue = self.flattened[node] = joined
+        self._done[node] = newValue
+        return newValue
+
+    def _resolve(self, section, name, path, numbered):
+        """return the (expanded) parts of meta action name in section, None if not static"""
+        A, number, actionName = parseMetaName(name)
+        A = inivars.normalizeName(A)
+        if actionName in self.deferredNames:
+            return None
+        user = (section, path[-1])
+        self._users.setdefault(A, set()).add(user)
+        self._uses.setdefault(user, set()).add(A)
+        keys = self.sections[section]
+        if A not in keys:
+            return None
+        owners = self._owners[A]
+        if len(owners) > 1:
+            if section.split()[0] == 'default':
+                return None
+            prog = section.split()[0]
+            if any(s != section and s.split()[0] == prog for s in owners):
+                return None
+        # (only a cycle of meta actions that are expanded, the others depend on the section list)
+        if A in path:
+            cycle = path[path.index(A):] + (A,)
+            for i, key in enumerate(cycle[:-1]):
+                self.cycles[(section, key)] = cycle[i:-1] + cycle[:i+1]
+            return None
+        value = self._flatten(section, A, path)
+        if not value:
+            return None
+        if (section, A) in self.cycles:
+            return None
+        if number:
+            value = metaNumberBack.sub(number, value)
+        elif numbered and metaNumberBack.search(value) and not metaNumberBack.search(name):
+            return None   # the n of the value would get the number of the outer meta action
+        return [part for part in inivars.getIniList(value) if part]
+
+WindowSettings = namedtuple('WindowSettings', 'sectionList iniSectionList pauseBA pauseBK hardKeys')
+
+class WindowSettingsCache:
+    """LRU cache of the settings of a window: (prog, title, toporchild) -> WindowSettings (or another value)
+
+    The value is made by build(progInfo) at a miss. The sections that match a window title
+    are found via getSectionsWithPrefix, so the key must contain the title.
+    When the inifile changes only the windows that depend on the change are dropped (see invalidate),
+    settingKeys: the keys of the settings in the values (the other keys do not change them).
+
+>>> builds = []
+>>> def build(progInfo):
+...     builds.append(progInfo[1])
+...     return WindowSettings(('excel', 'default'), ('excel', 'default'), 0.0, 0.0, ['none'])
+>>> cache = WindowSettingsCache(maxSize=2)
+>>> progInfo = ('C:/excel.exe', 'excel', 'book1.xlsx', 'top', 'XLMAIN', 1234)
+>>> cache.get(progInfo, build).sectionList
+('excel', 'default')
+>>> cache.get(progInfo, build) is cache.get(progInfo, build), builds
+(True, ['excel'])
+>>> cache.invalidate('word')
+>>> cache.get(progInfo, build) is cache.get(progInfo, build), builds
+(True, ['excel'])
+>>> cache.clear()
+>>> _s = cache.get(progInfo, build)
+>>> builds
+['excel', 'excel']
+    """
+    def __init__(self, maxSize=100, settingKeys=()):
+        self.maxSize = maxSize
+        self.settingKeys = {inivars.normalizeName(key) for key in settingKeys}
+        self._settings = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, progInfo, build):
+        """return the settings of the window of progInfo (prog, title and toporchild are the key)"""
+        settings = self._settings  # replaced (not changed) by clear, see there
+        key = (progInfo[1], progInfo[2], progInfo[3])
+        try:
+            value = settings[key]
+        except KeyError:
+            self.misses += 1
+            value = settings[key] = build(progInfo)
+            if len(settings) > self.maxSize:
+                settings.popitem(last=False)
+        else:
+            self.hits += 1
+            settings.move_to_end(key)
+        return value
+
+    def invalidate(self, section, key=None):
+        """drop the windows whose settings can depend on key of section (key None: the whole section)
+
+        A section is in the section lists of the windows of a program when its name starts with
+        the program name (of all windows for a default section), so a section that is added, deleted
+        or changed as a whole drops these windows. A key only drops the windows with section in
+        their section list, and only when it is one of settingKeys.
+        (the cache is replaced, not changed, as in clear)
+        """
+        self.invalidateChanges([(section, key)])
+
+    def invalidateChanges(self, changes):
+        """invalidate for each of changes ((section, key) pairs), in one pass over the windows"""
+        wholeSections = set()
+        settingSections = set()
+        for section, key in changes:
+            if key is None:
+                if section == 'default' or section.startswith('default '):
+                    self.clear()
+                    return
+                wholeSections.add(section)
+            elif key in self.settingKeys:
+                settingSections.add(section)
+        if not (wholeSections or settingSections):
+            return
+        def keep(windowKey, value):
+            prog = windowKey[0]
+            if any(section == prog or section.startswith(prog + ' ') for section in wholeSections):
+                return False
+            return settingSections.isdisjoint(getattr(value, 'sectionList', settingSections))
+        self._settings = OrderedDict((windowKey, value) for windowKey, value in list(self._settings.items())
+                                     if keep(windowKey, value))
+
+    def clear(self):
+        """forget all windows (the cache is replaced, so clear can be called from the reload thread)"""
+        self._settings = OrderedDict()
+
+    def getCacheInfo(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._settings)}
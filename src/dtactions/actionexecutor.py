@@ -0,0 +1,292 @@
+"""asynchronous execution of actions: the waits and the polling of windows are awaitables
+
+unimacroactions.doAction runs on the natlink callback thread, and its waits (W, WTC, WWT,
+WAITMOUSEMOVE, ...) block that thread with sleeps. An ActionExecutor performs the compiled
+plans of actioncompiler as coroutines:
+
+    await executor.doAction(action, sectionList=..., progInfo=...)
+
+All waits are asyncio sleeps with a deadline, so an action can be cancelled in the middle
+of a wait (task.cancel(), or comingFrom.interrupted, which is checked at each poll interval).
+USC commands can have an async version (asyncCommands: name -> coroutine function), these
+get the executor as keyword argument, to await executor.sleep, executor.poll and
+executor.pollStable. executor.run(coroutine) is the synchronous wrapper.
+
+For testing, VirtualClockLoop is an event loop in which the time jumps to the next timer
+when nothing is to be done, so waits of seconds take no time at all:
+
+>>> from dtactions.actioncompiler import ActionCompiler
+>>> from dtactions.outputbackend import RecordingBackend
+>>> loop = VirtualClockLoop()
+>>> recorder = RecordingBackend(clock=loop.time)
+>>> executor = ActionExecutor(ActionCompiler({}.get), recorder, loop=loop)
+>>> executor.run(executor.doAction('{ctrl+c}; {alt+tab}; {ctrl+v}', pauseBA=0.5))
+1
+>>> [(e.time, e.args[0]) for e in recorder.events]
+[(0.0, '{ctrl+c}'), (0.5, '{alt+tab}'), (1.0, '{ctrl+v}')]
+"""
+#pylint:disable=C0209
+import asyncio
+import selectors
+from collections import namedtuple
+
+from dtactions import actioncompiler
+from dtactions import outputbackend
+from dtactions import pausescheduler
+
+Context = namedtuple('Context', 'completeAction sectionList progInfo pauseBA pauseBK comingFrom')
+
+class ActionExecutor:
+    """perform compiled actions as coroutines
+
+    compiler: the ActionCompiler of the actions (the plans are shared with doAction)
+    backend: the output backend (a BatchingBackend, other backends are wrapped in one)
+    scheduler: the PauseScheduler (the pauses between actions, W, ...), default a new one
+               with the clock of the event loop
+    getMetaAction: function (name, sectionList, progInfo) -> the expansion of a meta action
+               (a string, '' for nothing), a tuple (function, number), or None if not found
+    sendKeystrokes: function (step, context), does a Keystrokes step (default: backend.sendKeys)
+    asyncCommands: dict name -> coroutine function, replacing the (blocking) USC command functions
+    waitingCommands: the command functions that only schedule a wait (see PauseScheduler)
+    errorClass: the exception raised for an invalid meta action
+    interval: the default interval of polling (seconds)
+    loop: the event loop of run (default: a new event loop, made at the first run)
+    """
+    def __init__(self, compiler, backend, scheduler=None, getMetaAction=None, sendKeystrokes=None,
+                 asyncCommands=None, waitingCommands=(), errorClass=ValueError, interval=0.05, loop=None):
+        self.compiler = compiler
+        if not isinstance(backend, outputbackend.BatchingBackend):
+            backend = outputbackend.BatchingBackend(backend)
+        self.backend = backend
+        self.loop = loop
+        if scheduler is None:
+            scheduler = pausescheduler.PauseScheduler(clock=self.time)
+        self.scheduler = scheduler
+        self.getMetaAction = getMetaAction or (lambda name, sectionList, progInfo: None)
+        self.sendKeystrokes = sendKeystrokes or (lambda step, context: self.backend.sendKeys(step.keys))
+        self.asyncCommands = dict(asyncCommands or {})
+        self.waitingCommands = set(waitingCommands)
+        self.errorClass = errorClass
+        self.interval = interval
+
+    def time(self):
+        """the time of the event loop"""
+        try:
+            return asyncio.get_running_loop().time()
+        except RuntimeError:
+            return self.getLoop().time()
+
+    def getLoop(self):
+        if self.loop is None or self.loop.is_closed():
+            self.loop = asyncio.new_event_loop()
+        return self.loop
+
+    def run(self, coroutine):
+        """run coroutine (eg self.doAction(...)) until it is done, return its result
+
+        the synchronous wrapper, not to be called from a coroutine (use await there)
+        """
+        return self.getLoop().run_until_complete(coroutine)
+
+    async def doAction(self, action, sectionList=None, progInfo=None, pauseBA=0, pauseBK=0, comingFrom=None):
+        """perform action, return the result of the last step (a false value stops the action)
+
+        the pause between actions (pauseBA) is done after the steps that need to settle.
+        When the action is cancelled, the pending pauses and keystrokes are dropped.
+        """
+        plan = self.compiler.compile(action)
+        if not plan.steps:
+            return None
+        context = Context(action, sectionList, progInfo, pauseBA, pauseBK, comingFrom)
+        self.scheduler.begin(action)
+        self.backend.begin()
+        result = None
+        try:
+            for step in plan.steps:
+                if comingFrom and comingFrom.interrupted:
+                    self.scheduler.cancel()
+                    return None
+                result = await self.doStep(step, context)
+                if not result:
+                    return result
+            await self.sync()
+        except asyncio.CancelledError:
+            self.scheduler.cancel()
+            self.backend.cancel()
+            raise
+        finally:
+            if self.scheduler.depth == 1:
+                self.scheduler.cancel()  # a stopped action: no pause at the end (end would block)
+            self.backend.end()
+            self.scheduler.end()
+        return result
+
+    async def doSteps(self, steps, context):
+        result = 1
+        for step in steps:
+            result = await self.doStep(step, context)
+            if not result:
+                return result
+        return result
+
+    async def doStep(self, step, context):
+        """perform a step of a plan, see unimacroactions.doStep"""
+        comingFrom = context.comingFrom
+        if comingFrom and comingFrom.interrupted:
+            return None
+        kind = type(step)
+        if kind is actioncompiler.Keystrokes:
+            await self.sync()
+            self.sendKeystrokes(step, context)
+            result = 1
+        elif kind is actioncompiler.MetaAction:
+            return await self.doMetaAction(step, context)
+        elif kind is actioncompiler.Command:
+            result = await self.doCommand(step, context)
+        elif kind is actioncompiler.Sequence:
+            return await self.doSteps(step.steps, context)
+        elif kind is actioncompiler.NatspeakCommand:
+            await self.sync()
+            self.backend.execScript(step.script)
+            result = 1
+        else:
+            raise self.errorClass('invalid step of action "%s": %s'% (context.completeAction, step))
+        if self.compiler.settles(step):
+            self.scheduler.settle(context.pauseBA)
+        return result
+
+    async def doMetaAction(self, step, context):
+        value = self.getMetaAction(step.name, context.sectionList, context.progInfo)
+        if isinstance(value, tuple):
+            func, number = value
+            await self.sync()
+            return await self.call(func, (number,), {})
+        if value:
+            return await self.doSteps(self.compiler.compileExpansion(value), context)
+        if value == '':
+            return 1
+        t = 'no valid meta action: "<<%s>>"'% step.name
+        if '<<%s>>'% step.name != context.completeAction:
+            t += '\ncomplete command: "%s"'% context.completeAction
+        raise self.errorClass(t)
+
+    async def doCommand(self, step, context):
+        args = step.args or ()
+        kw = {'progInfo': context.progInfo, 'comingFrom': context.comingFrom}
+        func = self.asyncCommands.get(step.name.upper())
+        if func is not None:
+            await self.sync()
+            kw['executor'] = self
+            return await self.call(func, args, kw)
+        if step.func in self.waitingCommands:
+            return step.func(*args, **kw)
+        await self.sync()
+        return await self.call(step.func, args, kw)
+
+    async def call(self, func, args, kw):
+        """call a (USC command or meta action) function, the keystrokes it sends go at once"""
+        self.backend.suspend()
+        try:
+            result = func(*args, **kw)
+            if asyncio.iscoroutine(result):
+                result = await result
+        finally:
+            self.backend.resume()
+        return result
+
+    async def sync(self):
+        """await the pending pauses (the keystrokes collected before are sent first)"""
+        if self.scheduler.deadline:
+            self.backend.flush()
+            await self.scheduler.syncAsync()
+
+    async def sleep(self, t, comingFrom=None):
+        """wait t seconds after the pending pauses, return False if interrupted (comingFrom.interrupted)
+        """
+        await self.sync()
+        self.backend.flush()
+        deadline = self.time() + t
+        while True:
+            if comingFrom and comingFrom.interrupted:
+                return False
+            remaining = deadline - self.time()
+            if remaining <= 0:
+                return True
+            await asyncio.sleep(min(self.interval, remaining) if comingFrom else remaining)
+
+    async def poll(self, check, timeout, interval=None, comingFrom=None):
+        """await a true value of check(), called each interval seconds
+
+        return that value, or None after timeout seconds, or when interrupted
+        """
+        interval = interval or self.interval
+        await self.sync()
+        deadline = self.time() + timeout
+        while True:
+            if comingFrom and comingFrom.interrupted:
+                return None
+            result = check()
+            if result:
+                return result
+            remaining = deadline - self.time()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(interval, remaining))
+
+    async def pollStable(self, get, count, timeout, interval=None, comingFrom=None):
+        """await get() giving the same value count times in a row (polling each interval)
+
+        return that value, or None after timeout seconds, or when interrupted
+        """
+        state = {'value': None, 'same': 0}
+        def check():
+            value = get()
+            if state['same'] and value == state['value']:
+                state['same'] += 1
+            else:
+                state['value'], state['same'] = value, 1
+            return state['same'] >= count
+        if await self.poll(check, timeout, interval, comingFrom):
+            return state['value']
+        return None
+
+class _VirtualSelector(selectors.BaseSelector):
+    """a selector that does not block, but advances the time of the loop by the timeout"""
+    def __init__(self, loop):
+        self._selector = selectors.DefaultSelector()
+        self._loop = loop
+
+    def register(self, fileobj, events, data=None):
+        return self._selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self._selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self._selector.modify(fileobj, events, data)
+
+    def select(self, timeout=None):
+        ready = self._selector.select(0)
+        if not ready and timeout:
+            self._loop.advance(timeout)
+        return ready
+
+    def get_map(self):
+        return self._selector.get_map()
+
+    def close(self):
+        self._selector.close()
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """an event loop with a virtual clock, starting at 0: when nothing is to be done,
+    the time jumps to the next timer (so sleeps take no time, for testing)
+    """
+    def __init__(self):
+        self._virtualTime = 0.0
+        super().__init__(_VirtualSelector(self))
+
+    def time(self):
+        return self._virtualTime
+
+    def advance(self, t):
+        self._virtualTime += t
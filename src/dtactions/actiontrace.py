@@ -0,0 +1,171 @@
+"""tracing of the action pipeline: timed spans in a ring buffer, a profile and a Chrome trace
+
+unimacroactions records spans (name, start, end, the action, a detail) of the parts of an action:
+
+    action        the complete (top level) action
+    progInfo      getting the program and window info
+    sectionList   the section list and settings of the window
+    compile       parsing the action string into a plan (only when not cached)
+    convert       converting the arguments of a USC or Dragon command
+    meta          resolving a meta action
+    command       a USC command (dispatch and run)
+    keystrokes    a keystrokes step (doKeystroke)
+    send          sending the collected keystrokes at the end of the action
+    wait          a wait (the pauses)
+
+When tracing is off (the default) a span costs one attribute test: the code does
+
+    t0 = tracer.enabled and tracer.clock()
+    ...
+    if t0: tracer.add('meta', t0, name)
+
+The spans go into a ring buffer (a deque with maxlen), so only the last spans are kept.
+formatProfile gives per action the number of runs and the p50/p95 times, and per span name
+the same; toChromeTrace gives the trace-event JSON for chrome://tracing or Perfetto.
+
+>>> clock = iter(range(5, 1000, 5)).__next__     # 5 microseconds per call
+>>> tracer = Tracer(clock=lambda: clock()/1e6)
+>>> tracer.enable()
+>>> for i in range(3):
+...     t0 = tracer.beginAction('<<copy>>')
+...     t1 = tracer.enabled and tracer.clock()
+...     tracer.add('keystrokes', t1, '{ctrl+c}')
+...     tracer.endAction(t0)
+>>> [span.name for span in tracer.getSpans()][:2]
+['keystrokes', 'action']
+>>> print(tracer.formatProfile())
+action                                        runs    p50 (ms)    p95 (ms)    max (ms)
+<<copy>>                                         3       0.015       0.015       0.015
+<BLANKLINE>
+span                                         count    p50 (ms)    p95 (ms)  total (ms)
+action                                           3       0.015       0.015       0.045
+keystrokes                                       3       0.005       0.005       0.015
+>>> trace = tracer.toChromeTrace()
+>>> trace['traceEvents'][0]['name'], trace['traceEvents'][0]['ph'], trace['traceEvents'][0]['dur']
+('keystrokes', 'X', 5.0)
+"""
+#pylint:disable=C0209
+import json
+import math
+import os
+import threading
+import time
+from collections import namedtuple, deque, defaultdict
+
+Span = namedtuple('Span', 'name start end action detail thread')
+
+def percentile(values, p):
+    """return the p (0..100) percentile of values, by the nearest rank
+
+>>> percentile([5, 1, 4, 2, 3], 50), percentile([5, 1, 4, 2, 3], 95), percentile([], 50)
+(3, 5, None)
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(p/100*len(values)) - 1)]
+
+class Tracer:
+    """collect spans in a ring buffer of size spans, when enabled
+
+    clock: function giving the time in seconds (default time.perf_counter)
+    """
+    def __init__(self, size=10000, clock=None):
+        self.enabled = False
+        self.clock = clock or time.perf_counter
+        self.spans = deque(maxlen=size)
+        self.action = None     # the current top level action
+        self._depth = 0
+
+    def enable(self, size=None):
+        """switch tracing on, optionally with a new size of the ring buffer (the spans are kept)"""
+        if size and size != self.spans.maxlen:
+            self.spans = deque(self.spans, maxlen=size)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.spans.clear()
+
+    def add(self, name, start, detail=None):
+        """add a span from start (a time of clock) until now"""
+        self.spans.append(Span(name, start, self.clock(), self.action, detail, threading.get_ident()))
+
+    def beginAction(self, action):
+        """start an action, return its start time (False if not tracing), see endAction
+
+        the spans until endAction belong to this action (nested actions to the outer one)
+        """
+        if not self.enabled:
+            return False
+        self._depth += 1
+        if self._depth == 1:
+            self.action = action
+        return self.clock()
+
+    def endAction(self, start):
+        """end the action (started at start, the result of beginAction)"""
+        if not start:
+            return
+        self.add('action', start, self.action if self._depth == 1 else None)
+        self._depth = max(0, self._depth - 1)
+        if not self._depth:
+            self.action = None
+
+    def getSpans(self, name=None):
+        """return the spans (of name), oldest first"""
+        return [span for span in list(self.spans) if name is None or span.name == name]
+
+    def getProfile(self):
+        """return (per action, per span name): lists of (key, count, p50, p95, max, total) in seconds
+        """
+        actions = defaultdict(list)
+        names = defaultdict(list)
+        for span in list(self.spans):
+            duration = span.end - span.start
+            names[span.name].append(duration)
+            if span.name == 'action' and span.detail is not None:
+                actions[span.detail].append(duration)
+        def stats(d):
+            return [(key, len(v), percentile(v, 50), percentile(v, 95), max(v), sum(v))
+                    for key, v in d.items()]
+        return (sorted(stats(actions), key=lambda s: -s[3]),
+                sorted(stats(names), key=lambda s: -s[5]))
+
+    def formatProfile(self, n=20):
+        """return the profile as text: the n slowest actions (by p95), and the span names"""
+        actions, names = self.getProfile()
+        lines = ['%-40s %9s %11s %11s %11s'% ('action', 'runs', 'p50 (ms)', 'p95 (ms)', 'max (ms)')]
+        for action, count, p50, p95, maximum, _total in actions[:n]:
+            lines.append('%-40s %9s %11.3f %11.3f %11.3f'% (action[:40], count, p50*1000, p95*1000, maximum*1000))
+        lines.append('')
+        lines.append('%-40s %9s %11s %11s %11s'% ('span', 'count', 'p50 (ms)', 'p95 (ms)', 'total (ms)'))
+        for name, count, p50, p95, _maximum, total in names:
+            lines.append('%-40s %9s %11.3f %11.3f %11.3f'% (name, count, p50*1000, p95*1000, total*1000))
+        return '\n'.join(lines)
+
+    def toChromeTrace(self):
+        """return the spans as a dict in the Chrome trace-event format (complete events, microseconds)"""
+        spans = list(self.spans)
+        origin = min((span.start for span in spans), default=0)
+        pid = os.getpid()
+        events = []
+        for span in spans:
+            args = {}
+            if span.action is not None:
+                args['action'] = span.action
+            if span.detail is not None:
+                args['detail'] = str(span.detail)
+            events.append({'name': span.name, 'cat': 'actions', 'ph': 'X',
+                           'ts': round((span.start - origin)*1e6, 3),
+                           'dur': round((span.end - span.start)*1e6, 3),
+                           'pid': pid, 'tid': span.thread, 'args': args})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def writeChromeTrace(self, path):
+        """write the Chrome trace (see toChromeTrace) as JSON to path, return path"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.toChromeTrace(), f)
+        return path
@@ -0,0 +1,206 @@
+"""watch (ini)files in a background thread, and call a function when they change
+
+Used by unimacroactions, in order to reload "unimacroactions.ini" in the background,
+instead of checking the file date at each action.
+
+On Linux the directories of the files are watched with inotify (via ctypes),
+elsewhere the files are checked (os.stat) every `interval` seconds.
+
+Example:
+```
+    def onChange(changedFiles):
+        print('changed: %s'% changedFiles)
+
+    watcher = FileWatcher(['path/to/file.ini'], onChange)
+    watcher.start()
+    ...
+    watcher.stop()
+```
+The function is called in the watcher thread, with the set of changed files (as given).
+Several changes shortly after each other (within `settle` seconds) give one call.
+"""
+#pylint:disable=C0209
+import os
+import sys
+import select
+import struct
+import threading
+import ctypes
+import ctypes.util
+from pathlib import Path
+
+# inotify events of a directory that can change a file in it (see inotify(7)):
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+inotifyMask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+inotifyEventHeader = struct.Struct('iIII')   # wd, mask, cookie, len
+
+def hasInotify():
+    """true if inotify can be used (Linux)"""
+    return sys.platform.startswith('linux') and getLibc() is not None
+
+_libc = []
+def getLibc():
+    """return the C library (for inotify), None if not available"""
+    if not _libc:
+        try:
+            _libc.append(ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True))
+        except OSError:
+            _libc.append(None)
+    return _libc[0]
+
+def getFileState(path):
+    """return (mtime_ns, size) of path, None if the file does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class FileWatcher:
+    """watch files in a background (daemon) thread, see module docstring
+
+    files: list of paths (str or Path)
+    onChange: function, called with the set of changed files (in the watcher thread)
+    interval: seconds between checks of the stat poller
+    settle: seconds to wait for more changes, before onChange is called
+    usePolling: use the stat poller, also when inotify is available
+    """
+    def __init__(self, files, onChange, interval=0.5, settle=0.05, usePolling=None):
+        self.files = list(files)
+        self.onChange = onChange
+        self.interval = interval
+        self.settle = settle
+        self.usePolling = usePolling or not hasInotify()
+        self.errors = []     # exceptions of onChange, the watcher goes on
+        self._thread = None
+        self._stopEvent = threading.Event()
+        self._states = {}
+        self._wakeup = None  # write end of the pipe that wakes up the inotify thread
+
+    def isRunning(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def getFileDate(self, path):
+        """return the modification time of path (seconds, as os.path.getmtime) as last seen by
+        the watcher, 0 if the file does not exist (path as given in files)
+        """
+        state = self._states.get(path)
+        return state[0]/1e9 if state else 0
+
+    def getMethod(self):
+        """return 'inotify' or 'stat'"""
+        return 'stat' if self.usePolling else 'inotify'
+
+    def start(self):
+        """start the watcher thread (if not running already)"""
+        if self.isRunning():
+            return
+        self._stopEvent.clear()
+        self._states = {f: getFileState(f) for f in self.files}
+        if self.usePolling:
+            target, args = self._poll, ()
+        else:
+            fd, wakeup = self._startInotify()
+            target, args = self._watchInotify, (fd, wakeup)
+        self._thread = threading.Thread(target=target, args=args, name='FileWatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """stop the watcher thread, and wait for it"""
+        self._stopEvent.set()
+        if self._wakeup is not None:
+            os.write(self._wakeup, b'x')
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        if self._wakeup is not None:
+            os.close(self._wakeup)
+            self._wakeup = None
+
+    def _changedFiles(self):
+        """return the set of files with a changed state (and remember the new states)"""
+        changed = set()
+        for f in self.files:
+            state = getFileState(f)
+            if state != self._states.get(f):
+                self._states[f] = state
+                changed.add(f)
+        return changed
+
+    def _notify(self, changed):
+        if not changed:
+            return
+        try:
+            self.onChange(changed)
+        except Exception as exc:   #pylint:disable=W0703
+            self.errors.append(exc)
+            print('FileWatcher, error in onChange for %s: %s'% (changed, exc))
+
+    def _poll(self):
+        """stat poller, for other platforms than Linux (or usePolling)"""
+        while not self._stopEvent.wait(self.interval):
+            changed = self._changedFiles()
+            if changed and self.settle:
+                self._stopEvent.wait(self.settle)
+                changed |= self._changedFiles()
+            self._notify(changed)
+
+    def _startInotify(self):
+        """return (inotify fd, wakeup pipe) with watches for the directories of the files"""
+        libc = getLibc()
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'FileWatcher, inotify_init1 failed')
+        directories = {str(Path(f).resolve().parent) for f in self.files}
+        for d in directories:
+            wd = libc.inotify_add_watch(fd, os.fsencode(d), inotifyMask)
+            if wd < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), 'FileWatcher, cannot watch directory: %s'% d)
+        readEnd, self._wakeup = os.pipe()
+        return fd, readEnd
+
+    def _watchInotify(self, fd, wakeup):
+        """wait for inotify events of the directories, then check the files"""
+        names = {Path(f).name for f in self.files}
+        try:
+            while not self._stopEvent.is_set():
+                ready, _w, _x = select.select([fd, wakeup], [], [])
+                if wakeup in ready:
+                    break
+                found = self._readEvents(fd, names)
+                if not found:
+                    continue
+                if self.settle and not self._stopEvent.wait(self.settle):
+                    found |= self._readEvents(fd, names)
+                # also a change that keeps mtime and size:
+                changed = self._changedFiles() | {f for f in self.files if Path(f).name in found}
+                self._notify(changed)
+        finally:
+            os.close(fd)
+            os.close(wakeup)
+
+    @staticmethod
+    def _readEvents(fd, names):
+        """read the pending inotify events, return the set of names (of the files) found in them"""
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return set()
+        found = set()
+        pos = 0
+        while pos < len(data):
+            _wd, mask, _cookie, length = inotifyEventHeader.unpack_from(data, pos)
+            pos += inotifyEventHeader.size
+            name = os.fsdecode(data[pos:pos+length].rstrip(b'\0'))
+            pos += length
+            if mask & IN_Q_OVERFLOW:
+                found |= names
+            elif name in names:
+                found.add(name)
+        return found
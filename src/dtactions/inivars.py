@@ -5,11 +5,23 @@
 import os
 import os.path
 import re
+import mmap
+import codecs
 import copy
 import locale
-from collections import UserDict
+import hashlib
+import pickle
+import threading
+import time
+import contextlib
+import concurrent.futures
+import keyword
+from types import MappingProxyType
+from collections import UserDict, namedtuple
+from collections.abc import MutableMapping
 from pathlib import Path
 
+import dtactions
 from dtactions import utilsqh
 
 from natlinkcore import readwritefile
@@ -18,20 +30,30 @@ locale.setlocale(locale.LC_ALL, '')
 
 lineNum = 0
 fileName = ''
+# held while lineNum and fileName are set by reading (parsing) an inifile:
+_parseLock = threading.RLock()
+
 class IniError(Exception):
-    """Return the line number in the reading section, and the filename if there"""
-    def __init__(self, value):
+    """Return the line number in the reading section, and the filename if there
+
+    lineNum and fileName are taken at the moment of the error (from the globals, if not given)
+    """
+    def __init__(self, value, lineNum=None, fileName=None):
         self.value = value
-        self.lineNum = lineNum
-        self.fileName = fileName
+        self.lineNum = globals()['lineNum'] if lineNum is None else lineNum
+        self.fileName = globals()['fileName'] if fileName is None else fileName
         super().__init__(value)
+
+    def __reduce__(self):
+        # keep lineNum and fileName when pickled (from another process, see IniVars.loadMany)
+        return (IniError, (self.value, self.lineNum, self.fileName))
         
     def __str__(self):
         s = ['Inivars error ']
-        if fileName:
-            s.append('in file %s, '%fileName)
-        if lineNum:
-            s.append('on line %s'%lineNum)
+        if self.fileName:
+            s.append('in file %s, '%self.fileName)
+        if self.lineNum:
+            s.append('on line %s'%self.lineNum)
         s.append(': ')
         s.append(self.value)
         return ''.join(s)
@@ -48,10 +70,119 @@ reQuotes = re.compile(r'[\'"]')
 
 reListValueSplit = re.compile(r'[\n;]', re.M)
 reWhiteSpace = re.compile(r'\s+')
+reNonWordChars = re.compile(r'\W+')
 
 reDoubleQuotes = re.compile(r'^"([^"]*)"$', re.M)
 reSingleQuotes = re.compile(r"^'([^']*)'$", re.M)
 
+# encodings tried for the (byte) sections of a lazily opened inifile, as in readwritefile:
+defaultEncodings = ['ascii', 'utf-8', 'cp1252', 'latin-1']
+
+# parsed-snapshot cache (opt-in, see IniVars option snapshotCache):
+snapshotVersion = 2
+snapshotDirName = 'inivarscache'
+
+def getSnapshotDirectory():
+    """default directory for the parsed snapshots of inifiles
+
+    this is the subdirectory "inivarscache" of the dtactions user directory
+    """
+    return Path(dtactions.getDtactionsUserDirectory())/snapshotDirName
+
+def getSnapshotPath(File, snapshotDir, **options):
+    """return the path of the snapshot file for File
+
+    the name is a hash of the absolute path and the parse options,
+    so different options (repairErrors, SKIgnorecase) give different snapshots.
+    """
+    ident = '%s|%s'% (os.path.abspath(str(File)), sorted(options.items()))
+    digest = hashlib.sha1(ident.encode('utf-8')).hexdigest()
+    return Path(snapshotDir)/('%s.pickle'% digest)
+
+def getContentHash(text):
+    """hash of the (decoded) contents of an inifile, for validating a snapshot
+    """
+    return hashlib.sha1(text.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+def readSnapshot(snapshotPath, stat, contentHash):
+    """return the parsed sections and section spans of a valid snapshot, or None
+
+    the snapshot is only valid if version, mtime, size and contents hash
+    all match. Any error in reading the snapshot is ignored (returning None),
+    the inifile is then parsed again.
+    """
+    try:
+        with open(snapshotPath, 'rb') as f:
+            snapshot = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    if not isinstance(snapshot, dict):
+        return None
+    if snapshot.get('version') != snapshotVersion:
+        return None
+    if snapshot.get('mtime') != stat.st_mtime_ns or snapshot.get('size') != stat.st_size:
+        return None
+    if snapshot.get('hash') != contentHash:
+        return None
+    return snapshot.get('sections'), snapshot.get('spans')
+
+def writeSnapshot(snapshotPath, stat, contentHash, sections, spans=None):
+    """write the parsed sections (a dict of dicts) and the section spans to the snapshot file
+
+    written via a temporary file, errors are ignored (the cache is only an optimisation)
+    """
+    snapshot = dict(version=snapshotVersion, mtime=stat.st_mtime_ns, size=stat.st_size,
+                    hash=contentHash, sections=sections, spans=spans)
+    snapshotPath = Path(snapshotPath)
+    tmpPath = snapshotPath.with_suffix('.tmp%s'% os.getpid())
+    try:
+        snapshotPath.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmpPath, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpPath, snapshotPath)
+    except OSError as exc:
+        print('inivars, could not write snapshot "%s": %s'% (snapshotPath, exc))
+        try:
+            os.remove(tmpPath)
+        except OSError:
+            pass
+
+# one lock per file, for writers of the same inifile in this process:
+_fileLocks = {}
+_fileLocksLock = threading.Lock()
+replaceRetries = 10     # os.replace can fail on Windows when the file is open by another process
+
+def getFileLock(File):
+    """return the (reentrant) lock for writing File, the same lock for the same (absolute) path
+
+    The writes (write, batch) hold the lock only while writing: an instance read before
+    another writer wrote its changes writes its own (older) text, and these changes are lost.
+    For read-modify-write, hold the lock from reading the file until the write:
+
+        with getFileLock(File):
+            ini = IniVars(File)
+            with ini.batch():
+                ini.set(...)
+    """
+    key = os.path.normcase(os.path.abspath(File))
+    with _fileLocksLock:
+        lock = _fileLocks.get(key)
+        if lock is None:
+            lock = _fileLocks[key] = threading.RLock()
+        return lock
+
+def replaceFile(src, dst):
+    """replace dst by src (atomic), retry a few times on a PermissionError (Windows)
+    """
+    for i in range(replaceRetries):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if i == replaceRetries - 1:
+                raise
+            time.sleep(0.01*(i+1))
+
 def quoteSpecial(t, extraProtect = None):
     """add quotes to string, to protect starting quotes, spaces
 
@@ -380,87 +511,241 @@ def getIniDict(t):
 #     else:
 #         return -cmp(la, lb)
 
-class IniSection(UserDict):
-    """represents a section of an inivars instance"""
+# number of postfixes from which PostfixMatcher is used instead of str.find for each postfix:
+postfixMatcherThreshold = 40
+
+class PostfixMatcher:
+    """find which of a list of postfixes occur in a text, with an Aho-Corasick automaton
+
+    The text is scanned once, so the cost depends on the length of the text,
+    not on the number of postfixes. The empty postfix always matches.
+    The result keeps the order of the postfixes list.
+
+>>> m = PostfixMatcher(['eggs', 'faa', 'foo', 'f', ''])
+>>> m.match('foo bar eggs')
+['eggs', 'foo', 'f', '']
+>>> m.match('withfooandeggs')
+['eggs', 'foo', 'f', '']
+>>> m.match('completely different')
+['f', '']
+>>> m.match('')
+['']
+>>> PostfixMatcher(['he', 'she', 'his', 'hers']).match('ushers')
+['he', 'she', 'hers']
+    """
+    def __init__(self, postfixes):
+        self.postfixes = list(postfixes)
+        self.always = [i for i, postfix in enumerate(self.postfixes) if not postfix]
+        goto = [{}]
+        out = [[]]
+        for i, postfix in enumerate(self.postfixes):
+            if not postfix:
+                continue
+            node = 0
+            for c in postfix:
+                nxt = goto[node].get(c)
+                if nxt is None:
+                    goto.append({})
+                    out.append([])
+                    nxt = len(goto) - 1
+                    goto[node][c] = nxt
+                node = nxt
+            out[node].append(i)
+        # failure links, breadth first, and merge the outputs along them:
+        fail = [0]*len(goto)
+        queue = list(goto[0].values())
+        for node in queue:
+            for c, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(c, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def match(self, text):
+        """return the postfixes that occur in text, in the order of the postfixes list
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set(self.always)
+        node = 0
+        for c in text:
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            if out[node]:
+                found.update(out[node])
+        postfixes = self.postfixes
+        return [postfixes[i] for i in sorted(found)]
+
+class IniSection(dict):
+    """represents a section of an inivars instance
+
+    A compact dict (with __slots__) of normalized keys and values, the mapping API
+    is the same as before (when IniSection was a UserDict), also the data attribute
+    (the section itself). Missing keys give "".
+    """
+    __slots__ = ('_parent', '_name', '_SKIgnorecase')
+    _returnStrings = None
 
     def __init__(self, parent):
         """init with ignore case if given in inivars
 
         """
+        dict.__init__(self)
         self._parent = parent
-        self._returnStrings = None
+        self._name = None     # set when the section is put in the parent (IniVars.__setitem__)
         self._SKIgnorecase = parent._SKIgnorecase
-        UserDict.__init__(self)
+
+    @property
+    def data(self):
+        """the section itself (the dict of keys and values), as with UserDict"""
+        return self
 
     def __getitem__(self, key):
-        '''double underscore means internal value'''
         if not isinstance(key, str):
             raise TypeError('inivars, __getitem__ of IniSection expects str for key "%s", not: %s'% (key, type(key)))
-
-        if key.startswith == '__':
-            return self.__dict__[key]
-        key = key.strip()
-        if reWhiteSpace.search(key):
-            key = reWhiteSpace.sub(' ', key)
-        if self._SKIgnorecase:
-            key = key.lower()
         try:
-            value = UserDict.__getitem__(self, key)
-            return value
+            return dict.__getitem__(self, normalizeName(key, self._SKIgnorecase))
         except KeyError:
             return "" 
 
-
     def __setitem__(self, key, value):
-        key = key.strip()
-        if reWhiteSpace.search(key):
-            key = reWhiteSpace.sub(' ', key)
+        if not isinstance(key, str):
+            raise TypeError('inivars, IniSection __setitem__ expects str for key "%s", not: %s'% (key, type(key)))
+        key = normalizeName(key, self._SKIgnorecase)
         if not key:
             raise IniError('__setitem__, invalid key |%s|(false), with value |%s| in inifile: %s'% \
                   (key, value, self._parent._file))
-        
-        if type(key) in (str, bytes):
-            if key.startswith == '__':
-                self.__dict__[key] = value
-            else:
-                if self._SKIgnorecase:
-                    key = key.lower()
-                UserDict.__setitem__(self, key, value)
-        else:
-            raise TypeError('inivars, IniSection __setitem__ expects str for key "%s", not: %s'% (key, type(key)))
-
+        if self._name is not None:
+            self._parent._beforeChange(self._name)
+        dict.__setitem__(self, key, value)
+        if self._name is not None:
+            self._parent._onChange(self._name, key)
 
     def __delitem__(self, key):
-        key = key.strip()
-        if reWhiteSpace.search(key):
-            key = reWhiteSpace.sub(' ', key)
+        if not isinstance(key, str):
+            raise TypeError('inivars, __delitem__ of IniSection expects str for key "%s", not: %s'% (key, type(key)))
+        key = normalizeName(key, self._SKIgnorecase)
         if not key:
             raise IniError('__delitem__, invalid key |%s|(false),  inifile: %s'% \
                   (key, self._parent._file))
-        
-        if type(key) in (str, bytes):
-            if key.startswith == '__':
-                del self.__dict__[key]
-            else:
-                if self._SKIgnorecase:
-                    key = key.lower()
-                try:
-                    UserDict.__delitem__(self, key)
-                except KeyError:
-                    pass
-        else:
-            raise TypeError('inivars, __delitem__ of IniSection expects str for key "%s", not: %s'% (key, type(key)))
+        if self._name is not None:
+            self._parent._beforeChange(self._name)
+        try:
+            dict.__delitem__(self, key)
+        except KeyError:
+            pass
+        if self._name is not None:
+            self._parent._onChange(self._name, key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def copy(self):
+        """return a copy, not attached to the inivars instance"""
+        c = IniSection(self._parent)
+        dict.update(c, self)
+        return c
+
+    # changing methods go through __setitem__ and __delitem__ (as with UserDict):
+    update = MutableMapping.update
+    setdefault = MutableMapping.setdefault
+    pop = MutableMapping.pop
+    popitem = MutableMapping.popitem
+    clear = MutableMapping.clear
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __reduce__(self):
+        return (_newIniSection, (self._parent, self._name, self._SKIgnorecase, dict(self)))
+
+def _newIniSection(parent, name, ignoreCase, keys):
+    """recreate an IniSection (for copy and pickle)"""
+    section = IniSection.__new__(IniSection)
+    dict.update(section, keys)
+    section._parent = parent
+    section._name = name
+    section._SKIgnorecase = ignoreCase
+    return section
+
+class IniDiff:
+    """the difference between two IniVars instances, see IniVars.diff and IniVars.apply
+
+    addedSections: dict section -> dict of keys and values (sections only in the other instance)
+    removedSections: list of sections (only in this instance)
+    for the sections in both instances:
+    addedKeys: dict section -> dict of keys and values (keys only in the other instance)
+    removedKeys: dict section -> list of keys (only in this instance)
+    changedKeys: dict section -> dict key -> (old value, new value)
+
+    All names are normalized, values are as in the inifile (see get with stripping=None).
+    """
+    def __init__(self):
+        self.addedSections = {}
+        self.removedSections = []
+        self.addedKeys = {}
+        self.removedKeys = {}
+        self.changedKeys = {}
 
-    def __iter__(self):
-        return iter(self.data)
+    def __bool__(self):
+        return bool(self.addedSections or self.removedSections or
+                    self.addedKeys or self.removedKeys or self.changedKeys)
+
+    def __eq__(self, other):
+        return isinstance(other, IniDiff) and vars(self) == vars(other)
+
+    def __repr__(self):
+        parts = ['%s=%r'% (name, value) for name, value in vars(self).items() if value]
+        return 'IniDiff(%s)'% ', '.join(parts)
+
+    def getSections(self):
+        """return the set of (added, removed or changed) sections"""
+        return set(self.addedSections).union(self.removedSections, self.addedKeys,
+                                             self.removedKeys, self.changedKeys)
+
+    def getChanges(self):
+        """return the list of changes as (section, key) pairs, key None for a whole section
+
+        in the order apply makes the changes, as given to the change listeners
+        """
+        changes = [(s, None) for s in self.removedSections]
+        changes.extend((s, None) for s in self.addedSections)
+        for keys in (self.removedKeys, self.addedKeys, self.changedKeys):
+            changes.extend((s, k) for s in keys for k in keys[s])
+        return changes
 
-            
-        
 class IniVars(UserDict):
     """do inivars from an .ini file, or possibly (extending this class)
     with other file types.
 
     File doesn't have to exist before.
+
+    decoded values of getList, getDict, getInt, getBool and getFloat are cached per
+    (section, key), until the key or section is set or deleted (see getDecodedCacheInfo).
+
+    with ini.batch(): (or ini.transaction())
+                collects any number of set and delete calls, and writes the inifile
+                once at the end (write calls inside the batch are deferred).
+                The changes are validated first (rendered and parsed back),
+                when this fails, or an exception is raised inside the batch,
+                all changes of the batch are rolled back.
+                The inifile is always written via a temporary file, which replaces
+                the inifile (atomic), so a crash can never leave a truncated inifile.
+
+    option snapshotCache (True or a directory, default None):
+                the parsed sections are stored in a snapshot file (by default in
+                the subdirectory "inivarscache" of the dtactions user directory).
+                When the inifile is not changed (mtime, size and contents hash)
+                the next load takes the snapshot, without parsing again.
+
     version 8:  all go to unicode, and subclass UserDict (november 2018)
 
     version 7:  quoting is allowed when spaces or special characters
@@ -570,6 +855,11 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
         """init from valid files, raise error if invalid file
 
         """
+        # cache of decoded values (getList, getDict, ...), see _getDecoded:
+        self._decoded = {}
+        self._decodedNames = {}
+        self._decodedHits = 0
+        self._decodedMisses = 0
         UserDict.__init__(self)
         # add str function in case file is a path instance:
         self._repairErrors = kw.get('repairErrors', None)
@@ -585,7 +875,25 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
         self._returnStrings = False
         # instance to read (and write back) inifile...
         self._rwfile = readwritefile.ReadWriteFile()
-        self._sectionPostfixesWP = {}   # ???
+        # index of section names: prefix (first word) -> postfixes in order of the sections,
+        # built at first use, and then kept up to date by __setitem__ and __delitem__:
+        self._prefixIndex = None
+        self._sectionPostfixesWP = {}   # prefix -> postfixes, longest first
+        # layout of the file as read (or last written): section name -> (start, end) line numbers
+        # (None if not known, see _renderIni), and the sections changed since:
+        self._sectionSpans = None
+        self._dirtySections = set()
+        self._postfixMatchers = {}      # prefix -> PostfixMatcher (for many postfixes)
+        # batch (transaction): section name -> (section, copy of its keys) or None (new section),
+        # None when no batch is going on:
+        self._journal = None
+        self._batchDepth = 0
+        self._writePending = False
+        # functions called with (section, key) after each change, see addChangeListener:
+        self._changeListeners = []
+        # opt-in parsed-snapshot cache, True (default directory) or a directory:
+        self._snapshotCache = kw.get('snapshotCache', None)
+        self._fromSnapshot = False
         if kw and 'returnStrings' in kw:
             value = kw['returnStrings']
             if value:
@@ -593,6 +901,13 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
         if not self._ext:
             raise IniError('file has no extension: %s'% self._file)
 
+        # contents given as text (the file is not read):
+        if kw.get('text') is not None:
+            if self._ext != 'Ini':
+                raise IniError('text option only valid for .ini files: %s'% self._file)
+            self._readText(File, kw['text'])
+            return
+
         # start with new file:
         if not os.path.isfile(self._file):
             return
@@ -603,6 +918,56 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
             raise IniError('file has invalid extension: %s'% self._file) from exc
         readFunc(self._file)
 
+    @classmethod
+    def loadMany(cls, files, workers=None, processes=False, raiseErrors=True, **kw):
+        """load several inifiles at once, return a dict file -> instance (in the order of files)
+
+        The files are read (and parsed) in a thread pool of `workers` threads, so the
+        file reading overlaps. With processes=True, they are parsed in a process pool
+        (the instances are pickled back).
+        The options (kw) are those of IniVars.
+
+        Errors are as with loading the files one by one: the IniError of the first
+        invalid file (in the order of files) is raised, with its line number.
+        With raiseErrors=False, the IniError is the value for an invalid file.
+
+>>> for f in ('many1.ini', 'many2.ini'):
+...     ini = IniVars(f)
+...     ini.set('s', 'file', f)
+...     ini.write()
+>>> loaded = IniVars.loadMany(['many1.ini', 'many2.ini'], workers=2)
+>>> [(f, ini.get('s', 'file')) for f, ini in loaded.items()]
+[('many1.ini', 'many1.ini'), ('many2.ini', 'many2.ini')]
+        """
+        files = list(files)
+        if processes:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        with executor:
+            futures = [executor.submit(loadIniVars, cls, File, kw) for File in files]
+        result = {}
+        for File, future in zip(files, futures):
+            try:
+                result[File] = future.result()
+            except IniError as exc:
+                if raiseErrors:
+                    raise
+                result[File] = exc
+        return result
+
+    @classmethod
+    def openLazy(cls, File, **kw):
+        """return a (read only) LazyIniVars instance, sections are parsed at first access
+        """
+        return LazyIniVars(File, **kw)
+
+    @classmethod
+    def openConcurrent(cls, File, **kw):
+        """return a ConcurrentIniVars instance, for reading and writing in several threads
+        """
+        return ConcurrentIniVars(cls(File, **kw))
+
     def __bool__(self):
         """always true!"""
         return True
@@ -628,58 +993,39 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
 
         if key.startswith('__'):
             return self.__dict__[key]
-        key = key.strip()
-        if reWhiteSpace.search(key):
-            key = reWhiteSpace.sub(' ', key)
-        if self._SKIgnorecase:
-            key = key.lower()
-        try:
-            value = UserDict.__getitem__(self, key)
-        except KeyError:
-            value = None
-        return value
+        return self.data.get(normalizeName(key, self._SKIgnorecase))
 
     def __setitem__(self, key, value):
-        
-        # if type(key) == bytes:
-        #     key = str(key)
-        
-        key = key.strip()
-        if reWhiteSpace.search(key):
-            key = reWhiteSpace.sub(' ', key)
+        if not isinstance(key, str):
+            raise TypeError('inivars, __setitem__ of IniVars expects str for key "%s", not: %s'% (key, type(key)))
+        key = normalizeName(key, self._SKIgnorecase)
         if not key:
             raise IniError('__setitem__, invalid key |%s|(false), with value |%s| in inifile: %s'% \
                   (key, value, self._file))
-        
-        if type(key) in (str, bytes):
-            if key.startswith == '__':
-                self.__dict__[key] = value
-            else:
-                if self._SKIgnorecase:
-                    key = key.lower()
-                UserDict.__setitem__(self, key, value)
-        else:
-            raise TypeError('inivars, __setitem__ of IniVars expects str for key "%s", not: %s'% (key, type(key)))
+        self._beforeChange(key)
+        if isinstance(value, IniSection):
+            value._name = key
+        isNew = key not in self.data
+        self.data[key] = value
+        self._onChange(key)
+        if isNew and self._prefixIndex is not None:
+            self._addToPrefixIndex(key)
 
     def __delitem__(self, key):
-        key = key.strip()
-        if reWhiteSpace.search(key):
-            key = reWhiteSpace.sub(' ', key)
+        if not isinstance(key, str):
+            raise TypeError('inivars, __delitem__ of IniVars expects str for key "%s", not: %s'% (key, type(key)))
+        key = normalizeName(key, self._SKIgnorecase)
         if not key:
             raise IniError('__delitem__, invalid key |%s|(false) in inifile: %s'% (key, self._file))
-        
-        if isinstance(key, str):
-            if key.startswith == '__':
-                del self.__dict__[key]
-            else:
-                if self._SKIgnorecase:
-                    key = key.lower()
-                try:
-                    UserDict.__delitem__(self, key)
-                except KeyError:
-                    pass
+        self._beforeChange(key)
+        try:
+            del self.data[key]
+        except KeyError:
+            pass
         else:
-            raise TypeError('inivars, __delitem__ of IniVars expects str for key "%s", not: %s'% (key, type(key)))
+            if self._prefixIndex is not None:
+                self._removeFromPrefixIndex(key)
+        self._onChange(key)
             
     def __iter__(self):
         return iter(self.data)
@@ -752,97 +1098,223 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
                                           
         
     def _readIni(self, File):
+        """read the inifile, from the snapshot if possible, otherwise parse it
+        """
         #pylint:disable=W0603
         global lineNum, fileName
+        self._rawtext = self._rwfile.readAnything(File)
+        self._fromSnapshot = False
+        # lineNum and fileName are global (see IniError), parse one file at a time:
+        with _parseLock:
+            lineNum = 0
+            fileName = File
+            if self._snapshotCache:
+                if self._loadSnapshot(File):
+                    return
+            self._parseIni(self._rawtext)
+        if self._snapshotCache:
+            self._saveSnapshot(File)
+
+    def _readText(self, File, text):
+        """parse text as the contents of File (the file itself is not read)
+        """
+        #pylint:disable=W0603
+        global fileName
+        with _parseLock:
+            fileName = File
+            self._parseIni(text)
+
+    def _parseIni(self, rawtext):
+        """parse the text of an inifile in one pass
+
+        lines are classified by their first character, so the name checks are only done
+        on candidate section lines ("[...]") or key lines (word character ... "=").
+        The value of a key is built when the next key or section is found (or at the end of the file),
+        from the line numbers of its first and last non empty line (see listToString).
+        """
+        #pylint:disable=W0603
+        global lineNum
         lineNum = 0
-        fileName = File
-        section = None
+        self._rawtext = rawtext
+        repairErrors = self._repairErrors
+        ignoreCase = self._SKIgnorecase
+        rawList = self._rawtext.split('\n')
+        section = None        # the current section (keys are set with setKey, without bookkeeping)
+        setKey = dict.__setitem__
+        keyNames = {}         # equal key names in different sections share one str object
         sectionName = ''
-        key = None
-        keyName = ''
         sectionNameLines = {}
-        self._rawtext = self._rwfile.readAnything(File)
-
-        # rwfile.writeAnything(output_path, output_string)
-
-        rawList = self._rawtext.split('\n')
-        for line in rawList:
+        # state of the current key:
+        keyName = None        # normalized key name (None: no key in current section yet)
+        keyLine = 0           # index of key line in rawList
+        keyFirst = ''         # value part of the key line
+        firstValueLine = lastValueLine = -1   # indexes of the first and last non empty value lines
+        repaired = False
+        sectionStarts = []    # (normalized section name, index of section line)
+        num = 0
+        for num, line in enumerate(rawList, 1):
             line = line.rstrip()
-            
-            lineNum += 1
-            m = reValidSection.match(line)
-            if self._repairErrors and not m:
+            first = line[:1]
+            isSection = isKey = False
+            if first == '[':
+                isSection = isValidSectionLine(line)
+            elif first and (first.isalnum() or first == '_') and '=' in line:
+                keyPart, _eq, value = line.partition('=')
+                isKey = isValidName(keyPart.rstrip())
+            if repairErrors and not isSection and '[' in line:
                 # with repairErrors option, characters in front of a valid section:
                 n = reValidSection.search(line)
-                if n and not m:
+                if n:
                     print('ignore data in front of section: "%s"\n\t(please correct later in file "%s", line %s)'% (line,
-                                                                fileName, lineNum))                                                 
-                    m = n
-                elif not sectionName:
-                    if not line:
-                        continue
+                                                                fileName, num))
+                    line = line[n.start():]
+                    isSection = True
+                    repaired = True
+            if repairErrors and not isSection and not sectionName:
+                if line:
+                    repaired = True
                     print('no valid section found yet, skip line: "%s"\n\t(please correct later in file "%s", line %s)'% (line,
-                                                                fileName, lineNum))                                                 
-                    continue
-            if m:
-                sectionName = m.group(1).strip()
-                if sectionName in self:
-                    if self._repairErrors:
+                                                                fileName, num))
+                continue
+
+            if isSection or isKey:
+                # close the previous key:
+                if keyName is not None and firstValueLine >= 0:
+                    setKey(section, keyName, joinValueLines(rawList, keyLine, keyFirst, firstValueLine, lastValueLine))
+                keyName = None
+
+            if isSection:
+                sectionName = line[1:line.rindex(']')].strip()
+                if sectionName in self.data:
+                    if repairErrors:
                         print('Warning: duplicate section "%s" on line %s and on line %s, take latter one\n\t(please correct later in file "%s")'% (
-                            sectionName, sectionNameLines[sectionName], lineNum, fileName))
+                            sectionName, sectionNameLines[sectionName], num, fileName))
                         del self[sectionName]
+                        repaired = True
                     else:
+                        lineNum = num
                         raise IniError('Duplicate section "%s" on line %s and on line %s\n\t(please correct in file "%s")'% (
-                            sectionName, sectionNameLines[sectionName], lineNum, fileName))
-                self[sectionName] = IniSection(parent = self)
-                section = self[sectionName]
-                key = None
-                sectionNameLines[sectionName] = lineNum
+                            sectionName, sectionNameLines[sectionName], num, fileName))
+                section = IniSection(parent = self)
+                self[sectionName] = section
+                sectionNameLines[sectionName] = num
+                sectionStarts.append((stripName(sectionName, ignoreCase), num - 1))
                 continue
-            m = reFindKeyValue.match(line)
-            if m:
-                keyName = m.group(1).strip()
+
+            if isKey:
+                name = keyPart.strip()
                 if section is None:
+                    lineNum = num
                     raise IniError('no section defined yet')
-                if keyName in section:
-                    if self._repairErrors:
+                if name in section:
+                    if repairErrors:
                         print('Warning: duplicate keyname "%s" in section %s on line %s, take latter one\n\t(please correct later in file "%s")'% (
-                             keyName, sectionName, lineNum, fileName))
-                        del section[keyName]
+                             name, sectionName, num, fileName))
+                        dict.__delitem__(section, name)
+                        repaired = True
                     else:
+                        lineNum = num
                         raise IniError('Duplicate keyname "%s" in section %s on line %s\n\t(please correct in file "%s")'% (
-                            keyName, sectionName, lineNum, fileName))
-                    
-                section[keyName] = [m.group(2)] 
-                key = section[keyName]
+                            name, sectionName, num, fileName))
+                keyName = stripName(name, ignoreCase)
+                keyName = keyNames.setdefault(keyName, keyName)
+                setKey(section, keyName, '')
+                keyLine = num - 1
+                keyFirst = value
+                if value.strip():
+                    firstValueLine = lastValueLine = keyLine
+                else:
+                    firstValueLine = lastValueLine = -1
                 continue
-            
-            if key:
-                # append to list of lines of key: stripping spaces etc.
-                key.append(line.strip())
+
+            if keyName is not None:
+                # value line of key:
+                if line and not line.isspace():
+                    if firstValueLine < 0:
+                        firstValueLine = num - 1
+                    lastValueLine = num - 1
             elif line.strip():
                 if section is None:
+                    lineNum = num
                     raise IniError('no key or section found yet')
-                if key is None:
-                    if self._repairErrors:
-                        print('Warning: no key found in section "%s" on line %s, ignore\n\t(please correct later in file "%s")'% (
-                             sectionName, lineNum, fileName))
-                        continue
-                    raise IniError('No key found in section "%s" on line %s\n\t(please correct in file "%s")'% (
-                        sectionName, lineNum, fileName))
+                if repairErrors:
+                    print('Warning: no key found in section "%s" on line %s, ignore\n\t(please correct later in file "%s")'% (
+                         sectionName, num, fileName))
+                    repaired = True
+                    continue
+                lineNum = num
+                raise IniError('No key found in section "%s" on line %s\n\t(please correct in file "%s")'% (
+                    sectionName, num, fileName))
+
+        # close the last key:
+        if keyName is not None and firstValueLine >= 0:
+            setKey(section, keyName, joinValueLines(rawList, keyLine, keyFirst, firstValueLine, lastValueLine))
+        lineNum = num
+
+        # the layout for the writer, if no errors were repaired:
+        self._dirtySections.clear()
+        if repaired:
+            self._sectionSpans = None
+        else:
+            ends = [start for _s, start in sectionStarts[1:]] + [len(rawList)]
+            self._sectionSpans = {s: (start, end) for (s, start), end in zip(sectionStarts, ends)}
 
-        
-        for s in self:
-            section = self[s]
-            for k in section:
-                section[k] = listToString(section[k])
+    def _getSnapshotPath(self, File):
+        """path of the snapshot of File, in the default or the given snapshot directory
+        """
+        if self._snapshotCache is True:
+            snapshotDir = getSnapshotDirectory()
+        else:
+            snapshotDir = self._snapshotCache
+        return getSnapshotPath(File, snapshotDir, repairErrors=bool(self._repairErrors),
+                               SKIgnorecase=bool(self._SKIgnorecase))
+
+    def _loadSnapshot(self, File):
+        """fill the instance from a valid snapshot, return True if succeeded
+
+        _rawtext must have been read already (the contents hash is taken from it)
+        """
+        stat = os.stat(File)
+        result = readSnapshot(self._getSnapshotPath(File), stat, getContentHash(self._rawtext))
+        if result is None:
+            return False
+        sections, self._sectionSpans = result
+        for s, keys in sections.items():
+            section = IniSection(parent=self)
+            section._name = s
+            dict.update(section, keys)
+            self.data[s] = section
+        self._dirtySections.clear()
+        self._fromSnapshot = True
+        return True
+
+    def _saveSnapshot(self, File):
+        """write the parsed sections in a snapshot, for a quick next load
+        """
+        stat = os.stat(File)
+        sections = {s: dict(self.data[s].data) for s in self.data}
+        writeSnapshot(self._getSnapshotPath(File), stat, getContentHash(self._rawtext), sections,
+                      self._sectionSpans)
 
     def writeIfChanged(self, File=None):
+        """write if changes were made, but skip the disk write if the text is unchanged
+        """
         if self._changed:
-            self.write(File=File)
+            if File and File != self._file:
+                self.write(File=File)
+            elif self._ext != 'Ini':
+                raise IniError('invalid extension for writing to File: %s'% self._file)
+            else:
+                new = self._renderIni()
+                if new != self._rawtext or not os.path.isfile(self._file):
+                    self._writeIni(self._file, new)
             self._changed = 0
             
     def write(self, File=None):
+        if self._journal is not None and (not File or File == self._file):
+            # inside a batch, written at the end:
+            self._writePending = True
+            return
         if not File:
             File = self._file
             ext = self._ext
@@ -853,8 +1325,198 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
         else:
             raise IniError('invalid extension for writing to File: %s'% File)
 
-    def _writeIni(self, File):
-        """writes to file of type ini"""
+    def _writeIni(self, File, new=None):
+        """writes to file of type ini (new is the text if already rendered)
+
+        after writing to the own file, the written text is the layout for the next write
+        """
+        if new is None:
+            new = self._renderIni()
+        self._writeFile(File, new)
+        if File == self._file:
+            self._setLayout(new)
+
+    def _writeFile(self, File, text):
+        """write text to File via a temporary file, which (atomic) replaces File
+
+        The temporary file is flushed to disk (fsync) before the replace, so File is
+        always either the old or the new text, also after a crash.
+        Writers of the same File (in this process) are serialized, see getFileLock.
+        """
+        tmpFile = '%s.%s-%s.tmp'% (File, os.getpid(), threading.get_ident())
+        with getFileLock(File):
+            try:
+                self._rwfile.writeAnything(tmpFile, text)
+                with open(tmpFile, 'r+b') as f:
+                    os.fsync(f.fileno())
+                replaceFile(tmpFile, File)
+            finally:
+                if os.path.isfile(tmpFile):
+                    os.remove(tmpFile)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """collect set and delete calls, validate and write them once at the end
+
+        A batch inside a batch joins the outer batch.
+        On an exception inside the batch, or when the validation fails,
+        all changes are rolled back (and the exception is raised again).
+        The write holds the file lock, but the reading before does not: for
+        read-modify-write by several writers, see getFileLock.
+
+>>> try: os.remove('batch.ini')
+... except: pass
+>>> ini = IniVars('batch.ini')
+>>> with ini.batch():
+...     ini.set('s', 'k', 'v')
+...     ini.set('s', 'k2', 'v2')
+...     ini.write()
+...     os.path.isfile('batch.ini')
+False
+>>> IniVars('batch.ini').get('s')
+['k', 'k2']
+>>> try:
+...     with ini.transaction():
+...         ini.set('s', 'k', 'other')
+...         ini.delete('s', 'k2')
+...         ini.set('t', 'k', 'v')
+...         raise ValueError('stop')
+... except ValueError:
+...     pass
+>>> ini.get('s', 'k'), ini.get('s'), ini.get()
+('v', ['k', 'k2'], ['s'])
+        """
+        if self._journal is not None:
+            self._batchDepth += 1
+            try:
+                yield self
+            finally:
+                self._batchDepth -= 1
+            return
+        if self._ext != 'Ini':
+            raise IniError('batch only valid for .ini files: %s'% self._file)
+        self._journal = {}
+        self._batchDepth = 1
+        self._writePending = False
+        state = (set(self._dirtySections), self._changed, list(self.data))
+        try:
+            yield self
+            self._validateBatch()
+        except BaseException:
+            self._rollbackBatch(state)
+            raise
+        finally:
+            journal, self._journal = self._journal, None
+            self._batchDepth = 0
+        if self._writePending:
+            self._changed = 1
+        if journal or self._writePending:
+            self.writeIfChanged()
+
+    transaction = batch
+
+    def _beforeChange(self, section):
+        """called before a key of section (or the section itself) is set or deleted
+
+        inside a batch, the first change of a section keeps a copy for a rollback
+        """
+        journal = self._journal
+        if journal is None or section in journal:
+            return
+        old = self.data.get(section)
+        journal[section] = None if old is None else (old, dict(old.data))
+
+    def _rollbackBatch(self, state):
+        """restore the sections changed in the batch (in the order of before), and the changed state
+        """
+        dirtySections, changed, order = state
+        for s, saved in self._journal.items():
+            if s in self.data:
+                UserDict.__delitem__(self, s)
+            if saved is not None:
+                section, keys = saved
+                dict.clear(section)
+                dict.update(section, keys)
+                section._name = s
+                self.data[s] = section
+            self._invalidateDecoded(s)
+        self.data = {s: self.data[s] for s in order if s in self.data}
+        # the order of the sections may be changed, the prefix index is made again at first use:
+        self._prefixIndex = None
+        self._sectionPostfixesWP = {}
+        self._postfixMatchers = {}
+        self._dirtySections, self._changed = dirtySections, changed
+        self._writePending = False
+
+    def _validateBatch(self):
+        """check the changed sections by parsing the rendered text again, raise IniError if invalid
+        """
+        if not self._journal:
+            return
+        text = self._renderIni()
+        parsed = IniVars(self._file, text=text, SKIgnorecase=self._SKIgnorecase)
+        for s in self._journal:
+            if s not in self.data:
+                if s in parsed.data:
+                    raise IniError('batch, deleted section "%s" still present in inifile: %s'% (s, self._file))
+            elif s not in parsed.data or set(parsed.data[s].data) != set(self.data[s].data):
+                raise IniError('batch, section "%s" not written correctly in inifile: %s'% (s, self._file))
+
+    def _setLayout(self, text):
+        """take text as the layout (as read from or written to the inifile), no dirty sections
+        """
+        self._rawtext = text
+        self._sectionSpans = getSectionSpans(text.split('\n'), self._SKIgnorecase)
+        self._dirtySections.clear()
+
+    def _renderIni(self):
+        """return the text of the inifile
+
+        With a known layout (the text as read or last written, see _sectionSpans)
+        only the changed (dirty) sections are rendered again, other sections are taken
+        verbatim from the layout, deleted sections are left out and new sections are added
+        at the end.
+        Without a layout (new file, or read with repaired errors), all sections and keys
+        are rendered, sorted.
+        """
+        if self._sectionSpans is None:
+            return self._renderIniSorted()
+        rawList = self._rawtext.split('\n')
+        spans = self._sectionSpans
+        firstStart = min([start for start, _end in spans.values()], default=len(rawList))
+        L = rawList[:firstStart]
+        for s, (start, end) in spans.items():
+            if s not in self.data:
+                continue
+            if s not in self._dirtySections:
+                L.extend(rawList[start:end])
+                continue
+            original = rawList[start:end]
+            trailing = len(original) - len(stripTrailingEmptyLines(original))
+            L.extend(self._renderSectionLines(s))
+            L.extend(['']*trailing)
+        newSections = [s for s in self.data if s not in spans]
+        if newSections:
+            L = stripTrailingEmptyLines(L)
+            for s in newSections:
+                if L:
+                    L.append('')
+                L.extend(self._renderSectionLines(s))
+            L.append('')
+        return '\n'.join(L)
+
+    def _renderSectionLines(self, s):
+        """render one section, keys in order of the section, without trailing empty lines
+        """
+        L = ['[%s]'% s]
+        hasTrailingNewline = 1   # no empty line after the section header
+        for k, v in self.data[s].items():
+            lines, hasTrailingNewline = self._renderKeyLines(k, v, hasTrailingNewline)
+            L.extend(lines)
+        return stripTrailingEmptyLines(L)
+
+    def _renderIniSorted(self):
+        """render all sections and keys, sorted"""
         L = []
         sections = self.get()
         sections.sort()
@@ -880,106 +1542,100 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
 
             for k in keys:
                 hadTrailingNewline = hasTrailingNewline
-                hasTrailingNewline = 0
-                v = self[s][k]
-                if isinstance(v, int):
-                    L.append('%s = %s' % (k, v))
-                elif isinstance(v, float):
-                    L.append('%s = %s' % (k, v))
-                elif isinstance(v, bool):
-                    L.append('%s = %s' % (k, str(v)))
-                elif not v:
-                    # print 'k: %s(%s)'% (k, type(k))
-                    L.append('%s =' % k)
-                        
-                elif isinstance(v, (list, tuple)):
-                    valueList = list(map(quoteSpecialList, v))
-                    startString = '%s = '% k
-                    length = len(startString)
-                    listToWrite = []
-                    for v in valueList:
-                        if listToWrite and length + len(v) + 2 > self._maxLength:
-                            L.append('%s%s' % (startString, '; '.join(listToWrite)))
-                            listToWrite = [v]
-                            startString = ' '*len(startString)
-                            length = len(startString) + len(v)
-                        else:
-                            listToWrite.append(v)
-                            length += len(v) + 2
-                    if length > 72:
-                        hasTrailingNewline = 1
+                lines, hasTrailingNewline = self._renderKeyLines(k, self[s][k], hadTrailingNewline)
+                L.extend(lines)
+
+            if not hadTrailingNewline:
+                L.append('')
+        return '\n'.join(L)
+
+    def _renderKeyLines(self, k, v, hadTrailingNewline):
+        """return the lines for key k with value v, and if these end with an empty line
+        """
+        L = []
+        hasTrailingNewline = 0
+        if isinstance(v, int):
+            L.append('%s = %s' % (k, v))
+        elif isinstance(v, float):
+            L.append('%s = %s' % (k, v))
+        elif isinstance(v, bool):
+            L.append('%s = %s' % (k, str(v)))
+        elif not v:
+            # print 'k: %s(%s)'% (k, type(k))
+            L.append('%s =' % k)
+                
+        elif isinstance(v, (list, tuple)):
+            valueList = list(map(quoteSpecialList, v))
+            startString = '%s = '% k
+            length = len(startString)
+            listToWrite = []
+            for v in valueList:
+                if listToWrite and length + len(v) + 2 > self._maxLength:
                     L.append('%s%s' % (startString, '; '.join(listToWrite)))
-                    L.append('')
-                elif isinstance(v, dict):
-                    inverse = {}
-                    for K, V in list(v.items()):
-                        if isinstance(V, str):
-                            vv = quoteSpecialDict(V)                            
-                        elif isinstance(V, (list, tuple)):
-                            vv = ', '.join(map(quoteSpecialDict, V))
-                        elif V is None:
-                            vv = None
-                        if vv in inverse:
-                            inverse[vv].append(K)
-                        else:
-                            inverse[vv] = [K]
-                    startString = '%s = '% k
-                    length = len(startString)
-                    if not inverse:
-                        L.append('%s' % startString)
-                    else:
-                        if None in inverse:
-                            L.append('%s%s' % (startString, ', '.join(inverse[None])))
-                            del inverse[None]
-                            startString = ' '*len(startString)
-                        if inverse:
-                            for K, V in list(inverse.items()):
-##                                print 'writing back value: |%s|, startString: |%s|, keys: |%s|'% \
-##                                      (K, startString, V)
-                                L.append('%s%s: %s' % (startString, ', '.join(V), K))
-                                startString = ' '*len(startString)
-                    hasTrailingNewline = 1
-                    L.append('')
+                    listToWrite = [v]
+                    startString = ' '*len(startString)
+                    length = len(startString) + len(v)
                 else:
-                    if not isinstance(v, str):
-                        v = str(v)
-                    v = v.strip()
-                    if v.find('\n') >= 0:
-                        hasTrailingNewline = 1
-                        V = v.split('\n')
-                        if not hadTrailingNewline:
-                            L.append('')    # 1 extra newline
-                        L.append('%s =' % k)
-                        spacing = ' '*4
-                        for li in V:
-                            if li:
-                                L.append('%s%s' % (spacing, li))
-                            else:
-                                L.append('')
-                        L.append('')
-                    elif len(k) + len(v) > 72:
-                        if not hasTrailingNewline:
-                            L.append('')
-                        L.append('%s = %s' % (k, v))
-                        L.append('')
-                        hasTrailingNewline = 1
+                    listToWrite.append(v)
+                    length += len(v) + 2
+            if length > 72:
+                hasTrailingNewline = 1
+            L.append('%s%s' % (startString, '; '.join(listToWrite)))
+            L.append('')
+        elif isinstance(v, dict):
+            inverse = {}
+            for K, V in list(v.items()):
+                if isinstance(V, str):
+                    vv = quoteSpecialDict(V)                            
+                elif isinstance(V, (list, tuple)):
+                    vv = ', '.join(map(quoteSpecialDict, V))
+                elif V is None:
+                    vv = None
+                if vv in inverse:
+                    inverse[vv].append(K)
+                else:
+                    inverse[vv] = [K]
+            startString = '%s = '% k
+            length = len(startString)
+            if not inverse:
+                L.append('%s' % startString)
+            else:
+                if None in inverse:
+                    L.append('%s%s' % (startString, ', '.join(inverse[None])))
+                    del inverse[None]
+                    startString = ' '*len(startString)
+                if inverse:
+                    for K, V in list(inverse.items()):
+                        L.append('%s%s: %s' % (startString, ', '.join(V), K))
+                        startString = ' '*len(startString)
+            hasTrailingNewline = 1
+            L.append('')
+        else:
+            if not isinstance(v, str):
+                v = str(v)
+            v = v.strip()
+            if v.find('\n') >= 0:
+                hasTrailingNewline = 1
+                V = v.split('\n')
+                if not hadTrailingNewline:
+                    L.append('')    # 1 extra newline
+                L.append('%s =' % k)
+                spacing = ' '*4
+                for li in V:
+                    if li:
+                        L.append('%s%s' % (spacing, li))
                     else:
-                        L.append('%s = %s' % (k, v))
-
-            if not hadTrailingNewline:
+                        L.append('')
                 L.append('')
-##        if path(self._file).isfile():
-##            old = open(self._file).read()
-##        else:
-##            old = ""
-        new = '\n'.join(L)
-##        if old == new:
-
-##            pass
-####            print 'no changes'
-##        else:
-####            self.saveOldInifile()
-        self._rwfile.writeAnything(File, new)
+            elif len(k) + len(v) > 72:
+                if not hasTrailingNewline:
+                    L.append('')
+                L.append('%s = %s' % (k, v))
+                L.append('')
+                hasTrailingNewline = 1
+            else:
+                L.append('%s = %s' % (k, v))
+        return L, hasTrailingNewline
 
     def saveOldInifile(self):
         """make copy -1, ..., -9 for previous versions"""
@@ -1027,9 +1683,7 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
         #pylint:disable=W0237
         if isinstance(s, (list, tuple)):
             if k:
-                k = k.strip()
-                if reWhiteSpace.search(k):
-                    k = reWhiteSpace.sub(' ', k)
+                k = normalizeName(k)
                 # look for the section with this key
                 for S in s:
 
@@ -1037,42 +1691,27 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
                     if v is not None:
                         return v
                 return value
-            # get list of all keys with these sections:
-            L = []
-            for S in s:
-                l = self.get(S)
-                for _k in l:
-                    if k not in L:
-                        L.append(_k)
-                return L
-            # not found, return default:
-            if k:
-                return value
-            # asking for list of possible keys:
-            return L
+            # get list of all keys with these sections (each key once, in order):
+            return mergeOrdered(self.get(S) for S in s)
         if s:
-            s = s.strip()
-            if reWhiteSpace.search(s):
-                s = reWhiteSpace.sub(' ', s)
+            section = self.data.get(normalizeName(s, self._SKIgnorecase))
 
-            if self.hasSection(s):
+            if section is not None:
                 # s exists, process key requests
                 if k:
-                    k = k.strip()
-                    if reWhiteSpace.search(k):
-                        k = reWhiteSpace.sub(' ', k)
+                    k = normalizeName(k, self._SKIgnorecase)
 
                     # request value from s,k
-                    if self.hasKey(s, k):
+                    if k in section:
                         # k exists, return value
-                        v = self[s][k]
+                        v = section[k]
                         if stripping and isinstance(v, str):
                             return stripping(v)
                         return v
                     # no key, return default value
                     return value
                 # no key given, request a list of keys
-                KeysList = list(self[s].keys())
+                KeysList = list(section.keys())
                 return KeysList
             if k:
                 return value
@@ -1140,9 +1779,7 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
             s = str(s)
 
         # now make new section if not existing before:
-        s = s.strip()
-        if reWhiteSpace.search(s):
-            s = reWhiteSpace.sub(' ', s).strip()
+        s = normalizeName(s)
 
         if not reValidSection.match('['+s+']'):
             raise IniError("Invalid section name to set to: %s"% s)
@@ -1168,9 +1805,7 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
             
         # finally set s, k, to v
 
-        k = k.strip()
-        if reWhiteSpace.search(k):
-            k = reWhiteSpace.sub(' ', k)
+        k = normalizeName(k)
         if reQuotes.search(k):
             k = reQuotes.sub('', k)
         if not reValidKey.match(k):
@@ -1215,19 +1850,14 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
         >>>
         """
         if s:
-            s = s.strip()
-        if s and reWhiteSpace.search(s):
-            s = reWhiteSpace.sub(' ', s)
+            s = normalizeName(s)
 
         if s:
             if self.hasSection(s):
                 # s exists
                 if k:
-                    k = k.strip()
+                    k = normalizeName(k)
                 if k:
-                    if reWhiteSpace.search(k):
-                        k = reWhiteSpace.sub(' ', k)
-
                     # delete given key
                     if self.hasKey(s, k):
                         # k exists, delete it
@@ -1247,36 +1877,13 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
                 self.clear()
 
     def hasSection(self, s):
-        if reWhiteSpace.search(s):
-            s = reWhiteSpace.sub(' ', s).strip()
-        if self._SKIgnorecase:
-            s = s.lower()
-        return s in self
+        return normalizeName(s, self._SKIgnorecase) in self.data
 
     def hasKey(self, s, k):
-        k = k.strip()
-        if reWhiteSpace.search(k):
-            k = reWhiteSpace.sub(' ', k)
-        s = s.strip()
-        if reWhiteSpace.search(s):
-            s = reWhiteSpace.sub(' ', s)
-        if self._SKIgnorecase:
-            s = s.lower()
-            k = k.lower()
-
-        return self.hasSection(s) and k in self[s]
+        section = self.data.get(normalizeName(s, self._SKIgnorecase))
+        return section is not None and normalizeName(k, self._SKIgnorecase) in section
 
     def hasValue(self, s, k):
-        k = k.strip()
-        if reWhiteSpace.search(k):
-            k = reWhiteSpace.sub(' ', k)
-        s = s.strip()
-        if reWhiteSpace.search(s):
-            s = reWhiteSpace.sub(' ', s)
-        if self._SKIgnorecase:
-            s = s.lower()
-            k = k.lower()
-            
         return self.hasKey(s, k) and self[s][k]
 
     def close(self):
@@ -1306,6 +1913,199 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
 ##        """
 ##        return IniVars(file)
 
+    def _onChange(self, section, key=None):
+        """called when a key (or with key None a section) is set or deleted
+
+        section and key are normalized names.
+        Drops the decoded values, marks the section as changed (dirty) for the writer
+        and calls the change listeners (see addChangeListener).
+        """
+        self._invalidateDecoded(section, key)
+        self._dirtySections.add(section)
+        for func in self._changeListeners:
+            func(section, key)
+
+    def addChangeListener(self, func):
+        """call func(section, key) after each change of a key, or of a section (key None)
+
+        section and key are normalized names. With this, a cache that depends on
+        the inivars (eg section lists, meta actions) can drop only the entries
+        of the changed sections and keys, also for a diff that is applied (see apply).
+
+>>> ini = IniVars('listen.ini', text='[s]\\nk = v\\n')
+>>> changes = []
+>>> ini.addChangeListener(lambda s, k: changes.append((s, k)))
+>>> ini.set('s', 'k', 'other')
+>>> ini.delete('s')
+>>> changes
+[('s', 'k'), ('s', None)]
+        """
+        if func not in self._changeListeners:
+            self._changeListeners.append(func)
+
+    def removeChangeListener(self, func):
+        """stop calling func, see addChangeListener"""
+        if func in self._changeListeners:
+            self._changeListeners.remove(func)
+
+    def diff(self, other):
+        """return the difference with other (IniVars instance) as an IniDiff
+
+        self.apply(self.diff(other)) makes self equal to other. The diff of an
+        inifile that is read again (after an edit) gives the sections and keys
+        that have been changed, so only these need to be handled.
+
+>>> old = IniVars('diff.ini', text='[a]\\nk = 1\\nk2 = 2\\n[b]\\nk = 1\\n')
+>>> new = IniVars('diff.ini', text='[a]\\nk = 1\\nk2 = 3\\nk3 = 4\\n[c]\\nk = 1\\n')
+>>> d = old.diff(new)
+>>> d
+IniDiff(addedSections={'c': {'k': '1'}}, removedSections=['b'], addedKeys={'a': {'k3': '4'}}, changedKeys={'a': {'k2': ('2', '3')}})
+>>> sorted(d.getSections())
+['a', 'b', 'c']
+>>> old.apply(d)
+>>> old.toDict() == new.toDict(), bool(old.diff(new))
+(True, False)
+        """
+        result = IniDiff()
+        mine, theirs = self.data, other.data
+        for s in mine:
+            if s not in theirs:
+                result.removedSections.append(s)
+        for s in theirs:
+            otherSection = theirs[s]
+            if s not in mine:
+                result.addedSections[s] = dict(otherSection)
+                continue
+            section = mine[s]
+            if section == otherSection:
+                continue
+            removed = [k for k in section if k not in otherSection]
+            added = {}
+            changed = {}
+            for k, v in otherSection.items():
+                if k not in section:
+                    added[k] = v
+                elif section[k] != v:
+                    changed[k] = (section[k], v)
+            if removed:
+                result.removedKeys[s] = removed
+            if added:
+                result.addedKeys[s] = added
+            if changed:
+                result.changedKeys[s] = changed
+        return result
+
+    def apply(self, diff):
+        """make the changes of diff (an IniDiff, see diff), as with set and delete
+
+        the change listeners are called for each change (see IniDiff.getChanges).
+        """
+        if not diff:
+            return
+        self._changed = 1
+        for s in diff.removedSections:
+            if s in self.data:
+                del self[s]
+        for s, keys in diff.addedSections.items():
+            section = IniSection(parent=self)
+            dict.update(section, keys)
+            self[s] = section
+        for s, keys in diff.removedKeys.items():
+            section = self.data[s]
+            for k in keys:
+                del section[k]
+        for s, keys in diff.addedKeys.items():
+            section = self.data[s]
+            for k, v in keys.items():
+                section[k] = v
+        for s, keys in diff.changedKeys.items():
+            section = self.data[s]
+            for k, (_old, v) in keys.items():
+                section[k] = v
+
+    def _getDecoded(self, section, key, kind):
+        """return (cacheKey, decoded value) from the cache of decoded values
+
+        decoded value is None if not in the cache (cacheKey is None if section or key is not a str).
+        The cached values are immutable (lists are cached as tuples),
+        the get functions return fresh (mutable) copies, so callers cannot corrupt the cache.
+        """
+        if not (isinstance(section, str) and isinstance(key, str)):
+            return None, None
+        cacheKey = (section, key, kind)
+        value = self._decoded.get(cacheKey)
+        if value is None:
+            self._decodedMisses += 1
+        else:
+            self._decodedHits += 1
+        return cacheKey, value
+
+    def _setDecoded(self, cacheKey, value):
+        """put a decoded value in the cache, registered under the normalized section and key names
+        """
+        if cacheKey is None:
+            return
+        section, key, _kind = cacheKey
+        sectionName = normalizeName(section, self._SKIgnorecase)
+        keyName = normalizeName(key, self._SKIgnorecase)
+        self._decoded[cacheKey] = value
+        self._decodedNames.setdefault(sectionName, {}).setdefault(keyName, set()).add(cacheKey)
+
+    def _invalidateDecoded(self, section=None, key=None):
+        """remove decoded values of a key, of a section (key None), or all (section None)
+
+        section and key are normalized names. Called when keys or sections are set or deleted.
+        """
+        if not self._decoded:
+            return
+        if section is None:
+            self._decoded.clear()
+            self._decodedNames.clear()
+            return
+        keyNames = self._decodedNames.get(section)
+        if not keyNames:
+            return
+        if key is None:
+            cacheKeySets = list(keyNames.values())
+            del self._decodedNames[section]
+        else:
+            cacheKeySets = [keyNames.pop(key, ())]
+        for cacheKeys in cacheKeySets:
+            for cacheKey in cacheKeys:
+                self._decoded.pop(cacheKey, None)
+
+    def getDecodedCacheInfo(self):
+        """return hits, misses and size of the cache of decoded values (getList, getDict, getInt, ...)
+
+        >>> import os
+        >>> try: os.remove('decoded.ini')
+        ... except: pass
+        >>> ini = IniVars('decoded.ini')
+        >>> ini.set('s', 'list', 'a; b')
+        >>> ini.getList('s', 'list')
+        ['a', 'b']
+        >>> L = ini.getList('s', 'list')
+        >>> L.append('c')
+        >>> ini.getList('s', 'list')
+        ['a', 'b']
+        >>> ini.getDecodedCacheInfo()
+        {'hits': 2, 'misses': 1, 'size': 1}
+
+        setting (or deleting) the key invalidates the cached value:
+
+        >>> ini.set('s', 'list', 'a; b; c; d')
+        >>> ini.getList('s', 'list')
+        ['a', 'b', 'c', 'd']
+        >>> ini.getDecodedCacheInfo()
+        {'hits': 2, 'misses': 2, 'size': 1}
+        >>> ini.delete('s', 'list')
+        >>> ini.getList('s', 'list')
+        []
+        >>> ini.getDecodedCacheInfo()['size']
+        0
+        """
+        return dict(hits=self._decodedHits, misses=self._decodedMisses, size=len(self._decoded))
+
     def getTuple(self, section, key):
         return tuple(self.getList(section, key))
 
@@ -1333,6 +2133,9 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
         """
         if not self:
             return []
+        cacheKey, decoded = self._getDecoded(section, key, 'list')
+        if decoded is not None:
+            return list(decoded)
         try:
             value = self[section][key]
         except (KeyError, TypeError) as exc:
@@ -1342,10 +2145,12 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
                 return list(default)
             raise IniError('invalid type for default of getList: |%s|%`default`') from exc
         if not value:
-            return []
+            # missing (or empty) key:
+            return list(default) if default else []
         if isinstance(value, list):
             return list(value)
         L = list(getIniList(value))
+        self._setDecoded(cacheKey, tuple(L))
         return L
 
     def getDict(self, section, key, default=None):
@@ -1412,6 +2217,9 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
         >>> ini.close()
         
         """
+        cacheKey, decoded = self._getDecoded(section, key, 'dict')
+        if decoded is not None:
+            return {k: list(v) if isinstance(v, tuple) else v for k, v in decoded.items()}
         try:
             value = self[section][key]
         except (TypeError, KeyError) as exc:
@@ -1437,7 +2245,7 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
                     raise IniError('duplicate key |%s| in getDict: %s'%
                                    (k, value))
                 D[k] = v
-            
+        self._setDecoded(cacheKey, {k: tuple(v) if isinstance(v, list) else v for k, v in D.items()})
         return D
             
     def getInt(self, section, key, default=0):
@@ -1470,6 +2278,9 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
         
         
         """
+        cacheKey, decoded = self._getDecoded(section, key, 'int')
+        if decoded is not None:
+            return decoded
         try:
             i = self[section][key]
         except (KeyError, TypeError):
@@ -1480,15 +2291,18 @@ Warning inivars: returnStrings is Obsolete, inivars only returns Unicode
         if isinstance(i, str):
             if i:
                 try:
-                    return int(i)
+                    result = int(i)
                 except ValueError as exc:
                     if i in ('t', 'T'):
                         print('ini method getInt, got "%s", return 1'% i)
-                        return 1
-                    if i in ('f', 'F'):
+                        result = 1
+                    elif i in ('f', 'F'):
                         print('ini method getInt, got "%s", return 0'% i)
-                        return 0
-                    raise IniError('ini method getInt, value not a valid integer: %s (section: %s, key: %s)'% (section, key, i)) from exc
+                        result = 0
+                    else:
+                        raise IniError('ini method getInt, value not a valid integer: %s (section: %s, key: %s)'% (section, key, i)) from exc
+                self._setDecoded(cacheKey, result)
+                return result
             else:
                 return default
         raise IniError('invalid type for getInt (probably intermediate set without write: %s)(section: %s, key: %s'%
@@ -1504,6 +2318,9 @@ empty, o, f, F, False, false, Onwaar, o, none -->> False
         
         
         """
+        cacheKey, decoded = self._getDecoded(section, key, 'bool')
+        if decoded is not None:
+            return decoded
         try:
             i = self[section][key]
         except (KeyError, TypeError):
@@ -1512,11 +2329,14 @@ empty, o, f, F, False, false, Onwaar, o, none -->> False
             return False
         i = str(i)
         if i.lower()[0] in ['t', 'w', '1']:
-            return True
-        if i.lower()[0] in ['f', 'o', '0']:
-            return False
-        print('inivars, getBool, unexpected value: "%s" (section: %s, key: %s), return False'% (i, section, key))
-        return False
+            result = True
+        elif i.lower()[0] in ['f', 'o', '0']:
+            result = False
+        else:
+            print('inivars, getBool, unexpected value: "%s" (section: %s, key: %s), return False'% (i, section, key))
+            result = False
+        self._setDecoded(cacheKey, result)
+        return result
     
     def getFloat(self, section, key, default=0.0):
         """get a value and convert into a float
@@ -1531,23 +2351,34 @@ empty, o, f, F, False, false, Onwaar, o, none -->> False
         3.0
         >>> ini.getFloat('s', 'unknown')
         0.0
+        >>> ini.getFloat('s', 'unknown', 1.5)
+        1.5
+        >>> ini.getFloat('unknown section', 'unknown', 2.5)
+        2.5
         
         """
+        cacheKey, decoded = self._getDecoded(section, key, 'float')
+        if decoded is not None:
+            return decoded
         try:
             i = self[section][key]
-        except KeyError:
+        except (KeyError, TypeError):
             return default
         if isinstance(i, float):
             return i
         if isinstance(i, str):
             if i:
                 try:
-                    return float(i)
+                    result = float(i)
+                    self._setDecoded(cacheKey, result)
+                    return result
                 except ValueError as exc:
                     if ',' in i:
                         j = i.replace(',', '.')
                         try:
-                            return float(j)
+                            result = float(j)
+                            self._setDecoded(cacheKey, result)
+                            return result
                         except ValueError as exc2:
                             raise IniError('ini method getFloat, value not a valid floating number (comma replaced to dot): %s (section: %s, key: %s)'%
                                        (section, key, i)) from exc2
@@ -1555,9 +2386,62 @@ empty, o, f, F, False, false, Onwaar, o, none -->> False
                         raise IniError('ini method getFloat, value not a valid floating number: %s (section: %s, key: %s)'%
                                    (section, key, i)) from exc
             else:
-                return 0.0
+                return default
         raise IniError('invalid type for getFloat (probably intermediate set without write: %s)(section: %s, key: %s'%
                        (repr(i), section, key))
+
+    def compileSchema(self, schema):
+        """convert and check all values of schema in one pass, return a read only structure
+
+        schema: dict with section names as keys, and as values a dict of key name -> type
+        (str, int, bool, float, list or dict) or (type, default).
+        The values are converted like with get, getInt, getBool, getFloat, getList and getDict,
+        missing keys get the default (or the default of the get function).
+        A value that cannot be converted raises IniError now, instead of at use.
+
+        The result has the sections as attributes, and a section the keys as attributes
+        (namedtuples, names are converted with schemaName). Lists become tuples and dicts
+        are read only. The result does not follow later changes, compile again after those.
+
+>>> try: os.remove('schema.ini')
+... except: pass
+>>> ini = IniVars('schema.ini')
+>>> ini.set('general', 'pause between keys', '10')
+>>> ini.set('general', 'programs', 'word; excel')
+>>> ini.set('general', 'debug', 'T')
+>>> settings = ini.compileSchema({'general': {'pause between keys': int, 'programs': list,
+...                                           'debug': bool, 'factor': (float, 1.5)}})
+>>> settings.general.pause_between_keys, settings.general.programs
+(10, ('word', 'excel'))
+>>> settings.general.debug, settings.general.factor
+(True, 1.5)
+>>> ini.set('general', 'pause between keys', 'ten')
+>>> ini.compileSchema({'general': {'pause between keys': int}}) #doctest: +IGNORE_EXCEPTION_DETAIL
+Traceback (most recent call last):
+IniError: ini method getInt, value not a valid integer
+        """
+        sections = {}
+        for sectionName, keys in schema.items():
+            values = {}
+            for keyName, spec in keys.items():
+                kind, default = spec if isinstance(spec, tuple) else (spec, None)
+                getterName = schemaGetters.get(kind)
+                if getterName is None:
+                    raise IniError('compileSchema, invalid type for section "%s", key "%s": %s'% (sectionName, keyName, kind))
+                getter = getattr(self, getterName)
+                if default is None:
+                    value = getter(sectionName, keyName)
+                else:
+                    if kind is list:
+                        default = list(default)
+                    value = getter(sectionName, keyName, default)
+                if isinstance(value, list):
+                    value = tuple(value)
+                elif isinstance(value, dict):
+                    value = MappingProxyType({k: tuple(v) if isinstance(v, list) else v for k, v in value.items()})
+                addSchemaValue(values, keyName, value)
+            addSchemaValue(sections, sectionName, getSchemaRecord(tuple(values))(**values))
+        return getSchemaRecord(tuple(sections))(**sections)
     
         
                 
@@ -1566,8 +2450,8 @@ empty, o, f, F, False, false, Onwaar, o, none -->> False
         """get all postfixes of sections, sorted, with a given prefix.
 
         A list is returned (and also set in the private variable _sectionPostfixesWP).
-        So repeated calls can be handled quicker, BUT no refreshing is done!  A static
-        ini instance is supposed.
+        So repeated calls can be handled quicker. The index of prefixes and postfixes
+        is kept up to date when sections are set or deleted.
 
         Prefix and postfix are separated by one space, and the list that is returned
         can be empty and is sorted by longest postfix first.
@@ -1590,6 +2474,16 @@ empty, o, f, F, False, false, Onwaar, o, none -->> False
         >>> ini.getSectionPostfixesWithPrefix('pr')
         []
 
+        New (or deleted) sections are found in the next call:
+        >>> ini.set('pref spam', 'key', '7')
+        >>> ini.getSectionPostfixesWithPrefix('pref')
+        ['spam', 'eggs', 'faa', 'foo', 'f', '']
+        >>> ini.getSectionsWithPrefix('pref', 'spam and eggs')
+        ['pref spam', 'pref eggs', 'pref']
+        >>> ini.delete('pref spam')
+        >>> ini.getSectionPostfixesWithPrefix('pref')
+        ['eggs', 'faa', 'foo', 'f', '']
+
         
         Now go and search back, longest match first!
         >>> ini.getFromSectionsWithPrefix('pr', 'foo bar eggs', 'key')
@@ -1694,25 +2588,51 @@ empty, o, f, F, False, false, Onwaar, o, none -->> False
         """
         if prefix in self._sectionPostfixesWP:
             return self._sectionPostfixesWP[prefix]
-        # call with new prefix, construct new entry:        
-        l = []
-        for s in self.get():
-            if s.find(prefix) == 0:
-                L = [item.strip() for item in s.split(' ', 1)]
-                if L[0] == prefix: # proceed:
-                    if len(L) == 2:
-                        if ' '.join(L) != s:
-                            raise IniError('getting section postfixes with prefix, exactly 1 space'
-                                           'required bewtween prefix and postfix: %s'% s)
-                        l.append(L[1]) # combined section key "prefix rest"
-                    else:
-                        l.append('')   # section key identical prefix, adding ''
-        if l:
-            l.sort(key=len)
-            l.reverse()
+        if self._prefixIndex is None:
+            self._buildPrefixIndex()
+        # longest first, with equal length the last section first:
+        l = sorted(reversed(self._prefixIndex.get(prefix, [])), key=len, reverse=True)
         self._sectionPostfixesWP[prefix] = l
-##        print 'new entry of _sectionPostfixesWP,%s: %s'% (prefix, l)
-        return self._sectionPostfixesWP[prefix]
+        return l
+
+    def _buildPrefixIndex(self):
+        """make the index of prefixes (first word of section name) and postfixes (the rest)
+        """
+        # built apart, so readers (of a snapshot) in other threads never see half an index:
+        index = {}
+        for s in self.data:
+            prefix, _sep, postfix = s.partition(' ')
+            index.setdefault(prefix, []).append(postfix)
+        self._prefixIndex = index
+
+    def _addToPrefixIndex(self, sectionName):
+        prefix, _sep, postfix = sectionName.partition(' ')
+        self._prefixIndex.setdefault(prefix, []).append(postfix)
+        self._sectionPostfixesWP.pop(prefix, None)
+        self._postfixMatchers.pop(prefix, None)
+
+    def _removeFromPrefixIndex(self, sectionName):
+        prefix, _sep, postfix = sectionName.partition(' ')
+        postfixes = self._prefixIndex.get(prefix)
+        if postfixes and postfix in postfixes:
+            postfixes.remove(postfix)
+            if not postfixes:
+                del self._prefixIndex[prefix]
+        self._sectionPostfixesWP.pop(prefix, None)
+        self._postfixMatchers.pop(prefix, None)
+
+    def _matchPostfixes(self, prefix, longerText):
+        """return the postfixes of prefix that occur in longerText, longest first
+
+        with many postfixes a PostfixMatcher scans longerText once.
+        """
+        postfixes = self.getSectionPostfixesWithPrefix(prefix)
+        if len(postfixes) < postfixMatcherThreshold:
+            return [postfix for postfix in postfixes if longerText.find(postfix) >= 0]
+        matcher = self._postfixMatchers.get(prefix)
+        if matcher is None:
+            matcher = self._postfixMatchers[prefix] = PostfixMatcher(postfixes)
+        return matcher.match(longerText)
 
     def getFromSectionsWithPrefix(self, prefix, longerText, key):
         """get from all possible sections, as soon as longerText is found in postfix,
@@ -1721,17 +2641,13 @@ empty, o, f, F, False, false, Onwaar, o, none -->> False
         examples see above
 
         """
-        postfixes = self.getSectionPostfixesWithPrefix(prefix)
-        
-        for postfix  in postfixes:
-            if postfix and longerText.find(postfix) >= 0:
+        for postfix in self._matchPostfixes(prefix, longerText):
+            if postfix:
                 v = self.get(prefix + ' ' + postfix, key)
-                if v:
-                    return v
-            elif not postfix:   # empty string, the section is [prefix] only
+            else:   # empty string, the section is [prefix] only
                 v = self.get(prefix, key)
-                if v:
-                    return v
+            if v:
+                return v
         return ''
 
 
@@ -1748,11 +2664,7 @@ empty, o, f, F, False, false, Onwaar, o, none -->> False
         if longerText is None:
             L = [prefix + ' ' + postfix for postfix in postfixes]
         elif isinstance(longerText, str):
-            # print 'longerText: %s (%s)'% (longerText, type(longerText))
-            # for postfix in postfixes:
-            #     print '---postfix: %s (%s)'% (postfix, type(postfix))
-            L = [prefix + ' ' + postfix for postfix in postfixes
-                                    if longerText.find(postfix) >= 0]
+            L = [prefix + ' ' + postfix for postfix in self._matchPostfixes(prefix, longerText)]
         elif isinstance(longerText, (list, tuple)):
             L = [prefix + ' ' + postfix for postfix in longerText if postfix in postfixes ]
         else:
@@ -1768,15 +2680,11 @@ empty, o, f, F, False, false, Onwaar, o, none -->> False
         examples and testing see above        
 
         """
-        allKeys = []
+        allKeys = set()
         D = {}
         for s in sectionList:
-            keys = self.get(s)
-            D[s] = []
-            for k in keys:
-                if k not in allKeys:
-                    D[s].append(k)
-                    allKeys.append(k)
+            D[s] = newKeys = [k for k in self.get(s) if k not in allKeys]
+            allKeys.update(newKeys)
         return D
 
     def ifOnlyNumbersInValues(self, sectionName):
@@ -1938,6 +2846,608 @@ empty, o, f, F, False, false, Onwaar, o, none -->> False
                 raise TypeError('inivars, fromDict, invalid value for section "%s", should be a dict: %s'%
                                 (section, repr(kv)))
 
+class LazySections(MutableMapping):
+    """the sections of a LazyIniVars instance, each section is parsed at first access
+
+    Holds the offset index of the section headers (see getSectionIndex);
+    section name -> IniSection, or None when not parsed (yet).
+    """
+    def __init__(self, parent, File):
+        self._parent = parent
+        self._file = File
+        # one encoding for the whole file, as IniVars decodes the whole file:
+        self._encoding = detectEncoding(File)
+        self._index, self._stat = getSectionIndex(File, ignoreCase=parent._SKIgnorecase,
+                                                  repairErrors=parent._repairErrors,
+                                                  encoding=self._encoding)
+        self._sections = dict.fromkeys(self._index)
+
+    def __getitem__(self, name):
+        section = self._sections[name]
+        if section is None:
+            section = self._sections[name] = self._loadSection(name)
+        return section
+
+    def __setitem__(self, name, section):
+        self._sections[name] = section
+
+    def __delitem__(self, name):
+        del self._sections[name]
+
+    def __contains__(self, name):
+        return name in self._sections
+
+    def __iter__(self):
+        return iter(self._sections)
+
+    def __len__(self):
+        return len(self._sections)
+
+    def isLoaded(self, name):
+        """true if section name is parsed already (or set)"""
+        return self._sections.get(name) is not None
+
+    def unload(self, name):
+        """forget the parsed section name (parsed again at next access), if not changed"""
+        if name in self._index and name not in self._parent._dirtySections:
+            self._sections[name] = None
+
+    def _loadSection(self, name):
+        """read and parse the text of section name from the file
+        """
+        start, end = self._index[name]
+        with open(self._file, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if (stat.st_mtime_ns, stat.st_size) != (self._stat.st_mtime_ns, self._stat.st_size):
+                raise IniError('inifile changed since it was opened lazily: %s'% self._file)
+            f.seek(start)
+            raw = f.read(end - start)
+        text = decodeBytes(raw, [self._encoding]).replace('\r\n', '\n')
+        parent = self._parent
+        parsed = IniVars(self._file, text=text, SKIgnorecase=parent._SKIgnorecase,
+                         repairErrors=parent._repairErrors)
+        section = parsed.data[name]
+        section._parent = parent
+        return section
+
+class LazyIniVars(IniVars):
+    """IniVars instance of which the sections are read and parsed at first access
+
+    Made by IniVars.openLazy(File). Opening only builds an index of the section headers
+    (via mmap), the text of the file is not kept. Reading functions (get, getList, ...)
+    work as with IniVars, the instance is read only (set, delete and write raise IniError).
+    The encoding is detected once for the whole file (see detectEncoding), as IniVars does.
+    Text before the first section is not checked, and with repairErrors, section
+    headers after other text on the same line are not found.
+
+>>> try: os.remove('lazy.ini')
+... except: pass
+>>> ini = IniVars('lazy.ini')
+>>> ini.set('s', 'k', 'v')
+>>> ini.set('t', 'k', 'a; b')
+>>> ini.write()
+>>> lazy = IniVars.openLazy('lazy.ini')
+>>> lazy.get(), lazy.data.isLoaded('t')
+(['s', 't'], False)
+>>> lazy.getList('t', 'k'), lazy.data.isLoaded('t'), lazy.data.isLoaded('s')
+(['a', 'b'], True, False)
+    """
+    def __init__(self, File, **kw):
+        IniVars.__init__(self, File, **kw)
+        if self._ext != 'Ini':
+            raise IniError('only .ini files can be opened lazily: %s'% self._file)
+
+    def _readIni(self, File):
+        """build the section index, the sections are parsed at first access"""
+        #pylint:disable=W0603
+        global fileName
+        with _parseLock:
+            fileName = File
+            self.data = LazySections(self, File)
+
+    def _beforeChange(self, section):
+        raise IniError('inifile opened lazily is read only: %s'% self._file)
+
+    def set(self, s, k=None, v=None):
+        raise IniError('inifile opened lazily is read only: %s'% self._file)
+
+    def delete(self, s=None, k=None):
+        raise IniError('inifile opened lazily is read only: %s'% self._file)
+
+    def write(self, File=None):
+        raise IniError('inifile opened lazily is read only: %s'% self._file)
+
+    def writeIfChanged(self, File=None):
+        if self._changed:
+            self.write(File)
+
+class LayeredIniSection(IniSection):
+    """a merged section of a LayeredIniVars instance
+
+    the changes (ini[s][k] = v, del ini[s][k], update, pop, ...) go to the top layer,
+    via set and delete of the LayeredIniVars instance.
+    """
+    __slots__ = ()
+
+    def __setitem__(self, key, value):
+        if not isinstance(key, str):
+            raise TypeError('inivars, LayeredIniSection __setitem__ expects str for key "%s", not: %s'% (key, type(key)))
+        self._parent.set(self._name, key, value)
+
+    def __delitem__(self, key):
+        if not isinstance(key, str):
+            raise TypeError('inivars, LayeredIniSection __delitem__ expects str for key "%s", not: %s'% (key, type(key)))
+        self._parent.delete(self._name, key)
+
+class LayeredIniVars(IniVars):
+    """merged view of several inifiles (layers), eg shipped defaults, site and user inifile
+
+    layers: list of IniVars instances or inifile paths, from the bottom (defaults)
+    to the top (user). The options (kw) are those of IniVars, used for the paths.
+
+    A key in a higher layer overrides the same key in lower layers, a section holds the
+    keys of all layers. The merged sections are computed once (and again for the sections
+    changed via set and delete), so the get functions take as long as with a single IniVars
+    instance.
+
+    set, delete and write (and batch) go to the top layer only, as do the changes of the
+    sections as mappings (ini[s][k] = v, ini[s] = {...}, del ini[s]). A key deleted in the
+    top layer gets the value of a lower layer again (if present there).
+
+>>> for f in ('defaults.ini', 'user.ini'):
+...     try: os.remove(f)
+...     except: pass
+>>> defaults = IniVars('defaults.ini')
+>>> defaults.set('s', 'k', 'default')
+>>> defaults.set('s', 'k2', 'default2')
+>>> defaults.write()
+>>> ini = LayeredIniVars(['defaults.ini', 'user.ini'])
+>>> ini.set('s', 'k', 'user')
+>>> ini.get('s'), ini.get('s', 'k'), ini.get('s', 'k2')
+(['k', 'k2'], 'user', 'default2')
+>>> ini.write()
+>>> IniVars('user.ini').toDict()
+{'s': {'k': 'user'}}
+>>> ini.delete('s', 'k')
+>>> ini.get('s', 'k')
+'default'
+    """
+    def __init__(self, layers, **kw):
+        if not layers:
+            raise IniError('LayeredIniVars needs at least one layer')
+        self._layers = [layer if isinstance(layer, IniVars) else IniVars(layer, **kw)
+                        for layer in layers]
+        top = self._layers[-1]
+        kw.setdefault('SKIgnorecase', top._SKIgnorecase)
+        IniVars.__init__(self, top.getFilename(), **kw)
+        self._mergeLayers()
+
+    def _readIni(self, File):
+        """the layers are read already, see _mergeLayers"""
+
+    def getLayers(self):
+        """return the list of layers (IniVars instances), bottom first"""
+        return list(self._layers)
+
+    def _mergeLayers(self):
+        """compute all merged sections, and forget the values derived from the sections
+        """
+        self.data = {}
+        # the prefix index, postfixes, matchers and decoded values are made again at first use:
+        self._prefixIndex = None
+        self._sectionPostfixesWP = {}
+        self._postfixMatchers = {}
+        self._invalidateDecoded()
+        for layer in self._layers:
+            for s, keys in layer.data.items():
+                section = self.data.get(s)
+                if section is None:
+                    section = LayeredIniSection(parent=self)
+                    section._name = s
+                    self.data[s] = section
+                dict.update(section, keys)
+        self._dirtySections.clear()
+        self._changed = self._layers[-1]._changed
+
+    def _mergeSection(self, s):
+        """compute the merged section s (normalized name) again, after a change in the top layer
+        """
+        keys = {}
+        found = False
+        for layer in self._layers:
+            layerSection = layer.data.get(s)
+            if layerSection is not None:
+                found = True
+                keys.update(layerSection)
+        if not found:
+            if s in self.data:
+                IniVars.__delitem__(self, s)
+            return
+        section = self.data.get(s)
+        if section is None:
+            section = LayeredIniSection(parent=self)
+            dict.update(section, keys)
+            IniVars.__setitem__(self, s, section)
+        elif keys != section:
+            dict.clear(section)
+            dict.update(section, keys)
+            self._onChange(s)
+
+    def _mergeChanged(self, s):
+        """merge the sections given in set or delete (all sections if s is empty)"""
+        self._changed = self._layers[-1]._changed
+        if not s:
+            self._mergeLayers()
+            return
+        if not isinstance(s, (list, tuple)):
+            s = [s]
+        for name in s:
+            self._mergeSection(normalizeName(str(name), self._SKIgnorecase))
+
+    def set(self, s, k=None, v=None):
+        self._layers[-1].set(s, k, v)
+        self._mergeChanged(s)
+
+    def __setitem__(self, key, value):
+        """set section key to the keys and values of value (a mapping), in the top layer"""
+        if not isinstance(key, str):
+            raise TypeError('inivars, __setitem__ of LayeredIniVars expects str for key "%s", not: %s'% (key, type(key)))
+        top = self._layers[-1]
+        keys = dict(value.items())
+        top.delete(key)
+        top.set(key)
+        for k, v in keys.items():
+            top.set(key, k, v)
+        self._mergeChanged(key)
+
+    def __delitem__(self, key):
+        if not isinstance(key, str):
+            raise TypeError('inivars, __delitem__ of LayeredIniVars expects str for key "%s", not: %s'% (key, type(key)))
+        self.delete(key)
+
+    def delete(self, s=None, k=None):
+        self._layers[-1].delete(s, k)
+        self._mergeChanged(s)
+
+    def apply(self, diff):
+        """apply diff to the top layer (see IniVars.apply)"""
+        if not diff:
+            return
+        self._layers[-1].apply(diff)
+        self._mergeChanged(sorted(diff.getSections()))
+
+    def write(self, File=None):
+        self._layers[-1].write(File)
+        self._changed = self._layers[-1]._changed
+
+    def writeIfChanged(self, File=None):
+        self._layers[-1].writeIfChanged(File)
+        self._changed = self._layers[-1]._changed
+
+    def close(self):
+        self._layers[-1].close()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """batch of set and delete calls, in the top layer (see IniVars.batch)"""
+        try:
+            with self._layers[-1].batch():
+                yield self
+        finally:
+            self._mergeLayers()
+
+    transaction = batch
+
+class IniSnapshot(IniVars):
+    """read only copy of the sections of an IniVars instance, see ConcurrentIniVars
+
+    A snapshot is never changed, so it can be read in any number of threads without
+    a lock (the decoded values and the prefix index are filled at first use, as usual).
+    set, delete and write raise IniError.
+    """
+    def __init__(self, File, **kw):
+        kw['text'] = ''
+        IniVars.__init__(self, File, **kw)
+
+    def _beforeChange(self, section):
+        raise IniError('snapshot of inifile is read only: %s'% self._file)
+
+    def write(self, File=None):
+        raise IniError('snapshot of inifile is read only: %s'% self._file)
+
+    def writeIfChanged(self, File=None):
+        if self._changed:
+            self.write(File)
+
+class ConcurrentIniVars:
+    """IniVars instance to be read and changed in several threads (eg natlink callbacks,
+    the reload thread and helper threads)
+
+    Made by IniVars.openConcurrent(File), or from an IniVars instance (also LayeredIniVars).
+
+    Reading functions (get, getList, getSectionsWithPrefix, ...) take the current snapshot
+    (an IniSnapshot, never changed), without a lock. set, delete, apply, batch and write
+    are serialized by a lock, they change the IniVars instance and then publish a new
+    snapshot (copy on write): the changed sections are copied, the other sections
+    and their decoded values are shared with the previous snapshot.
+
+    Several reads that must be consistent with each other take one snapshot:
+    snap = ini.snapshot(); snap.get(...); snap.get(...)
+    Sections from reading functions are read only, change them via set and delete.
+
+>>> try: os.remove('concurrent.ini')
+... except: pass
+>>> ini = IniVars.openConcurrent('concurrent.ini')
+>>> ini.set('s', 'k', 'v')
+>>> snap = ini.snapshot()
+>>> ini.set('s', 'k', 'other')
+>>> snap.get('s', 'k'), ini.get('s', 'k')
+('v', 'other')
+>>> ini['s']['k'] = 'direct' #doctest: +IGNORE_EXCEPTION_DETAIL
+Traceback (most recent call last):
+IniError: snapshot of inifile is read only: concurrent.ini
+>>> ini.write()
+>>> IniVars('concurrent.ini').get('s', 'k')
+'other'
+    """
+    def __init__(self, ini):
+        self._ini = ini
+        self._lock = threading.RLock()
+        self._changedSections = set()
+        self._snapshot = None
+        self._batchDepth = 0
+        ini.addChangeListener(self._noteChange)
+        self._publish()
+
+    # functions of the current snapshot, set by _publish (as bound methods of the snapshot,
+    # so calling them costs no more than with an IniVars instance):
+    readingFunctions = ('get', 'getInt', 'getBool', 'getFloat', 'getList', 'getDict', 'getTuple',
+                        'hasSection', 'hasKey', 'hasValue', 'getSectionPostfixesWithPrefix',
+                        'getFromSectionsWithPrefix', 'getSectionsWithPrefix',
+                        'getKeysOrderedFromSections', 'formatKeysOrderedFromSections',
+                        'getMatchingSection', 'getKeysWithPrefix', 'ifOnlyNumbersInValues',
+                        'toDict', 'compileSchema', 'diff', 'getFilename', 'getName')
+
+    def __getattr__(self, name):
+        """other attributes of the current snapshot"""
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._snapshot, name)
+
+    def snapshot(self):
+        """return the current (read only) snapshot, an IniSnapshot"""
+        return self._snapshot
+
+    def getIniVars(self):
+        """return the IniVars instance that is changed (use only inside a batch)"""
+        return self._ini
+
+    def __getitem__(self, key):
+        return self._snapshot[key]
+
+    def __contains__(self, key):
+        return key in self._snapshot
+
+    def __iter__(self):
+        return iter(self._snapshot)
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def __bool__(self):
+        return True
+
+    def _noteChange(self, section, _key):
+        self._changedSections.add(section)
+
+    def _publish(self):
+        """make a new snapshot of the IniVars instance, copying only the changed sections
+
+        (at the end of a batch, not for the changes inside the batch)
+        """
+        if self._batchDepth:
+            return
+        ini = self._ini
+        previous = self._snapshot
+        snap = IniSnapshot(ini.getFilename(), SKIgnorecase=ini._SKIgnorecase)
+        if previous is None:
+            changed = set(ini.data)
+            data = {}
+        else:
+            changed, self._changedSections = self._changedSections, set()
+            if not changed:
+                return
+            data = dict(previous.data)
+        for s in changed:
+            section = ini.data.get(s)
+            if section is None:
+                data.pop(s, None)
+                continue
+            sectionCopy = IniSection(parent=snap)
+            dict.update(sectionCopy, section)
+            sectionCopy._name = s
+            data[s] = sectionCopy
+        if list(data) != list(ini.data):
+            data = {s: data[s] for s in ini.data}
+        snap.data = data
+        if previous is not None:
+            if list(data) == list(previous.data):
+                # same sections, the index of prefixes can be shared:
+                snap._prefixIndex = previous._prefixIndex
+                snap._sectionPostfixesWP = previous._sectionPostfixesWP
+                snap._postfixMatchers = previous._postfixMatchers
+            ignoreCase = ini._SKIgnorecase
+            for cacheKey, value in dict(previous._decoded).items():
+                if normalizeName(cacheKey[0], ignoreCase) not in changed:
+                    snap._setDecoded(cacheKey, value)
+        self._snapshot = snap
+        for name in self.readingFunctions:
+            setattr(self, name, getattr(snap, name))
+
+    def set(self, s, k=None, v=None):
+        with self._lock:
+            try:
+                self._ini.set(s, k, v)
+            finally:
+                self._publish()
+
+    def delete(self, s=None, k=None):
+        with self._lock:
+            try:
+                self._ini.delete(s, k)
+            finally:
+                self._publish()
+
+    def apply(self, diff):
+        with self._lock:
+            try:
+                self._ini.apply(diff)
+            finally:
+                self._publish()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """batch of set and delete calls (see IniVars.batch), holding the lock of the writers
+
+        the new snapshot is published at the end, readers see all changes of the batch at once.
+        """
+        with self._lock:
+            self._batchDepth += 1
+            try:
+                with self._ini.batch():
+                    yield self
+            finally:
+                self._batchDepth -= 1
+                self._publish()
+
+    transaction = batch
+
+    def write(self, File=None):
+        with self._lock:
+            self._ini.write(File)
+
+    def writeIfChanged(self, File=None):
+        with self._lock:
+            self._ini.writeIfChanged(File)
+
+    def close(self):
+        with self._lock:
+            self._ini.close()
+
+    def addChangeListener(self, func):
+        """see IniVars.addChangeListener, func is called in the thread of the writer"""
+        self._ini.addChangeListener(func)
+
+    def removeChangeListener(self, func):
+        self._ini.removeChangeListener(func)
+
+def loadIniVars(cls, File, kw):
+    """return cls(File, **kw), worker function of IniVars.loadMany"""
+    return cls(File, **kw)
+
+def getSectionIndex(File, ignoreCase=None, repairErrors=None, encoding=None):
+    """return (index, stat) of File, index is a dict: section name -> (start, end) byte offsets
+
+    The section header lines ("[name]" at the start of a line, see isValidSectionLine)
+    are searched in the file via mmap, so the file is not read in memory.
+    A section goes from its header line up to the next header (or the end of the file).
+    encoding: the encoding of the file (see detectEncoding), default: tried per header line
+    """
+    #pylint:disable=W0603
+    global lineNum
+    index = {}
+    with open(File, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        if not stat.st_size:
+            return index, stat
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:2] in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+                raise IniError('utf-16 inifiles cannot be opened lazily: %s'% File)
+            pos = len(codecs.BOM_UTF8) if mm[:3] == codecs.BOM_UTF8 else 0
+            starts = [pos] if mm[pos:pos+1] == b'[' else []
+            pos = mm.find(b'\n[', pos)
+            while pos >= 0:
+                starts.append(pos + 1)
+                pos = mm.find(b'\n[', pos + 1)
+            headers = []
+            for start in starts:
+                lineEnd = mm.find(b'\n', start)
+                if lineEnd < 0:
+                    lineEnd = stat.st_size
+                line = decodeBytes(mm[start:lineEnd], encoding and [encoding]).rstrip()
+                if isValidSectionLine(line):
+                    headers.append((start, line))
+            for i, (start, line) in enumerate(headers):
+                name = stripName(line[1:-1], ignoreCase)
+                end = headers[i+1][0] if i + 1 < len(headers) else stat.st_size
+                if name in index:
+                    first = mm[:index[name][0]].count(b'\n') + 1
+                    num = mm[:start].count(b'\n') + 1
+                    if not repairErrors:
+                        lineNum = num
+                        raise IniError('Duplicate section "%s" on line %s and on line %s\n\t(please correct in file "%s")'% (
+                            name, first, num, File))
+                    print('Warning: duplicate section "%s" on line %s and on line %s, take latter one\n\t(please correct later in file "%s")'% (
+                        name, first, num, File))
+                    del index[name]
+                index[name] = (start, end)
+    return index, stat
+
+def detectEncoding(File, encodings=None, chunkSize=1<<20):
+    """return the first encoding (of encodings, default defaultEncodings) that decodes all of File
+
+    as readwritefile.ReadWriteFile does for the whole file, but in chunks (via mmap),
+    so the file is not read in memory at once. latin-1 if no other encoding fits.
+
+>>> with open('encoding.ini', 'wb') as f:
+...     _n = f.write('[s]\\nk = caf\xe9\\n'.encode('cp1252') + b'[t]\\nk = v\\n')
+>>> detectEncoding('encoding.ini')
+'cp1252'
+    """
+    with open(File, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return (encodings or defaultEncodings)[0]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for encoding in encodings or defaultEncodings:
+                decoder = codecs.getincrementaldecoder(encoding)()
+                try:
+                    for pos in range(0, len(mm), chunkSize):
+                        decoder.decode(mm[pos:pos+chunkSize])
+                    decoder.decode(b'', final=True)
+                except UnicodeDecodeError:
+                    continue
+                return encoding
+    return 'latin-1'
+
+def decodeBytes(raw, encodings=None):
+    """decode bytes with the first encoding that fits, like readwritefile.ReadWriteFile
+
+>>> decodeBytes(b'abc'), decodeBytes('\xe9'.encode('utf-8')), decodeBytes('\xe9'.encode('cp1252'))
+('abc', '\xe9', '\xe9')
+    """
+    for encoding in encodings or defaultEncodings:
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return raw.decode('latin-1')
+
+def iterSections(File, **kw):
+    """yield (section name, section) of an inifile, one section at a time
+
+    The file is indexed via mmap (see getSectionIndex), and each section is parsed when
+    it is yielded and then dropped again, so memory use does not grow with the size of the file.
+    The options are those of IniVars (SKIgnorecase, repairErrors).
+
+>>> [(name, dict(section)) for name, section in iterSections('lazy.ini')]
+[('s', {'k': 'v'}), ('t', {'k': 'a; b'})]
+    """
+    ini = LazyIniVars(File, **kw)
+    sections = ini.data
+    for name in list(sections):
+        yield name, sections[name]
+        sections.unload(name)
+
 def sortHyphenKeys(keys):
     """sort keys, first by trailing number (-nnn), second by trunk name (after xx-)
 
@@ -2092,6 +3602,169 @@ def sortLanguageKeys(keys):
         total.extend(langKeys)
     return total
 
+_nameCharsTable = str.maketrans('', '', '-_ .')
+
+def isValidName(name):
+    """check if name is a valid (stripped) section or key name, like in reValidSection and reFindKeyValue
+
+    first character must be a word character, the others word characters, "-", " " or "."
+
+>>> [isValidName(n) for n in ['valid key', '3x', 'A. B. C.', 'x-y', '_', 'e\xe9n']]
+[True, True, True, True, True, True]
+>>> [isValidName(n) for n in ['', ' x', '-x', '.x', 'x[s]', 'a(b)', 'x=y']]
+[False, False, False, False, False, False, False]
+    """
+    if not name:
+        return False
+    first = name[0]
+    if not (first.isalnum() or first == '_'):
+        return False
+    rest = name.translate(_nameCharsTable)
+    return not rest or rest.isalnum()
+
+def isValidSectionLine(line):
+    """check if a (right stripped) line is a valid section line, like reValidSection.match
+
+>>> [isValidSectionLine(l) for l in ['[valid section]', '[a3]', '[x]','[3x]', '[x - y]', '[X. Y.]']]
+[True, True, True, True, True, True]
+>>> [isValidSectionLine(l) for l in [' [invalid section]',  '[-x3]', '[.xyz]', '[]', '[a]]', '[a] x']]
+[False, False, False, False, False, False]
+    """
+    return line[:1] == '[' and line[-1:] == ']' and isValidName(line[1:-1])
+
+# cache of normalized (interned) names, for ignoreCase false and true:
+_normalizedNames = ({}, {})
+normalizedNamesMax = 100000
+
+def normalizeName(name, ignoreCase=None):
+    """strip section or key name, and make whitespace single (lowercase if ignoreCase)
+
+    The results are cached (raw name -> normalized name), so the get and set
+    functions do not strip and search for whitespace each time.
+
+>>> normalizeName('  a   b ')
+'a b'
+>>> normalizeName('A  B', ignoreCase=True)
+'a b'
+>>> normalizeName(' a  b ') is normalizeName(' a  b ')
+True
+    """
+    cache = _normalizedNames[1 if ignoreCase else 0]
+    try:
+        return cache[name]
+    except KeyError:
+        pass
+    normalized = stripName(name, ignoreCase)
+    if len(cache) >= normalizedNamesMax:
+        cache.clear()
+    cache[name] = normalized
+    return normalized
+
+def stripName(name, ignoreCase=None):
+    """normalize name like normalizeName, without the cache
+
+    used when reading an inifile (the names of the file need not fill the cache)
+
+>>> stripName(' A  b', ignoreCase=True)
+'a b'
+    """
+    name = name.strip()
+    if reWhiteSpace.search(name):
+        name = reWhiteSpace.sub(' ', name)
+    if ignoreCase:
+        name = name.lower()
+    return name
+
+# get function for each type of compileSchema:
+schemaGetters = {str: 'get', int: 'getInt', bool: 'getBool', float: 'getFloat',
+                 list: 'getList', dict: 'getDict'}
+_schemaRecords = {}
+
+def schemaName(name):
+    """return the attribute name of a section or key name in a compiled schema
+
+    non word characters become "_", python keywords get a "_" appended
+
+>>> schemaName('pause between keys'), schemaName('x-y.z'), schemaName('class')
+('pause_between_keys', 'x_y_z', 'class_')
+    """
+    attribute = reNonWordChars.sub('_', name.strip())
+    if keyword.iskeyword(attribute):
+        attribute += '_'
+    if not attribute.isidentifier() or attribute.startswith('_'):
+        raise IniError('compileSchema, no valid attribute name for "%s": "%s"'% (name, attribute))
+    return attribute
+
+def addSchemaValue(values, name, value):
+    """put value under the attribute name of name in values, check for doubles"""
+    attribute = schemaName(name)
+    if attribute in values:
+        raise IniError('compileSchema, double attribute name "%s" (from "%s")'% (attribute, name))
+    values[attribute] = value
+
+def getSchemaRecord(fields):
+    """return the (read only) record type, a namedtuple, for the tuple of attribute names"""
+    record = _schemaRecords.get(fields)
+    if record is None:
+        record = _schemaRecords[fields] = namedtuple('IniSchemaRecord', fields)
+    return record
+
+def mergeOrdered(lists):
+    """merge lists into one list, each item once, in the order of first appearance
+
+>>> mergeOrdered([['a', 'b'], ['b', 'c'], [], ['a', 'd']])
+['a', 'b', 'c', 'd']
+    """
+    merged = {}
+    for items in lists:
+        merged.update(dict.fromkeys(items))
+    return list(merged)
+
+def joinValueLines(rawList, keyLine, keyFirst, first, last):
+    """build the value of a key from the (non empty) lines first ... last of rawList
+
+    utility for _readIni, giving the same result as listToString.
+    keyFirst is the value part of the key line (at index keyLine).
+
+>>> joinValueLines(['k = abc ', 'def  '], 0, ' abc', 0, 0)
+'abc'
+>>> joinValueLines(['k = abc', '', '   def  '], 0, ' abc', 0, 2)
+' abc\\n\\ndef'
+>>> joinValueLines(['k =', '  line 1', '  line 2', ''], 0, '', 1, 2)
+'line 1\\nline 2'
+    """
+    if first == last:
+        if first == keyLine:
+            return keyFirst.strip()
+        return rawList[first].strip()
+    lines = [keyFirst.rstrip() if i == keyLine else rawList[i].strip()
+             for i in range(first, last+1)]
+    return '\n'.join(lines)
+
+def stripTrailingEmptyLines(lines):
+    """return lines without the trailing empty (or whitespace only) lines
+
+>>> stripTrailingEmptyLines(['[s]', 'k = v', '', '  '])
+['[s]', 'k = v']
+    """
+    end = len(lines)
+    while end and not lines[end-1].strip():
+        end -= 1
+    return lines[:end]
+
+def getSectionSpans(lines, ignoreCase=None):
+    """return a dict section name -> (start, end), the line numbers (indexes in lines) of each section
+
+    used as the layout of an inifile when writing back, see IniVars._renderIni
+
+>>> getSectionSpans(['', '[a]', 'k = v', '', '[b  c]', 'k ='])
+{'a': (1, 4), 'b c': (4, 6)}
+    """
+    starts = [(normalizeName(line.strip()[1:-1], ignoreCase), i) for i, line in enumerate(lines)
+              if line[:1] == '[' and isValidSectionLine(line.rstrip())]
+    ends = [start for _s, start in starts[1:]] + [len(lines)]
+    return {s: (start, end) for (s, start), end in zip(starts, ends)}
+
 def listToString(valueList):
     """convert list of items (from _readIni) into a string
 
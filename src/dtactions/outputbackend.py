@@ -0,0 +1,317 @@
+"""the output of the actions: keystrokes, Dragon scripts, mouse, clipboard and waits
+
+unimacroactions does all its side effects through an output backend (see setOutputBackend there):
+
+    NatlinkBackend      the real output, via sendkeys (Vocola Keys extension), natlink
+                        and unimacroutils (Windows with Dragon)
+    RecordingBackend    records the output as a trace of timestamped events, does not wait
+                        (so actions can be run, tested and timed without Windows and Dragon)
+    BatchingBackend     sends the soft keystrokes of an action in one call to another backend
+
+The backends have the same methods as OutputBackend, the interface, below.
+
+>>> backend = RecordingBackend(clock=iter([0.0, 0.001, 0.002, 0.003, 0.004]).__next__)
+>>> backend.sendKeys('{ctrl+c}')
+>>> backend.sleep(0.5)
+>>> backend.setClipboard('hello')
+>>> backend.sendSystemKeys('{alt+tab}')
+>>> for event in backend.events:
+...     print(event)
+Event(time=0.001, kind='keys', args=('{ctrl+c}',))
+Event(time=0.002, kind='wait', args=(0.5,))
+Event(time=0.503, kind='clipboard', args=('hello',))
+Event(time=0.504, kind='systemkeys', args=('{alt+tab}',))
+>>> backend.getClipboard(), backend.getKeys()
+('hello', '{ctrl+c}{alt+tab}')
+"""
+#pylint:disable=C0209
+import time
+from collections import namedtuple
+
+Event = namedtuple('Event', 'time kind args')
+
+class OutputBackend:
+    """the interface of the output backends, all output of the actions goes through these methods
+    """
+    def sendKeys(self, keys):
+        """send keystrokes, eg "{ctrl+home}hello" """
+        raise NotImplementedError
+
+    def sendSystemKeys(self, keys):
+        """send keystrokes "the hard way" (Dragon SendSystemKeys)"""
+        raise NotImplementedError
+
+    def execScript(self, script):
+        """execute a Dragon (dvc) script, eg 'HeardWord "hello"'"""
+        raise NotImplementedError
+
+    def playEvents(self, events):
+        """play a list of (message, code, count) windows events"""
+        raise NotImplementedError
+
+    def doMouse(self, absorrel, screenorwindow, xpos, ypos, mouse='left', nClick=1, modifier=0):
+        """move the mouse and click, see unimacroutils.doMouse"""
+        raise NotImplementedError
+
+    def getClipboard(self):
+        raise NotImplementedError
+
+    def setClipboard(self, t, format=1):
+        #pylint:disable=W0622
+        raise NotImplementedError
+
+    def saveClipboard(self):
+        """save the contents of the clipboard and empty it"""
+        raise NotImplementedError
+
+    def restoreClipboard(self):
+        """restore the contents saved by saveClipboard"""
+        raise NotImplementedError
+
+    def sleep(self, t):
+        """wait t seconds"""
+        raise NotImplementedError
+
+class NatlinkBackend(OutputBackend):
+    """the output to the foreground window, via sendkeys, natlink and unimacroutils
+
+    the modules are imported when the backend is made (they need Windows and Dragon).
+    """
+    def __init__(self):
+        #pylint:disable=C0415
+        import natlink
+        from dtactions import sendkeys
+        from dtactions import unimacroutils
+        self._sendkeys = sendkeys.sendkeys
+        self._sendsystemkeys = sendkeys.sendsystemkeys
+        self._natlink = natlink
+        self._utils = unimacroutils
+
+    def sendKeys(self, keys):
+        self._sendkeys(keys)
+
+    def sendSystemKeys(self, keys):
+        self._sendsystemkeys(keys)
+
+    def execScript(self, script):
+        self._natlink.execScript(script)
+
+    def playEvents(self, events):
+        self._natlink.playEvents(events)
+
+    def doMouse(self, absorrel, screenorwindow, xpos, ypos, mouse='left', nClick=1, modifier=0):
+        self._utils.doMouse(absorrel, screenorwindow, xpos, ypos, mouse, nClick, modifier)
+
+    def getClipboard(self):
+        return self._utils.getClipboard()
+
+    def setClipboard(self, t, format=1):
+        #pylint:disable=W0622
+        self._utils.setClipboard(t, format=format)
+
+    def saveClipboard(self):
+        self._utils.saveClipboard()
+
+    def restoreClipboard(self):
+        self._utils.restoreClipboard()
+
+    def sleep(self, t):
+        time.sleep(t)
+
+class RecordingBackend(OutputBackend):
+    """records the output as a list of Events (time, kind, args), in memory
+
+    the waits are recorded, not done: the time of the events after a wait is
+    advanced by the waiting time, so the trace has the timing of the real output.
+    clock: function giving the time in seconds (default time.perf_counter), the times
+    of the events are relative to the start of the recording.
+    The clipboard is a simple variable (saveClipboard/restoreClipboard use a stack).
+    """
+    def __init__(self, clock=None):
+        self.clock = clock or time.perf_counter
+        self.events = []
+        self.clipboard = ''
+        self._savedClipboards = []
+        self._start = self.clock()
+        self._waited = 0.0
+
+    def record(self, kind, *args):
+        self.events.append(Event(self.clock() - self._start + self._waited, kind, args))
+
+    def clear(self):
+        """forget the events, and start the times again at 0"""
+        self.events = []
+        self._start = self.clock()
+        self._waited = 0.0
+
+    def getKeys(self):
+        """return the keystrokes (soft and system) as one string"""
+        return ''.join(e.args[0] for e in self.events if e.kind in ('keys', 'systemkeys'))
+
+    def getEvents(self, kind):
+        """return the arguments of the events of kind (eg 'keys' or 'script')"""
+        return [e.args for e in self.events if e.kind == kind]
+
+    def sendKeys(self, keys):
+        self.record('keys', keys)
+
+    def sendSystemKeys(self, keys):
+        self.record('systemkeys', keys)
+
+    def execScript(self, script):
+        self.record('script', script)
+
+    def playEvents(self, events):
+        self.record('events', tuple(events))
+
+    def doMouse(self, absorrel, screenorwindow, xpos, ypos, mouse='left', nClick=1, modifier=0):
+        self.record('mouse', absorrel, screenorwindow, xpos, ypos, mouse, nClick, modifier)
+
+    def getClipboard(self):
+        return self.clipboard
+
+    def setClipboard(self, t, format=1):
+        #pylint:disable=W0622
+        self.clipboard = t
+        self.record('clipboard', t)
+
+    def saveClipboard(self):
+        self._savedClipboards.append(self.clipboard)
+        self.clipboard = ''
+
+    def restoreClipboard(self):
+        if self._savedClipboards:
+            self.clipboard = self._savedClipboards.pop()
+
+    def sleep(self, t):
+        self.record('wait', t)
+        self._waited += t
+
+class BatchingBackend(OutputBackend):
+    """collect the soft keystrokes of an action, and send them in one sendKeys call to backend
+
+    Between begin and end (the top level action) the keystrokes are gathered in a buffer,
+    which is flushed (sent) before any other output (system keys, Dragon scripts, mouse,
+    clipboard, waits), and at end.
+    Outside an action, and between suspend and resume (eg while a USC command runs, which
+    may look at the window after its keystrokes), the keystrokes are sent at once.
+
+    The metrics (see getMetrics) count the keystroke events (sendKeys calls to this backend)
+    and the calls to backend (the "syscalls", each sendKeys is one SendInput).
+
+>>> recorder = RecordingBackend()
+>>> batch = BatchingBackend(recorder)
+>>> batch.begin()
+>>> for keys in ['{home}', '{shift+end}', '{ctrl+c}']:
+...     batch.sendKeys(keys)
+>>> batch.sendSystemKeys('{alt+tab}')
+>>> batch.sendKeys('{ctrl+v}')
+>>> batch.end()
+>>> [(e.kind, e.args[0]) for e in recorder.events]
+[('keys', '{home}{shift+end}{ctrl+c}'), ('systemkeys', '{alt+tab}'), ('keys', '{ctrl+v}')]
+>>> batch.getMetrics()
+{'keyEvents': 4, 'keyCalls': 2, 'outputCalls': 3, 'waits': 0}
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.depth = 0
+        self.suspended = 0
+        self._keys = []
+        self.resetMetrics()
+
+    def resetMetrics(self):
+        self.keyEvents = 0
+        self.keyCalls = 0
+        self.outputCalls = 0
+        self.waits = 0
+
+    def getMetrics(self):
+        """return the numbers of keystroke events, sendKeys calls, all output calls and waits"""
+        return {'keyEvents': self.keyEvents, 'keyCalls': self.keyCalls,
+                'outputCalls': self.outputCalls, 'waits': self.waits}
+
+    def begin(self):
+        """start collecting keystrokes (nested begin ... end pairs are part of the outer one)"""
+        self.depth += 1
+
+    def end(self):
+        """stop collecting at the end of the outer action, and send the keystrokes"""
+        if self.depth > 1:
+            self.depth -= 1
+            return
+        self.depth = 0
+        self.flush()
+
+    def suspend(self):
+        """send the collected keystrokes, and send the next ones at once, until resume"""
+        self.flush()
+        self.suspended += 1
+
+    def resume(self):
+        self.suspended = max(0, self.suspended - 1)
+
+    def cancel(self):
+        """drop the collected keystrokes (eg when the action is cancelled)"""
+        self._keys = []
+
+    def flush(self):
+        """send the collected keystrokes"""
+        if self._keys:
+            keys = ''.join(self._keys)
+            self._keys = []
+            self.keyCalls += 1
+            self.outputCalls += 1
+            self.backend.sendKeys(keys)
+
+    def sendKeys(self, keys):
+        if not keys:
+            return
+        self.keyEvents += 1
+        if self.depth and not self.suspended:
+            self._keys.append(keys)
+        else:
+            self.keyCalls += 1
+            self.outputCalls += 1
+            self.backend.sendKeys(keys)
+
+    def sendSystemKeys(self, keys):
+        self.flush()
+        self.outputCalls += 1
+        self.backend.sendSystemKeys(keys)
+
+    def execScript(self, script):
+        self.flush()
+        self.outputCalls += 1
+        self.backend.execScript(script)
+
+    def playEvents(self, events):
+        self.flush()
+        self.outputCalls += 1
+        self.backend.playEvents(events)
+
+    def doMouse(self, absorrel, screenorwindow, xpos, ypos, mouse='left', nClick=1, modifier=0):
+        self.flush()
+        self.outputCalls += 1
+        self.backend.doMouse(absorrel, screenorwindow, xpos, ypos, mouse, nClick, modifier)
+
+    def getClipboard(self):
+        self.flush()
+        return self.backend.getClipboard()
+
+    def setClipboard(self, t, format=1):
+        #pylint:disable=W0622
+        self.flush()
+        self.backend.setClipboard(t, format=format)
+
+    def saveClipboard(self):
+        self.flush()
+        self.backend.saveClipboard()
+
+    def restoreClipboard(self):
+        self.flush()
+        self.backend.restoreClipboard()
+
+    def sleep(self, t):
+        self.flush()
+        self.waits += 1
+        self.backend.sleep(t)
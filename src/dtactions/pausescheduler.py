@@ -0,0 +1,166 @@
+"""pauses of actions: merged into one deadline, slept only when the next output needs it
+
+doAction (unimacroactions) used to sleep after every part of an action ("pause between
+actions", and at least 0.1 seconds, even if the pause was set to 0). With a PauseScheduler:
+
+    wait(t)      an explicit wait (W, LW, ...), added to the pending deadline
+    settle(t)    a step that needs time to settle (a window switch, a clipboard write),
+                 the deadline is at least t from now (so pauses of consecutive steps merge)
+    sync()       sleep until the deadline, called before each output (keystrokes, commands)
+
+A wait of 0 (or None) is no wait. Outside an action (begin ... end) waits are done at once.
+The time of each action, idle (sleeping) and working, is kept for a timing report.
+
+Example, with a clock that only advances when sleeping:
+>>> clock = FakeClock()
+>>> scheduler = PauseScheduler(sleep=clock.sleep, clock=clock)
+>>> scheduler.begin('{ctrl+c}; W 0.2; {ctrl+v}')
+>>> scheduler.settle(0.1)    # after {ctrl+c}
+>>> scheduler.wait(0.2)      # W 0.2
+>>> scheduler.settle(0)      # pause between actions 0: nothing
+>>> scheduler.sync()         # before {ctrl+v}
+>>> clock.sleeps
+[0.3]
+>>> timing = scheduler.end()
+>>> timing.action, round(timing.idle, 3), timing.sleeps
+('{ctrl+c}; W 0.2; {ctrl+v}', 0.3, 1)
+"""
+#pylint:disable=C0209
+import asyncio
+import time
+from collections import namedtuple, deque
+
+ActionTiming = namedtuple('ActionTiming', 'action total idle working sleeps')
+
+class PauseScheduler:
+    """merge the pauses of an action into one deadline, and keep the timing of the actions
+
+    sleep: function, sleeps a number of seconds (default time.sleep)
+    clock: function, returns the time in seconds (default time.perf_counter)
+    maxTimings: the number of actions kept for the timing report
+    """
+    def __init__(self, sleep=None, clock=None, maxTimings=100):
+        self.sleep = sleep or time.sleep
+        self.clock = clock or time.perf_counter
+        self.timings = deque(maxlen=maxTimings)
+        self.deadline = 0.0
+        self.depth = 0
+        self._action = None
+        self._start = 0.0
+        self._idle = 0.0
+        self._sleeps = 0
+
+    def begin(self, action=None):
+        """start an action (nested begin ... end pairs are part of the outer action)"""
+        self.depth += 1
+        if self.depth == 1:
+            self._action = action
+            self._start = self.clock()
+            self._idle = 0.0
+            self._sleeps = 0
+
+    def end(self):
+        """end an action, the pending pause is slept at the end of the outer action
+
+        return the ActionTiming of the outer action (None for a nested one)
+        """
+        if self.depth > 1:
+            self.depth -= 1
+            return None
+        try:
+            self.sync()
+        finally:
+            self.depth = 0
+        total = self.clock() - self._start
+        timing = ActionTiming(self._action, total, self._idle, total - self._idle, self._sleeps)
+        self.timings.append(timing)
+        return timing
+
+    def wait(self, t):
+        """wait t seconds, after the pending pause (at once if not in an action)"""
+        if not t or t <= 0:
+            return
+        now = self.clock()
+        self.deadline = max(self.deadline, now) + t
+        if not self.depth:
+            self.sync()
+
+    def settle(self, t):
+        """let the last step settle t seconds: the next output comes at least t seconds from now"""
+        if not t or t <= 0:
+            return
+        self.deadline = max(self.deadline, self.clock() + t)
+        if not self.depth:
+            self.sync()
+
+    def sync(self):
+        """sleep until the deadline of the pending pauses (if any)"""
+        if not self.deadline:
+            return
+        remaining = self.deadline - self.clock()
+        self.deadline = 0.0
+        if remaining > 0:
+            t0 = self.clock()
+            self.sleep(remaining)
+            self._idle += self.clock() - t0
+            self._sleeps += 1
+
+    async def syncAsync(self):
+        """sync with asyncio.sleep, so the wait can be cancelled (see actionexecutor)
+
+        (with a virtual clock event loop, as in the tests, the clock should be loop.time)
+        """
+        if not self.deadline:
+            return
+        remaining = self.deadline - self.clock()
+        self.deadline = 0.0
+        if remaining > 0:
+            t0 = self.clock()
+            try:
+                await asyncio.sleep(remaining)
+            finally:
+                self._idle += self.clock() - t0
+                self._sleeps += 1
+
+    def cancel(self):
+        """drop the pending pause (eg when an action is interrupted)"""
+        self.deadline = 0.0
+
+    def formatTimings(self, n=None):
+        """return the timing report of the last n actions (all if n is None) as text
+
+>>> clock = FakeClock()
+>>> scheduler = PauseScheduler(sleep=clock.sleep, clock=clock)
+>>> scheduler.begin('W 0.5')
+>>> scheduler.wait(0.5)
+>>> clock.advance(0.25)   # working, while the pause runs
+>>> _t = scheduler.end()
+>>> print(scheduler.formatTimings())
+  total (ms)    idle (ms) working (ms)   sleeps  action
+       500.0        250.0        250.0        1  W 0.5
+        """
+        timings = list(self.timings)
+        if n is not None:
+            timings = timings[-n:]
+        lines = ['%12s %12s %12s %8s  %s'% ('total (ms)', 'idle (ms)', 'working (ms)', 'sleeps', 'action')]
+        for timing in timings:
+            lines.append('%12.1f %12.1f %12.1f %8s  %s'% (timing.total*1000, timing.idle*1000,
+                                                         timing.working*1000, timing.sleeps, timing.action))
+        return '\n'.join(lines)
+
+class FakeClock:
+    """a clock for testing: the time only changes by sleep and advance, the sleeps are recorded
+    """
+    def __init__(self, now=0.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, t):
+        self.sleeps.append(round(t, 6))
+        self.now += t
+
+    def advance(self, t):
+        self.now += t
@@ -26,7 +26,9 @@ import shutil
 import copy
 import time
 import datetime
+import threading
 from pathlib import Path
+from collections import namedtuple
 import html.entities
 import ctypes
 import win32api
@@ -39,11 +41,16 @@ from natlinkcore.config import expand_path
 
 import dtactions
 from dtactions import monitorfunctions
-from dtactions.sendkeys import sendkeys, sendsystemkeys
 # from dtactions import messagefunctions
 from dtactions import autohotkeyactions # for AutoHotkey support
 from dtactions import unimacroutils
 from dtactions import inivars
+from dtactions import filewatcher
+from dtactions import actioncompiler
+from dtactions import pausescheduler
+from dtactions import outputbackend
+from dtactions import actionexecutor
+from dtactions import actiontrace
 # from dtactions import unimacroactionclasses
 
 external_actions_modules = {}  # the modules, None if not available (for prog)
@@ -162,8 +169,114 @@ A sample of this file could not be found in {sampleDirectory}.
 # 
 # if os.path.isfile(inifile):
 inifile = userInifile
+
+def loadIni():
+    """return the inivars instance of the actions: the user inifile layered over the sample inifile
+
+    so new keys and sections of the shipped sample are found, also when the user inifile
+    is an older copy. Changes (set, delete, write) go to the user inifile.
+    Changes drop the cached values of the changed sections (see iniChanged).
+    """
+    newIni = inivars.LayeredIniVars([sampleInifile, inifile])
+    newIni.addChangeListener(iniChanged)
+    return newIni
+
+def iniChanged(section, key=None):
+    """update the meta action table and drop the cached values that depend on section (and key)
+
+    called for each change of ini (change listener). key None: the whole section changed.
+    """
+    updated = ()
+    table = metaActionTable
+    if table is not None:
+        # only the changed key is expanded again, and the keys that used it (also of other sections),
+        # the watcher thread copies the table (see prepareIni):
+        with reloadLock:
+            updated = table.update(section, getSectionValues(ini, section), key)
+            if watcher is not None:
+                changesSinceSwap.add((section, key))
+        reportCycles(table, updated)
+    dropCachedValues([(section, key)], {s for s, _k in updated})
+
+def dropCachedValues(changes, sections=()):
+    """drop the cached values that depend on changes ((section, key) pairs, key None: the whole section)
+
+    sections: other sections with changed meta actions (see MetaActionTable.update)
+    """
+    #pylint:disable=W0603
+    global TopChildDict, ChildTopDict
+    metaActionCache.invalidate(*{s for s, _k in changes}.union(sections))
+    windowSettingsCache.invalidateChanges(changes)
+    for section, key in changes:
+        if section == 'general':
+            if key in (None, 'top behaves like child'):
+                TopChildDict = None
+            if key in (None, 'child behaves like top'):
+                ChildTopDict = None
+
+PreparedIni = namedtuple('PreparedIni', 'ini changes sections metaActionTable fileDate')
+
+def prepareIni(newIni, previousIni, previousTable, fileDate=None):
+    """return a PreparedIni: newIni with its differences with previousIni and its meta action table
+
+    The table is a copy of previousTable, updated for the differences (made if there is no
+    previousTable). Done by the watcher thread (see reloadIni), so swapping in the inifile
+    (installIni) only assigns, and drops the cached values of the changes.
+    changes None: all changed (there is no previousIni).
+    """
+    changes = None
+    if previousIni is not None:
+        try:
+            changes = previousIni.diff(newIni).getChanges()
+        except RuntimeError:
+            pass   # previousIni was changed by the main thread meanwhile, take all as changed
+    with reloadLock:
+        table = previousTable.copy() if previousTable is not None and changes is not None else None
+    sections = set()
+    if table is None:
+        table = makeMetaActionTable(newIni)
+    else:
+        updated = set()
+        for section, key in changes:
+            updated |= table.update(section, getSectionValues(newIni, section), key)
+        reportCycles(table, updated)
+        sections = {s for s, _k in changes}.union(s for s, _k in updated)
+    return PreparedIni(newIni, changes, sections, table, fileDate)
+
+def installIni(prepared):
+    """make the prepared inifile (see prepareIni) the actions inivars, in the main thread
+    """
+    #pylint:disable=W0603
+    global ini, TopChildDict, ChildTopDict, metaActionTable, iniFileDate, changesSinceSwap
+    with reloadLock:
+        changedHere, changesSinceSwap = changesSinceSwap, set()
+    ini = prepared.ini
+    metaActionTable = prepared.metaActionTable
+    if prepared.fileDate is not None:
+        iniFileDate = prepared.fileDate
+    actionCompiler.clear()
+    if prepared.changes is None:
+        TopChildDict = None
+        ChildTopDict = None
+        metaActionCache.clear()
+        windowSettingsCache.clear()
+        return
+    changes = list(prepared.changes)
+    sections = set(prepared.sections)
+    if changedHere:
+        # changes of the previous ini while the table was prepared (eg by setPosition), only a few keys:
+        for section, key in changedHere:
+            sections |= {s for s, _k in metaActionTable.update(section, getSectionValues(ini, section), key)}
+        changes.extend(changedHere)
+    dropCachedValues(changes, sections)
+
+def swapIni(newIni):
+    """make newIni the actions inivars, and drop only the cached values of the differences
+    """
+    installIni(prepareIni(newIni, ini, metaActionTable))
+
 try:
-    ini = inivars.IniVars(inifile)
+    ini = loadIni()
 except inivars.IniError:
     print('Error in actions inifile: {inifile}')
     _m = str(sys.exc_info()[1])
@@ -171,15 +284,7 @@ except inivars.IniError:
     pendingMessage = 'Please repair action.ini file\n\n' + _m
     ini = None
 
-metaActions = re.compile(r'(<<[^>]+>>)')
-metaAction = re.compile(r'<<([^>]+)>>$')
-metaNumber = re.compile(r' ([0-9]+)$')
-metaNumberBack = re.compile(r'\bn\b')
 actionIsList = re.compile('[,;\n]', re.M)
-# for keystroke matching and splitting:
-braceExact = re.compile (r'[{][^}]+[}]$')
-hasBraces = re.compile (r'([{].+?[}])')
-BracesExtractKey = re.compile (r'^[{]((alt|ctrl|shift)[+])*(?P<k>[^ ]+?)( [0-9]+)?[}]$', re.I)
         
 # debugging and checking for changes (whenever actions are edited)
 # are controlled to these global variables.  Whenever actions are edited
@@ -188,12 +293,71 @@ BracesExtractKey = re.compile (r'^[{]((alt|ctrl|shift)[+])*(?P<k>[^ ]+?)( [0-9]+
 debug = 0
 checkForChanges = 0
 iniFileDate = 0
+# background reload of the inifile, started when checkForChanges is set (see startWatching):
+watcher = None
+# the inifile prepared by the watcher thread, swapped in by the main thread (see reloadIni),
+# the lock is also held for the changes of the meta action table (copied by prepareIni):
+pendingIni = None
+reloadLock = threading.Lock()
+# the changes of ini since the last swap, made again in the prepared table (see installIni):
+changesSinceSwap = set()
+# all output (keystrokes, Dragon scripts, mouse, clipboard, waits) goes through the backend,
+# the soft keystrokes of an action are collected and sent in one call (see doAction):
+backend = outputbackend.BatchingBackend(outputbackend.NatlinkBackend())
+
+def setOutputBackend(newBackend):
+    """route the output of the actions to newBackend (eg a outputbackend.RecordingBackend)
+
+    return the previous backend (to restore it)
+    """
+    previous = backend.backend
+    backend.flush()
+    backend.backend = newBackend
+    return previous
+
+def backendSleep(t):
+    t0 = tracer.enabled and tracer.clock()
+    backend.sleep(t)
+    if t0: tracer.add('wait', t0, t)
+
+# the pauses (W and pause between actions) of an action, and the timing of the actions:
+pauseScheduler = pausescheduler.PauseScheduler(sleep=backendSleep)
+# the spans of the parts of the actions, when switched on (see traceActions and showActionProfile):
+tracer = actiontrace.Tracer()
+
+def getWaitingTime(t):
+    """return the waiting time t as unimacroutils.Wait does it
+
+    milliseconds if t > 10 (with a warning, also for a long wait), and with
+    unimacroutils.debugMode: printed (-1) or slowed down (times debugMode)
+    """
+    if not t:
+        return t
+    if t > 10:
+        print('warning, changed waiting time to seconds: %s'%t)
+        t = t/1000.0
+    elif t >= 5:
+        print('warning, long waiting time: %s'% t)
+    if unimacroutils.debugMode == -1:
+        print("Wait %s" % t)
+    elif unimacroutils.debugMode:
+        t = t*unimacroutils.debugMode
+    return t
+
+# waits inside the USC commands, after the pending pauses, via the backend:
+def Wait(t=None):
+    """wait t seconds (default unimacroutils.defaultWaitingTime) now"""
+    pauseScheduler.wait(getWaitingTime(t or unimacroutils.defaultWaitingTime))
+    pauseScheduler.sync()
+
+def shortWait():
+    Wait(unimacroutils.defaultWaitingTime*unimacroutils.shortWaitFactor)
+
+def visibleWait():
+    Wait(unimacroutils.defaultWaitingTime*unimacroutils.visibleWaitFactor)
 
 def doAction(action, completeAction=None, pauseBA=None, pauseBK=None,
              progInfo=None, modInfo=None, sectionList=None, comment='', comingFrom=None):
-    #pylint:disable=W0603
-    global pendingMessage, checkForChanges
-    topLevel = 0
     if comingFrom and comingFrom.interrupted:
         print('command was interrupted')
         return
@@ -203,100 +367,185 @@ def doAction(action, completeAction=None, pauseBA=None, pauseBK=None,
     # at first (nonrecursive) call check for all variables:
     if not completeAction:
         # first (nonrecursive) call,
-        topLevel = 1
-        if not ini:
-            checkForChanges = 1
-            if pendingMessage:
-                m = pendingMessage
-                pendingMessage = ''
-                Message(m, alert=1)
-                D('no valid inifile for actions')
-                return
-        if checkForChanges:
-            if debug > 5: D('checking for changes')
-            doCheckForChanges() # resetting the ini file if changes were made
-        if not ini:
-            D('no valid inifile for actions')
-            return
-        progInfo = unimacroutils.getProgInfo(modInfo=modInfo)
-        #D('new progInfo: %s'% repr(progInfo))
-        prog = progInfo.prog
-        if sectionList is None:
-            sectionList = getSectionList(progInfo)
-        if pauseBA is None:
-            pauseBA = float(setting('pause between actions', '0', sectionList=sectionList))
-        if pauseBK is None:
-            pauseBK = float(setting('pause between keystrokes', '0', sectionList=sectionList))
+        tAction = tracer.beginAction(action)
+        try:
+            return doTopAction(action, pauseBA=pauseBA, pauseBK=pauseBK, modInfo=modInfo,
+                               sectionList=sectionList, comment=comment, comingFrom=comingFrom)
+        finally:
+            tracer.endAction(tAction)
+    if debug > 5: D('action: %s'% action)
 
-        if debug: D('------new action: %(action)s, '% locals())
-        if debug > 3 and comment:
-            D('extra info: %(comment)s'% locals())
-        if debug > 3: D('\n\tprogInfo: %(progInfo)s, '
-                        'pause between actions: %(pauseBA)s' % locals())
-        if debug > 5: D('sectionList at start action: %s'% sectionList)
-        completeAction = action
-        aList = list(inivars.getIniList(action))
-        if action.find('USC') >= 0:
-            bList = []
-            for a in aList:
-                if a.find('USC') >= 0:
-                    bList.extend(a.split('USC'))
-                else:
-                    bList.append(a)
-            aList = [t.strip() for t in bList if t]
-            
-        if debug > 2: D('action: %s, aList: %s'% (action, aList))
-        if not aList:
-            return
-        for a in aList:
+    if not action:  return
+
+    assert isinstance(action, str)
+    return doStep(actionCompiler.compileStep(action), completeAction, pauseBA=pauseBA, pauseBK=pauseBK,
+                  progInfo=progInfo, sectionList=sectionList, comment=comment, comingFrom=comingFrom)
+
+def doTopAction(action, pauseBA=None, pauseBK=None, modInfo=None, sectionList=None, comment='', comingFrom=None):
+    """perform action as the first (nonrecursive) call of doAction"""
+    started = startAction(modInfo, sectionList, pauseBA, pauseBK)
+    if not started:
+        return
+    progInfo, sectionList, pauseBA, pauseBK = started
+
+    if debug: D('------new action: %(action)s, '% locals())
+    if debug > 3 and comment:
+        D('extra info: %(comment)s'% locals())
+    if debug > 3: D('\n\tprogInfo: %(progInfo)s, '
+                    'pause between actions: %(pauseBA)s' % locals())
+    if debug > 5: D('sectionList at start action: %s'% sectionList)
+    completeAction = action
+    t0 = tracer.enabled and tracer.clock()
+    plan = actionCompiler.compile(action)
+    if t0: tracer.add('compile', t0)
+    if debug > 2: D('action: %s, plan: %s'% (action, plan.steps))
+    if not plan.steps:
+        return
+    # the pause between actions is done after the steps that need to settle (see doStep),
+    # the keystrokes are sent at the end, or before other output:
+    pauseScheduler.begin(action)
+    backend.begin()
+    result = None
+    try:
+        for step in plan.steps:
             if comingFrom and comingFrom.interrupted:
+                pauseScheduler.cancel()
                 return
-            result = 1
-            if not a: continue
-            result = doAction(a, completeAction=completeAction,
-                         pauseBA=pauseBA, pauseBK=pauseBK,
-                         progInfo=progInfo, modInfo=None, sectionList=sectionList,
-                         comment=comment, comingFrom=comingFrom)
+            result = doStep(step, completeAction, pauseBA=pauseBA, pauseBK=pauseBK,
+                            progInfo=progInfo, sectionList=sectionList,
+                            comment=comment, comingFrom=comingFrom)
             if not result: return
-            if debug > 2:D('pause between actions: %s'% pauseBA) 
-            do_W(pauseBA)
-        return result
-    if debug > 5: D('action: %s'% action)
+    finally:
+        t0 = tracer.enabled and tracer.clock()
+        backend.end()
+        if t0: tracer.add('send', t0)
+        timing = pauseScheduler.end()
+        if debug > 2 and timing: D('action timing, idle: %.3f, working: %.3f'% (timing.idle, timing.working))
+    return result
 
-    if not action:  return
+def startAction(modInfo=None, sectionList=None, pauseBA=None, pauseBK=None):
+    """check the inifile, and return (progInfo, sectionList, pauseBA, pauseBK) for a new action
 
-    assert isinstance(action, str)
+    None if there is no valid inifile
+    """
+    #pylint:disable=W0603
+    global pendingMessage, checkForChanges
+    if not ini:
+        checkForChanges = 1
+        if pendingMessage:
+            m = pendingMessage
+            pendingMessage = ''
+            Message(m, alert=1)
+            D('no valid inifile for actions')
+            return None
+    if checkForChanges:
+        checkIniWatcher() # the ini file is reloaded in the background if changes were made
+    if not ini:
+        D('no valid inifile for actions')
+        return None
+    t0 = tracer.enabled and tracer.clock()
+    progInfo = unimacroutils.getProgInfo(modInfo=modInfo)
+    if t0: tracer.add('progInfo', t0, progInfo.prog)
+    #D('new progInfo: %s'% repr(progInfo))
+    if sectionList is None:
+        t0 = tracer.enabled and tracer.clock()
+        windowSettings = getWindowSettings(progInfo)
+        if t0: tracer.add('sectionList', t0)
+        sectionList = windowSettings.sectionList
+        if pauseBA is None:
+            pauseBA = windowSettings.pauseBA
+        if pauseBK is None:
+            pauseBK = windowSettings.pauseBK
+    if pauseBA is None:
+        pauseBA = float(setting('pause between actions', '0', sectionList=sectionList))
+    if pauseBK is None:
+        pauseBK = float(setting('pause between keystrokes', '0', sectionList=sectionList))
+    return progInfo, sectionList, pauseBA, pauseBK
+
+async def doActionAsync(action, pauseBA=None, pauseBK=None,
+                        modInfo=None, sectionList=None, comment='', comingFrom=None):
+    """perform action as doAction does, but with the waits awaited (see actionExecutor)
+
+    The action can be cancelled in the middle of a wait (task.cancel(), or comingFrom.interrupted),
+    also while waiting for a window (WTC, WWT) or the mouse (WAITMOUSEMOVE, WAITMOUSESTOP, CHECKMOUSESTEADY).
+    """
+    if comingFrom and comingFrom.interrupted:
+        print('command was interrupted')
+        return None
+    tAction = tracer.beginAction(action)
+    try:
+        started = startAction(modInfo, sectionList, pauseBA, pauseBK)
+        if not started:
+            return None
+        progInfo, sectionList, pauseBA, pauseBK = started
+        if debug: D('------new async action: %s'% action)
+        if debug > 3 and comment:
+            D('extra info: %s'% comment)
+        return await actionExecutor.doAction(action, sectionList=sectionList, progInfo=progInfo,
+                                             pauseBA=pauseBA, pauseBK=pauseBK, comingFrom=comingFrom)
+    finally:
+        tracer.endAction(tAction)
+
+def doActionSync(action, pauseBA=None, pauseBK=None,
+                 modInfo=None, sectionList=None, comment='', comingFrom=None):
+    """the synchronous wrapper of doActionAsync, with the arguments of doAction"""
+    return actionExecutor.run(doActionAsync(action, pauseBA=pauseBA, pauseBK=pauseBK, modInfo=modInfo,
+                                            sectionList=sectionList, comment=comment, comingFrom=comingFrom))
 
-    # now perform the action
-    # check if action consists of several parts:
+def doStep(step, completeAction, pauseBA=None, pauseBK=None,
+           progInfo=None, sectionList=None, comment='', comingFrom=None):
+    """perform a step of a compiled action (see actioncompiler), return a false value to stop the action
+    """
+    if comingFrom and comingFrom.interrupted:
+        print('command was interrupted')
+        return
     # assume progInfo is now available:
     prog = progInfo.prog
-    
-    if metaAction.match(action):  # exactly a meta action, <<....>>
-        a = metaAction.match(action).group(1)
+    kind = type(step)
+
+    if kind is actioncompiler.Keystrokes:
+        if debug > 5: D('do string: |%s|'% step.keys)
+        if debug > 1: do_W(debug*0.2)
+        t0 = tracer.enabled and tracer.clock()
+        doKeystroke(step.keys, pauseBK=pauseBK,
+                 progInfo=progInfo, sectionList=sectionList)
+        if t0: tracer.add('keystrokes', t0, step.keys)
+        if debug > 5: print('did it')
+        if debug > 1: do_W(debug*0.2)
+        if actionCompiler.settles(step):
+            pauseScheduler.settle(getWaitingTime(pauseBA))
+        return 1
+
+    if kind is actioncompiler.MetaAction:  # exactly a meta action, <<....>>
+        a = step.name
+        t0 = tracer.enabled and tracer.clock()
         aNew = getMetaAction(a, sectionList, progInfo)
+        if t0: tracer.add('meta', t0, a)
         if isinstance(aNew, tuple):
             # found function
             func, number = aNew
             print(f'meatAction, type func: {type(func)}')
             if type(func) in (types.FunctionType, types.MethodType):
-                func(number)
+                pauseScheduler.sync()
+                backend.suspend()
+                try:
+                    func(number)
+                finally:
+                    backend.resume()
                 return 1
             # else:
-            print('Error, not a valid action "%s" for "%s" in program "%s"'% (func, action, prog))
+            print('Error, not a valid action "%s" for "%s" in program "%s"'% (func, a, prog))
             return
         if debug > 5: D('doing meta action: <<%s>>: %s'% (a, aNew))
         if aNew:
-            aNewList = list(inivars.getIniList(aNew))
             res = 0
-            for aa in aNewList:
-                if aa:
-                    if debug > 3: D('\tdoing part of meta action: <<%s>>: %s'% (a, aa))
-                    res = doAction(aa, completeAction=completeAction,
+            for part in actionCompiler.compileExpansion(aNew):
+                if debug > 3: D('\tdoing part of meta action: <<%s>>: %s'% (a, part))
+                res = doStep(part, completeAction,
                              pauseBA=pauseBA, pauseBK=pauseBK,
                              progInfo=progInfo, sectionList=sectionList,
                              comment=comment, comingFrom=comingFrom)
-                    if not res: return
+                if not res: return
             return res
         if aNew == '':
             if debug > 1: D('empty action')
@@ -308,82 +557,57 @@ def doAction(action, completeAction=None, pauseBA=None, pauseBK=None,
             t += '\ncomplete command: "%s"'% completeAction
         raise ActionError(t)
 
-    # try qh command:
-    if action.find('(') > 0 and action.strip().endswith(')'):
-        com, rest = tuple([t.strip() for t in action.split('(', 1)])
-        rest = rest.strip()[:-1]
-    elif action.find(' ') > 0:
-        com, rest = tuple([t.strip() for t in action.split(' ',1)])
-    else:
-        com, rest = action.strip(), ''
-
-    if 'do_'+com in globals():
-        funcName = 'do_'+com
-        args = convertToPythonArgs(rest)
+    if kind is actioncompiler.Command:
+        # qh command, the USC function and its (converted) arguments:
+        func, args = step.func, step.args
         kw = {}
         kw['progInfo'] = progInfo
         kw['comingFrom'] = comingFrom
-        func = globals()[funcName]
-        if not type(func) in (types.FunctionType, types.MethodType):
-            raise ActionError(f'appears to be not a function: "{funcName} ("{func}")')
-        if debug > 5: D('doing USC command: |%s|, with args: %s and kw: %s'% (com, repr(args), kw))
+        if debug > 5: D('doing USC command: |%s|, with args: %s and kw: %s'% (step.name, repr(args), kw))
         if debug > 1: do_W(debug*0.2)
-        if args:
-            result = func(*args, **kw)
+        t0 = tracer.enabled and tracer.clock()
+        if func in waitingCommands:
+            result = func(*(args or ()), **kw)
         else:
-            result = func(**kw)
-                
+            # the command may look at the window, so its keystrokes are sent at once:
+            pauseScheduler.sync()
+            backend.suspend()
+            try:
+                if args:
+                    result = func(*args, **kw)
+                else:
+                    result = func(**kw)
+            finally:
+                backend.resume()
+        if t0: tracer.add('command', t0, step.name)
         if debug > 5: print('did it, result: %s'% result)
         if debug > 1: do_W(debug*0.2)
-        # skip pause between actions
-        #do_W(pauseBA)
+        if actionCompiler.settles(step):
+            pauseScheduler.settle(getWaitingTime(pauseBA))
         return result
 
-    # try meta actions inside:
-    if metaActions.search(action): # action contains meta actions
-        As = [t.strip() for t in metaActions.split(action)]
-        if debug > 5: D('meta actions: %s'% As)
-        for a in As:
-            if not a: continue
-            res = doAction(a, completeAction,
+    if kind is actioncompiler.Sequence:
+        # meta actions inside:
+        if debug > 5: D('meta actions: %s'% (step.steps,))
+        for part in step.steps:
+            res = doStep(part, completeAction,
                      pauseBA=pauseBA, pauseBK=pauseBK, 
                      progInfo=progInfo, sectionList=sectionList,
                      comment=comment, comingFrom=comingFrom)
             if not res: return
-            do_W(pauseBA)
-            # skip pause between actions
-            #do_W(pauseBA)
         return 1
 
-    # try natspeak command:
-
-    if com in natspeakCommands:
-        rest = convertToDvcArgs(rest)
-        C = com + ' ' + rest
-        if debug: D('do dvc command: |%s|'% C)
+    if kind is actioncompiler.NatspeakCommand:
+        if debug: D('do dvc command: |%s|'% step.script)
         if debug > 1: do_W(debug*0.2)
-        natlink.execScript(com + ' ' + rest)
+        pauseScheduler.sync()
+        backend.execScript(step.script)
         if debug > 5: print('did it')
         if debug > 1: do_W(debug*0.2)
-        # skip pause between actions
-        #do_W(pauseBA)
+        if actionCompiler.settles(step):
+            pauseScheduler.settle(getWaitingTime(pauseBA))
         return 1
-
-    # all the rest:
-    if debug > 5: D('do string: |%s|'% action)
-    if debug > 1: do_W(debug*0.2)
-    if action:
-        doKeystroke(action, pauseBK=pauseBK,
-                 progInfo=progInfo, sectionList=sectionList)
-        if debug > 5: print('did it')
-        if debug > 1: do_W(debug*0.2)
-        # skip pause between actions
-        #do_W(pauseBA)
-        if topLevel: # first (nonrecursive) call,
-            print('end of complete action')
-        return 1
-    if debug:
-        print('empty keystrokes')
+    raise ActionError('invalid step of action "%s": %s'% (completeAction, step))
         
 def doKeystroke(action, hardKeys=None, pauseBK=None,
                      progInfo=None, sectionList=None):
@@ -392,6 +616,7 @@ def doKeystroke(action, hardKeys=None, pauseBK=None,
     #print 'doing keystroke: {%s'% action[1:]
     if not action:
         return
+    pauseScheduler.sync()  # the pending pauses of the action come first
     ### bugfix as proposed by Frank Olaf:
     #if not action.startswith("{shift}"):
     #    action = "{shift}" + action
@@ -405,8 +630,7 @@ def doKeystroke(action, hardKeys=None, pauseBK=None,
             D('no valid inifile for actions')
             return
     if checkForChanges:
-        if debug > 5: D('checking for changes')
-        doCheckForChanges() # resetting the ini file if changes were made# 
+        checkIniWatcher() # the ini file is reloaded in the background if changes were made
     if not ini:
         D('no valid inifile for keystrokes')
     if isinstance(hardKeys, str):
@@ -418,20 +642,21 @@ def doKeystroke(action, hardKeys=None, pauseBK=None,
 
     if debug > 5: D('doKeystroke, pauseBK: %s, hardKeys: %s'% (pauseBK, hardKeys))
 
-    if pauseBK is None or hardKeys is None:
-        if sectionList is None:
-            sectionList = getSectionList(progInfo)
+    if (pauseBK is None or hardKeys is None) and sectionList is None:
+        windowSettings = getWindowSettings(progInfo)
+        if pauseBK is None:
+            pauseBK = windowSettings.pauseBK
+        if hardKeys is None:
+            hardKeys = windowSettings.hardKeys
+        if debug > 5: D('new keystokes: |%s|, hardKeys: %s, pauseBK: %s (window settings)'%
+                        (action, hardKeys, pauseBK))
+    elif pauseBK is None or hardKeys is None:
         if pauseBK is None:
             pauseBK = int(setting('pause between keystrokes', '0',
                                   sectionList=sectionList))
         if hardKeys is None:
-            hardKeys = setting('keystrokes with systemkeys', 'none', sectionList=sectionList)
-            if debug > 5: D('hardKeys setting: |%s|'% hardKeys)
-
-            hardKeys = actionIsList.split(hardKeys)
-            if hardKeys:
-                hardKeys = [k.strip() for k in hardKeys]
-                if debug > 5: D('hardKeys as list: |%s|'% hardKeys)
+            hardKeys = getHardKeys(sectionList)
+            if debug > 5: D('hardKeys as list: |%s|'% hardKeys)
 
         if debug > 5: D('new keystokes: |%s|, hardKeys: %s, pauseBK: %s'%
                         (action, hardKeys, pauseBK))
@@ -440,65 +665,50 @@ def doKeystroke(action, hardKeys=None, pauseBK=None,
     elif debug > 5:
         D('keystokes: |%s|, hardKeys: %s, pauseBK: %s'%
                         (action, hardKeys, pauseBK))
-    if pauseBK:
-        l = hasBraces.split(action)
-        for k in l:
-            if not k:
-                continue
-            if braceExact.match(action):
-                doKeystroke(k, hardKeys=hardKeys, pauseBK = 0)
-            else:
-                for K in k:
-                    doKeystroke(K, hardKeys=hardKeys, pauseBK = 0)
-            if debug > 5: D('pausing: %s msec after keystroke: |%s|'%
-                            (pauseBK, k))
-            # skip pausing between keystrokes
-            #do_W(pauseBK)
-    elif braceExact.match(action):
+    # the splits of the keystrokes, cached by the action compiler.
+    # (the pause between keystrokes is skipped: the soft keystrokes of an action
+    # are sent in one call, see BatchingBackend)
+    keystrokes = actionCompiler.compileKeystrokes(action)
+    if keystrokes.exact:
         # exactly 1 {key}:
         if debug > 5: D('exact action, hardKeys[0]: %s'% hardKeys[0])
         if hardKeys[0] == 'none':
-            sendkeys(action)
+            backend.sendKeys(action)
             return
         if hardKeys[0] == 'all':
-            natlink.execScript('SendSystemKeys("{action}")')
+            backend.sendSystemKeys(action)
             return
-        m = BracesExtractKey.match(action)
-        if m:
+        keyPart = keystrokes.keyPart
+        if keyPart:
             # the key part is known and valid word
             # eg tab, down etc
-            keyPart = m.group(0).lower()
-            for mod in 'shift+', 'ctrl+', 'alt+':
-                if keyPart.find(mod)>0: keyPart = keyPart.replace(mod, '')
             if keyPart in hardKeys:
                 if debug > 3: D('doing "hard": |%s|'% action)
-                sendsystemkeys(action)
+                backend.sendSystemKeys(action)
                 return
             if debug > 3: D('doing "soft" (%s): |%s|'% (action, hardKeys))
-            sendkeys(action)  # fastest way
+            backend.sendKeys(action)  # fastest way
             return
         # else:
         if debug > 3: D('doing "soft" (%s): |%s|'% (action, hardKeys))
-        sendkeys(action)
+        backend.sendKeys(action)
         return
         
     # now proceed with more complex keystroke possibilities:
     if hardKeys[0]  == 'all':
-        sendsystemkeys(action)
+        backend.sendSystemKeys(action)
         return
     if hardKeys[0]  == 'none':
-        sendkeys(action)
+        backend.sendKeys(action)
         return
-    if hasBraces.search(action):
-        keystrokeList = hasBraces.split(action)
-        for k in keystrokeList:
+    if keystrokes.braces:
+        for k in keystrokes.chunks:
             if debug > 5: D('part of keystrokes: |%s|' % k)
-            if not k: continue
             #print 'recursing? : %s (%s)'% (k, keystrokeList)
             doKeystroke(k, hardKeys=hardKeys, pauseBK = 0)
     else:
         if debug > 5: D('no braces keystrokes: |%s|' % action)
-        sendkeys(action)
+        backend.sendKeys(action)
         
 def getMetaAction(a, sectionList=None, progInfo=None):
     if progInfo is None:
@@ -506,16 +716,7 @@ def getMetaAction(a, sectionList=None, progInfo=None):
     if sectionList is None:
         sectionList = getSectionList(progInfo)
     
-    m = metaNumber.search(a)
-    if m:
-        number = m.group(1)
-        A = a.replace(number, 'n')
-        actionName = a.replace(number, '')
-        actionName = actionName.replace(' ', '')
-    else:
-        A = a
-        number = 0
-        actionName = a.replace(' ', '')
+    A, number, actionName = metaActionCache.parseName(a)
     # try via actions_prog module:
     ext_instance = get_instance_from_progInfo(progInfo)
     if ext_instance:
@@ -533,17 +734,90 @@ def getMetaAction(a, sectionList=None, progInfo=None):
     if debug > 5: D('search for action: |%s|, sectionList: %s' %
                     (A, sectionList))
     
-    aNew = setting(A, default=None, sectionList=sectionList)
+    # the value in the inifile is cached per section list, with the number substituted:
+    aNew = metaActionCache.get(a, sectionList, getMetaActionFromIni)
     if aNew is None:
         print('action: not found, meta action for %s: |%s|, searched in sectionList: %s' % \
               (a, aNew, sectionList))
         return 
-    if m:
-        aNew = metaNumberBack.sub(number, aNew)
     if debug:
         section = ini.getMatchingSection(sectionList, A)
         D('<<%s>> from [%s]: %s'% (A, section, aNew)) 
     return aNew        
+
+def getMetaActionFromIni(A, sectionList):
+    """return the value of meta action A (eg "gotoline n") in the inifile, None if not found
+
+    the meta actions inside the value are expanded where possible (see getMetaActionTable)
+    """
+    value = setting(A, default=None, sectionList=sectionList)
+    if value and '<<' in value:
+        table = getMetaActionTable()
+        key = inivars.normalizeName(A)
+        section = ini.getMatchingSection(sectionList, key)
+        if (section, key) in table.cycles:
+            raise ActionError('_actions, meta action refers to itself: [%s] %s'%
+                              (section, ' -> '.join(table.cycles[(section, key)])))
+        value = table.get(section, key, value)
+    return value
+
+def getMetaActionTable():
+    """return the MetaActionTable of the inifile: the meta actions with nested meta actions expanded
+
+    made at the first use or with a new inifile (prepareIni), and updated for the changed keys
+    only (see iniChanged)
+    """
+    #pylint:disable=W0603
+    global metaActionTable
+    table = metaActionTable
+    if table is None:
+        table = metaActionTable = makeMetaActionTable(ini)
+    return table
+
+def makeMetaActionTable(theIni):
+    """expand the meta actions of theIni, and report the meta actions that refer to themselves"""
+    sections = {section: getSectionValues(theIni, section) for section in theIni.get()}
+    table = actioncompiler.MetaActionTable(sections, actionCompiler,
+                                           deferredNames=getMetaActionFunctionNames())
+    reportCycles(table, table.cycles)
+    if debug > 1: D('meta actions expanded: %s, cycles: %s'% (len(table.flattened), len(table.cycles)))
+    return table
+
+def reportCycles(table, nodes):
+    """print the meta actions of nodes ((section, key) pairs) that refer to themselves"""
+    for section, key in sorted(node for node in nodes if node in table.cycles):
+        print('actions inifile, meta action refers to itself, [%s] %s: %s'%
+              (section, key, ' -> '.join(table.cycles[(section, key)])))
+
+def getSectionValues(theIni, section):
+    """return the keys and values of section of theIni as a dict, None if there is no section"""
+    if not theIni.hasSection(section):
+        return None
+    return {key: theIni.get(section, key) for key in theIni.get(section)}
+
+def getMetaActionFunctionNames():
+    """return the names of the meta action functions (metaaction_name) of the actions modules of the programs
+
+    read from the sources (the modules are only imported when a program needs them)
+    """
+    #pylint:disable=W0603
+    global metaActionFunctionNames
+    if metaActionFunctionNames is None:
+        names = set()
+        for path in (Path(dtactionsDir)/'unimacroactionclasses').glob('*.py'):
+            names.update(metaActionFunction.findall(path.read_text(encoding='utf-8', errors='replace')))
+        metaActionFunctionNames = names
+    return metaActionFunctionNames
+
+# values of the meta actions per section list (entries are dropped on changes, see iniChanged):
+metaActionCache = actioncompiler.MetaActionCache()
+# the meta actions with the nested meta actions expanded (updated after changes, see iniChanged):
+metaActionTable = None
+metaActionFunction = re.compile(r'^\s*def metaaction_(\w+)', re.M)
+metaActionFunctionNames = None
+# section lists and settings per window (the windows that depend on a change are dropped, see iniChanged):
+windowSettingsCache = actioncompiler.WindowSettingsCache(
+    settingKeys=('pause between actions', 'pause between keystrokes', 'keystrokes with systemkeys'))
     
 natspeakCommands = ['ActiveControlPick', 'ActiveMenuPick', 'AppBringUp', 'AppSwapWith', 'Beep', 'ButtonClick',
  'ClearDesktop', 'ControlPick', 'DdeExecute', 'DdePoke', 'DllCall', 'DragToPoint', 'GoToSleep', 
@@ -554,8 +828,39 @@ natspeakCommands = ['ActiveControlPick', 'ActiveMenuPick', 'AppBringUp', 'AppSwa
 # last one undocumented, only for version 7
 
 def getSectionList(progInfo=None):
+    """return the sections for the window of progInfo (cached, see getWindowSettings)"""
     if not progInfo:
         progInfo = unimacroutils.getProgInfo()
+    return list(getWindowSettings(progInfo).sectionList)
+
+def getWindowSettings(progInfo):
+    """return the WindowSettings of progInfo: the section lists and the pause and hard keys settings
+
+    cached per (prog, title, toporchild), the cache is cleared when the inifile changes
+    """
+    if not progInfo:
+        progInfo = unimacroutils.getProgInfo()
+    return windowSettingsCache.get(progInfo, makeWindowSettings)
+
+def makeWindowSettings(progInfo):
+    """make the WindowSettings of progInfo (see getWindowSettings)"""
+    sectionList = tuple(makeSectionList(progInfo))
+    _progpath, prog, title, _toporchild, _classname, _hndle = progInfo
+    # the section list of getFromIni (without sectionList):
+    iniSectionList = tuple(ini.getSectionsWithPrefix(prog, title) + ini.getSectionsWithPrefix('default', title))
+    pauseBA = float(setting('pause between actions', '0', sectionList=sectionList))
+    pauseBK = float(setting('pause between keystrokes', '0', sectionList=sectionList))
+    return actioncompiler.WindowSettings(sectionList, iniSectionList, pauseBA, pauseBK,
+                                         tuple(getHardKeys(sectionList)))
+
+def getHardKeys(sectionList):
+    """return the list of the "keystrokes with systemkeys" setting"""
+    hardKeys = setting('keystrokes with systemkeys', 'none', sectionList=sectionList)
+    if debug > 5: D('hardKeys setting: |%s|'% hardKeys)
+    return [k.strip() for k in actionIsList.split(hardKeys)]
+
+def makeSectionList(progInfo):
+    """return the sections of prog and title, of prog and top/child, and default top/child"""
     _progpath, prog, title, _topchild, _classname, _hndle = progInfo
     if debug > 5:
         D('search for prog: %s and title: %s' % (prog, title))
@@ -575,8 +880,10 @@ def convertToDvcArgs(text):
     text = text.strip()
     if not text:
         return ''
+    t0 = tracer.enabled and tracer.clock()
     L = text.split(',')
     L = list(map(_convertToDvcArg, L))
+    if t0: tracer.add('convert', t0, text)
     return ', '.join(L)
 
 hasDoubleQuotes = re.compile(r'^".*"$')
@@ -619,8 +926,10 @@ def convertToPythonArgs(text):
     text = text.strip()
     if not text:
         return    # None
+    t0 = tracer.enabled and tracer.clock()
     L = text.split(',')
     L = list(map(_convertToPythonArg, L))
+    if t0: tracer.add('convert', t0, text)
     return tuple(L)
 
 def _convertToPythonArg(t):
@@ -659,6 +968,27 @@ def _convertToPythonArg(t):
 ##    else:
 ##        return '"%s"'% t
         
+def getActionCommand(com):
+    """return the function of USC command com (do_com), None if there is no such command
+    """
+    func = globals().get('do_'+com)
+    if func is None:
+        return None
+    if not type(func) in (types.FunctionType, types.MethodType):
+        raise ActionError(f'appears to be not a function: "do_{com} ("{func}")')
+    return func
+
+# after these (USC and Dragon) commands the window must settle, the pause between actions is done:
+settlingCommands = ['RTW', 'TASK', 'TASKOD', 'TASKMAX', 'TASKMIN', 'TASKRESTORE', 'TASKTOSCREEN',
+                    'TOCLOCK', 'DOCUMENT', 'KW', 'WINKEY', 'COPYNAME', 'CLIPRESTORE', 'SCLIP',
+                    'AppBringUp', 'AppSwapWith', 'ShellExecute']
+
+# action strings are parsed once into plans (cleared when the inifile is reloaded, see swapIni):
+actionCompiler = actioncompiler.ActionCompiler(getActionCommand, natspeakCommands,
+                                               convertArgs=convertToPythonArgs,
+                                               convertDvcArgs=convertToDvcArgs,
+                                               settlingCommands=settlingCommands)
+
 
 def getFromIni(keyword, default='',
                 sectionList=None, progInfo=None):
@@ -666,9 +996,7 @@ def getFromIni(keyword, default='',
         return ''
     if sectionList is None:
         if progInfo is None: progInfo = unimacroutils.getProgInfo()
-        _progpath, prog, title, _toporchild, _classname, _hndle = progInfo
-        sectionList = ini.getSectionsWithPrefix(prog, title) + \
-                      ini.getSectionsWithPrefix('default', title)
+        sectionList = getWindowSettings(progInfo).iniSectionList
         if debug > 5: D('getFromIni, sectionList: |%s|' % sectionList)
     value = ini.get(sectionList, keyword, default)
     if debug > 5: D('got from setting/getFromIni: %s (keyword: %s'% (value, keyword))
@@ -723,14 +1051,12 @@ def get_instance_from_progInfo(progInfo):
 
 def doCheckForChanges(previousIni=None):
     #pylint:disable=W0603
-    global  ini, iniFileDate, TopChildDict, ChildTopDict
+    global  ini, iniFileDate
     newDate = unimacroutils.getFileDate(inifile)
     if newDate > iniFileDate:
         D('----------reloading ini file')
         try:
-            TopChildDict = None
-            ChildTopDict = None
-            ini = inivars.IniVars(inifile)
+            swapIni(loadIni())
         except inivars.IniError:
             msg = 'repair actions ini file: \n\n' + str(sys.exc_info()[1])
             #win32api.ShellExecute(0, "open", inifile, None , "", 1)
@@ -741,6 +1067,92 @@ def doCheckForChanges(previousIni=None):
         iniFileDate = newDate
 
 
+def startWatching():
+    """start watching the inifile (and the sample inifile) in a background thread
+
+    a changed inifile is parsed in the watcher thread (reloadIni), and the global ini
+    is replaced at the start of the next action (checkIniWatcher), so doAction and doKeystroke
+    do not check the file date or parse.
+    """
+    #pylint:disable=W0603
+    global watcher
+    if watcher is None:
+        watcher = filewatcher.FileWatcher([sampleInifile, inifile], reloadIni)
+        watcher.start()
+        if debug: D('watching inifile for changes (%s): %s'% (watcher.getMethod(), inifile))
+
+def stopWatching():
+    """stop the background watcher of the inifile"""
+    #pylint:disable=W0603
+    global watcher
+    if watcher is not None:
+        watcher.stop()
+        watcher = None
+
+def reloadIni(changedFiles=None):
+    """parse the inifile again, with the differences and the meta action table (in the watcher thread)
+
+    the prepared inifile (see prepareIni) is swapped in by the main thread at the next action
+    (see swapPendingIni), so the global ini and the caches are only changed by the main thread,
+    and the main thread does not diff, expand meta actions or stat the inifile.
+    On an error the previous ini remains, and the message is shown at the next action.
+    """
+    #pylint:disable=W0603, W0613
+    global pendingIni, pendingMessage
+    try:
+        newIni = loadIni()
+    except inivars.IniError:
+        pendingMessage = 'repair actions ini file: \n\n' + str(sys.exc_info()[1])
+        return
+    # the date as seen by the watcher, or (called directly) of the file:
+    theWatcher = watcher
+    fileDate = theWatcher.getFileDate(inifile) if theWatcher else unimacroutils.getFileDate(inifile)
+    # a pending inifile that is not swapped in yet is the previous one:
+    with reloadLock:
+        previous = pendingIni
+    if previous is None:
+        previousIni, previousTable = ini, metaActionTable
+    else:
+        previousIni, previousTable = previous.ini, previous.metaActionTable
+    prepared = prepareIni(newIni, previousIni, previousTable, fileDate)
+    with reloadLock:
+        if previous is not None and pendingIni is previous:
+            # the previous one is not swapped in yet, the changes of both:
+            if previous.changes is None or prepared.changes is None:
+                prepared = prepared._replace(changes=None)
+            else:
+                prepared = prepared._replace(changes=previous.changes + prepared.changes,
+                                             sections=previous.sections | prepared.sections)
+        pendingIni = prepared
+    if debug: D('----------reloaded ini file')
+
+def swapPendingIni():
+    """swap in the inifile prepared by the watcher thread (see reloadIni), return True if done
+
+    called by the main thread, at the start of an action (checkIniWatcher)
+    """
+    #pylint:disable=W0603
+    global pendingIni
+    with reloadLock:
+        prepared, pendingIni = pendingIni, None
+    if prepared is None:
+        return False
+    installIni(prepared)
+    return True
+
+def checkIniWatcher():
+    """start the watcher if not running, swap in a reloaded inifile, and show the message of a failed reload
+    """
+    #pylint:disable=W0603
+    global pendingMessage
+    if watcher is None:
+        startWatching()
+    swapPendingIni()
+    if pendingMessage and ini:
+        m = pendingMessage
+        pendingMessage = ''
+        Message(m)
+
 def writeDebug(s):
     if debugSock:
         debugSock.write(s+'\n')
@@ -804,6 +1216,33 @@ def showActions(progInfo=None, lineLen=60, sort=1, comingFrom=None, name=None):
         print('showing actions by ShellExecute crashed NatSpeak, please open by hand above file')
     #win32api.ShellExecute(0, "open", whatFile, None , "", 1)
 
+def showActionTimings(n=20):
+    """print the time of the last n actions: idle (the pauses) and working, and the output counts"""
+    print(pauseScheduler.formatTimings(n))
+    metrics = backend.getMetrics()
+    print('keystroke events: %(keyEvents)s, sendkeys calls: %(keyCalls)s, '
+          'output calls: %(outputCalls)s, waits: %(waits)s'% metrics)
+
+def traceActions(on=1, size=None):
+    """switch the tracing of the actions on (optionally with the number of spans kept) or off"""
+    if on:
+        tracer.enable(size)
+    else:
+        tracer.disable()
+
+def showActionProfile(n=20, traceFile=None):
+    """print the p50/p95 times of the n slowest actions and of the parts of the actions
+
+    traceActions must be switched on before. With traceFile the spans are written
+    in the Chrome trace-event format (for chrome://tracing or Perfetto)
+    """
+    if not tracer.enabled and not tracer.spans:
+        print('action tracing is off, switch on with traceActions()')
+        return
+    print(tracer.formatProfile(n))
+    if traceFile:
+        print('trace written to: %s'% tracer.writeChromeTrace(traceFile))
+
 def getTranslation(language, Dict):
     """get with self.language as key the text from dict, if invalid, return 'enx' text
     """
@@ -840,7 +1279,7 @@ def setPosition(name, pos, prog=None):
     else:
         section = 'positions'
     ini.set(section, name, pos)
-    unimacroutils.Wait(0.1)
+    Wait(0.1)
     ini.write()
 
 def getPosition(name, prog=None):
@@ -919,14 +1358,14 @@ def do_MP(scrorwind, x, y, mouse='left', nClick=1, **kw):
     if not scrorwind in [0,1,2,3,4,5]:
         raise ActionError('Mouse action not supported with relativeTo: %s' % scrorwind)
     # first parameter 1: relative:
-    unimacroutils.doMouse(0,scrorwind,x,y,mouse,nClick)  # abs, rel to window, x, y, click
+    backend.doMouse(0,scrorwind,x,y,mouse,nClick)  # abs, rel to window, x, y, click
     return 1
 
 def do_CLICK(mouse='left', nClick=1, **kw):
     scrorwind = 2
     x, y, = 0, 0
     # click at current position:
-    unimacroutils.doMouse(0,scrorwind,x,y,mouse,nClick) 
+    backend.doMouse(0,scrorwind,x,y,mouse,nClick) 
     return 1
 
 
@@ -1044,7 +1483,7 @@ def do_RMP(scrorwind, x, y, mouse='left', nClick=1, **kw):
     if not scrorwind in [0,1,3,5]:
         raise ActionError(f'Mouse action not supported with relativeTo: "{scrorwind}"')
     # first parameter 1: relative:
-    unimacroutils.doMouse(1,scrorwind,x,y,mouse,nClick)  # relative, rel to window, x, y,click
+    backend.doMouse(1,scrorwind,x,y,mouse,nClick)  # relative, rel to window, x, y,click
     return 1
     
 def do_PRMP(all=0, **kw):
@@ -1072,7 +1511,7 @@ def do_NSM(**kw):
     prog = unimacroutils.getProgName(modInfo)
     if prog == 'natspeak':
         if modInfo[1].find('DragonPad') >= 0:
-            sendkeys('{alt+n}')
+            backend.sendKeys('{alt+n}')
             return 1
     natlink.recognitionMimic(["NaturallySpeaking"])
     return unimacroutils.waitForWindowTitle(['DragonBar', 'Dragon-balk', 'Voicebar'],10,0.1)
@@ -1080,7 +1519,7 @@ def do_NSM(**kw):
 
 # shorthand for sendsystemkeys:
 def do_SSK(s, **kw):
-    sendsystemkeys(s)
+    backend.sendSystemKeys(s)
     return 1
 
 def do_S(s, **kw):
@@ -1115,13 +1554,13 @@ def do_ALTNUM(s, **kw):
         sequence.append( (keydown, keycode, 1))
         sequence.append( (keyup, keycode, 1))
     sequence.append(altup)
-    natlink.playEvents(sequence)
+    backend.playEvents(sequence)
     
 def do_SCLIP(*s, **kw):
     """send keystrokes through the clipboard
     """
-    unimacroutils.saveClipboard()
-    unimacroutils.Wait()    
+    backend.saveClipboard()
+    Wait()    
     ## actions should be able to catch , in string, now , seems to be separator for
     ## function parameters.
     ## assume , = ", "
@@ -1132,12 +1571,12 @@ def do_SCLIP(*s, **kw):
     #    for i, t in enumerate(s):
     #        print "SCLIP:", i, t
     total = total.replace("{enter}", "\n")
-    unimacroutils.setClipboard(total, format=13)
-    unimacroutils.Wait()
+    backend.setClipboard(total, format=13)
+    Wait()
     #print 'send through clipboard: %s'% total5N
     doAction("<<paste>>")
-    unimacroutils.Wait()
-    unimacroutils.restoreClipboard() 
+    Wait()
+    backend.restoreClipboard() 
 
 
 def do_RW(**kw):
@@ -1156,11 +1595,11 @@ def do_RTW(**kw):
 def do_SELECTWORD(count=1, direction=None, **kw):
     """select the word under the cursor"""
     print('try to select %s word(s) under cursor (direction: %s)'% (count, direction))
-    unimacroutils.saveClipboard()
+    backend.saveClipboard()
     if not direction in ['left', 'right']:
         # try if at end of word:
         doKeystroke("{extright}{shift+extleft}{ctrl+c}{extright}{extleft}")
-        t = unimacroutils.getClipboard()
+        t = backend.getClipboard()
         if isinstance(t, str):
             direction = 'right'
             print('make direction right')
@@ -1172,10 +1611,10 @@ def do_SELECTWORD(count=1, direction=None, **kw):
     elif direction == 'right':
         doKeystroke("{extright}{ctrl+extleft}{shift+ctrl+extright %s}"% count)
 
-    unimacroutils.Wait()
+    Wait()
     doAction("<<copy>>")
-    unimacroutils.visibleWait()
-    t = unimacroutils.getClipboard()
+    visibleWait()
+    t = backend.getClipboard()
     if not isinstance(t, str):
         ## not a str clipboard, TODO QH
         return ''
@@ -1189,7 +1628,7 @@ def do_SELECTWORD(count=1, direction=None, **kw):
         while t and t.endswith(' '):
             doKeystroke("{shift+extleft}")
             t = t[:-1]
-    unimacroutils.restoreClipboard()
+    backend.restoreClipboard()
     #print 'SELECTWORD, selected word: |%s| (leave on clipboard: %s'% (repr(t), repr(unimacroutils.getClipboard()))
     return t
 
@@ -1212,32 +1651,124 @@ def do_WWT(titleName, nWait=20, waitingTime=0.05, **kw):
     """
     return unimacroutils.waitForWindowTitle(titleName, nWait, waitingTime, **kw)
   
-# waiting function:
+# waiting function, W without a time waits 0.1 seconds, W 0 does not wait:
 def do_W(t=None, **kw):
-    t = t or 0.1
+    if t is None:
+        t = 0.1
+    t = getWaitingTime(t)
     if debug > 7: D('waiting: %s'%t)
     elif debug and t > 2: D('waiting: %s'%t)
-    unimacroutils.Wait(t)
+    # inside an action the wait is merged with the other pauses (see pauseScheduler):
+    pauseScheduler.wait(t)
     return 1
         
 do_WAIT = do_W
 # Long Wait:
 def do_LW(**kw):
-    unimacroutils.longWait()
+    pauseScheduler.wait(getWaitingTime(unimacroutils.defaultWaitingTime*unimacroutils.longWaitFactor))
     return 1
 do_LONGWAIT = do_LW
 # Visible Wait:
 def do_VW(**kw):
-    unimacroutils.visibleWait()
+    pauseScheduler.wait(getWaitingTime(unimacroutils.defaultWaitingTime*unimacroutils.visibleWaitFactor))
     return 1
 do_VISIBLEWAIT = do_VW
 
 # Short Wait:
 def do_SW(**kw):
-    unimacroutils.shortWait()
+    pauseScheduler.wait(getWaitingTime(unimacroutils.defaultWaitingTime*unimacroutils.shortWaitFactor))
     return 1
 do_SHORTWAIT = do_SW
 
+# the waits are scheduled, no need to do the pending pauses before them (see doStep):
+waitingCommands = {do_W, do_LW, do_VW, do_SW}
+
+# the async versions of the USC commands that wait (see doActionAsync), they poll via the executor:
+async def async_WTC(nWait=20, waitingTime=0.05, executor=None, comingFrom=None, **kw):
+    """wait for a new window (after RW), which must be stable, on succes return 1"""
+    oldHndle = unimacroutils.Hndle
+    if oldHndle is None:
+        raise ActionError('WTC, no valid old window handle, do a RW (rememberWindow) first')
+    timeout = nWait*waitingTime
+    def newWindow():
+        modInfo = natlink.getCurrentModule()
+        return modInfo and modInfo[2] != oldHndle
+    if not await executor.poll(newWindow, timeout, waitingTime, comingFrom):
+        print("waiting for new window lasts too long, fail")
+        return None
+    if await executor.pollStable(natlink.getCurrentModule, 3, timeout, waitingTime, comingFrom) is None:
+        print("WTC: found new window, but it was not stable")
+        return None
+    return 1
+
+async def async_WWT(titleName, nWait=20, waitingTime=0.05, executor=None, comingFrom=None, **kw):
+    """wait for a window with titleName (or one of a list) in its title, on succes return 1"""
+    titles = [titleName.lower()] if isinstance(titleName, str) else [t.lower() for t in titleName]
+    def hasTitle():
+        title = natlink.getCurrentModule()[1].lower()
+        return title and any(t in title for t in titles)
+    if await executor.poll(hasTitle, nWait*waitingTime, waitingTime, comingFrom):
+        return 1
+    print('Waiting for window title "%s" lasts too long, failed'% titleName)
+    return None
+
+async def async_WAITMOUSEMOVE(executor=None, comingFrom=None, **kw):
+    """wait for the mouse start moving, cancel after 2 seconds"""
+    start = natlink.getCursorPos()
+    if await executor.poll(lambda: natlink.getCursorPos() != start, 2.0, 0.05, comingFrom):
+        return 1
+    print('no mouse move detected, cancel action')
+    return 0
+
+async def async_WAITMOUSESTOP(executor=None, comingFrom=None, **kw):
+    """wait for the mouse stops moving (steady for half a second), see do_WAITMOUSESTOP"""
+    natlink.setMicState('off')
+    xold, yold = natlink.getCursorPos()
+    steady = 0
+    while await executor.sleep(0.05, comingFrom):
+        x, y = natlink.getCursorPos()
+        if (x, y) == (xold, yold):
+            steady += 1
+            if steady > 10:
+                print('mouse stopped moving')
+                natlink.setMicState('on')
+                return 1
+            continue
+        steady = 0
+        if (x-xold)*(x-xold) + (y-yold)*(y-yold) > 100*100:
+            print("user canceled WAITMOUSESTOP canceled by moving mouse more than 100 pixels")
+            return None
+        xold, yold = x, y
+        if natlink.getMicState() == "on":
+            print('user canceled WAITMOUSESTOP by switching on microphone')
+            return None
+    return None
+
+async def async_CHECKMOUSESTEADY(executor=None, comingFrom=None, **kw):
+    """returns 1 if the mouse is steady (for half a second, within 2.5 seconds)"""
+    if await executor.pollStable(natlink.getCursorPos, 11, 2.5, 0.05, comingFrom) is None:
+        return None
+    print('mouse stopped moving')
+    natlink.setMicState('on')
+    return 1
+
+def executorKeystrokes(step, context):
+    t0 = tracer.enabled and tracer.clock()
+    doKeystroke(step.keys, pauseBK=context.pauseBK, progInfo=context.progInfo, sectionList=context.sectionList)
+    if t0: tracer.add('keystrokes', t0, step.keys)
+
+# the async execution of actions (doActionAsync), with the plans, output and pauses of doAction:
+asyncCommands = {name[len('async_'):]: func for name, func in list(globals().items())
+                 if name.startswith('async_')}
+actionExecutor = actionexecutor.ActionExecutor(actionCompiler, backend, scheduler=pauseScheduler,
+                                               getMetaAction=getMetaAction, sendKeystrokes=executorKeystrokes,
+                                               asyncCommands=asyncCommands, waitingCommands=waitingCommands,
+                                               errorClass=ActionError)
+
+# expand the meta actions of the inifile (and report cycles) at load time:
+if ini:
+    getMetaActionTable()
+
 def do_KW(action1=None, action2=None, progInfo=None, comingFrom=None):
     """kill window
 
@@ -1293,7 +1824,7 @@ def do_DATE(Format=None, Action=None, **kw):
         doKeystroke(fdate)
     elif Action in ['speak']:
         command = 'TTSPlayString "%s"'% fdate
-        natlink.execScript(command)
+        backend.execScript(command)
     else:
         print('invalid Action for DATE: %s'% Action)
     return 1
@@ -1314,7 +1845,7 @@ def do_TIME(Format=None, Action=None, **kw):
         doKeystroke(ftime)
     elif Action in ['speak']:
         command = 'TTSPlayString "%s"'% ftime
-        natlink.execScript(command)
+        backend.execScript(command)
     else:
         print('invalid Action for DATE: %s'% Action)
         
@@ -1326,7 +1857,7 @@ def do_SPEAK(t, **kw):
     """speak text through TTSPlayString
     """
     command = 'TTSPlayString "%s"'% t
-    natlink.execScript(command)
+    backend.execScript(command)
 
 def do_PRINT(t, **kw):
     """print text to Messages of Python Macros window
@@ -1399,15 +1930,15 @@ def do_U(n, **kw):
     # print 'U in: %s, Code: %s(type: %s)'% (n, Code, type(Code))
     if Code <256:
         # print 'do direct, ascii: %s, %s'% (Code, chr(Code))
-        sendkeys(chr(Code))
+        backend.sendKeys(chr(Code))
         return
     u = chr(Code)
     # output through the clipboard with special code:
-    unimacroutils.saveClipboard()
+    backend.saveClipboard()
     #win32con.CF_UNICODETEXT = 13
-    unimacroutils.setClipboard(u, format=13)
-    sendkeys('{ctrl+v}')
-    unimacroutils.restoreClipboard()    
+    backend.setClipboard(u, format=13)
+    backend.sendKeys('{ctrl+v}')
+    backend.restoreClipboard()    
     return 1
                 
 
@@ -1447,7 +1978,7 @@ def do_DOCUMENT(number=None, **kw):
         my = mouseY1 + (count-1)*mouseYdiff
 ##        print 'mx, my:', mx, my
         #print 'task to %s, %s'% (mx, my)
-        unimacroutils.doMouse(0, 0, mx, my)
+        backend.doMouse(0, 0, mx, my)
 ##        unimacroutils.shortWait()
 ##        unimacroutils.buttonClick()
     else:
@@ -1462,7 +1993,7 @@ def do_TASK(number=None, **kw):
     _progpath, prog, title, _toporchild, _classname, _hndle = kw['progInfo']
     if prog == 'explorer' and not title:
         doKeystroke('{esc}')
-        unimacroutils.shortWait()
+        shortWait()
     if number:
         try:
             count = int(number)
@@ -1485,7 +2016,7 @@ def do_TASK(number=None, **kw):
         my = mouseY1 + (count-1)*mouseYdiff
         # print 'mx, my:', mx, my
         #print 'task to %s, %s'% (mx, my)
-        unimacroutils.doMouse(0, 0, mx, my)
+        backend.doMouse(0, 0, mx, my)
         # unimacroutils.longWait()
 ##        unimacroutils.shortWait()
 ##        unimacroutils.buttonClick()
@@ -1504,20 +2035,20 @@ def do_TOCLOCK(click=None, **kw):
     except ValueError:
         x = y = 0
     if x and y:
-        unimacroutils.doMouse(0,0,x,y,click)
-        unimacroutils.Wait()
+        backend.doMouse(0,0,x,y,click)
+        Wait()
     else:
         print('invalid mouse position for clock, do "task position clock" from grammar _general')
     return 1
  
 def do_CLIPSAVE(**kw):
     """saves and empties the clipboard"""
-    unimacroutils.saveClipboard()
+    backend.saveClipboard()
     return 1
 
 def do_CLIPRESTORE(**kw):
     """saves and empties the clipboard"""
-    unimacroutils.restoreClipboard()
+    backend.restoreClipboard()
     return 1
 
 def do_CLIPISNOTEMPTY(**kw):
@@ -1526,15 +2057,15 @@ def do_CLIPISNOTEMPTY(**kw):
     should be done after a CLIPEMPTY
     restores the clipboard if 0
     """
-    t = unimacroutils.getClipboard()
+    t = backend.getClipboard()
     if t:
         return 1
     D('empty clipboard found, restore and return')
-    unimacroutils.restoreClipboard()
+    backend.restoreClipboard()
     
 def do_GETCLIPBOARD(**kw):
     """returns the contents of the clipboars"""
-    return unimacroutils.getClipboard()
+    return backend.getClipboard()
    
 def do_COPYNAME(**kw):
     """returns the name of a file or folder if windows explorer or #32770
@@ -1579,7 +2110,7 @@ def killWindow(action1='<<windowclose>>', action2='<<killletter>>', modInfo=None
     progNew = prog
     prevHandle = hndle
     doAction(action1, progInfo=progInfo, comingFrom=comingFrom)
-    unimacroutils.shortWait()
+    shortWait()
     count = 0
     while count < 20:
         count += 1
@@ -1604,7 +2135,7 @@ def killWindow(action1='<<windowclose>>', action2='<<killletter>>', modInfo=None
                 doAction(action2)
             break
         
-        unimacroutils.shortWait()
+        shortWait()
     else:
         # no break occurred, false return:
         return 0 
@@ -1687,8 +2218,8 @@ def do_ALERT(alert=1, **kw):
             if not ding_path.is_file():
                 raise OSError('sound file "ding.wav" not present in %s'% dtactionsDir)
             exec_string = f'PlaySound "{ding_path}"'
-            natlink.execScript(exec_string)
-    unimacroutils.Wait(0.1)
+            backend.execScript(exec_string)
+    Wait(0.1)
     if micState != 'off':
         natlink.setMicState(micState)
     return 1
@@ -1852,7 +2383,7 @@ def Message(t, title=None, icon=64, alert=None, switchOnMic=None, progInfo=None,
         natlink.setMicState('on')
 
     try:
-        natlink.execScript('MsgBoxConfirm "%s", %s, "%s"'% (tt, icon, title))
+        backend.execScript('MsgBoxConfirm "%s", %s, "%s"'% (tt, icon, title))
     except SyntaxError:
         print('execScript SyntaxError\n' \
               'tt: %s\n' \
@@ -1904,34 +2435,34 @@ def YesNo(t, title=None, icon=32, alert=None, defaultToSecondButton=0, progInfo=
         do_ALERT(alert)
 
     if micState != 'on':
-        unimacroutils.Wait(0.05)
+        Wait(0.05)
         natlink.setMicState('on')
     newMicState = natlink.getMicState()
-    unimacroutils.Wait(0.1)
+    Wait(0.1)
     ttt = tt
     for _i in range(3):
         try:
             cmd = 'MsgBoxConfirm "%s", %s, "%s"\n\nSetMicrophone 1\nGoToSleep'% (ttt, icon, title)
             #print 'cmd: %s'% cmd
-            natlink.execScript(cmd)
+            backend.execScript(cmd)
         except natlink.SyntaxError:
             print('execScript SyntaxError\n' \
                   'tt: %s\n' \
                   'icon: %s\n' \
                   'title: %s\n'% (tt, icon, title))
-        unimacroutils.Wait(0.1)
+        Wait(0.1)
         newMicState = natlink.getMicState()
         result = newMicState == 'sleeping'
         if newMicState != 'off': break   # ok, either on or sleeping
         # try again (maximum 3 times)
-        unimacroutils.Wait(0.05)
+        Wait(0.05)
         natlink.setMicState('on')
         ttt = checkTextInMessage("Please do not switch off the microphone\nwhile (re)answering the question:\n\n")+tt
     else:
         raise UserWarning("microphone should not be switched off while answering the YesNo question\n(and you got 3 chances to answer correct)")
     if micState != newMicState:
         natlink.setMicState(micState)
-        unimacroutils.Wait(0.05)
+        Wait(0.05)
     return result
 
 
@@ -1952,7 +2483,7 @@ def findCursor():
     if prog == 'emacs':
         doAction("{shift+left %s}"% len(cursorText))
     doAction("CLIPSAVE; <<cut>>")
-    t = unimacroutils.getClipboard()
+    t = backend.getClipboard()
     if t == cursorText:
         doAction("CLIPRESTORE")
         return 1
@@ -2281,10 +2812,10 @@ def getPathOfOpenFile():
     if prog == 'pythonwin':
         doKeystroke("{ctrl+r}")
         doAction("W")
-        unimacroutils.saveClipboard()
+        backend.saveClipboard()
         doKeystroke("{ctrl+c}{esc}")
-        fileName = unimacroutils.getClipboard()
-        unimacroutils.restoreClipboard()
+        fileName = backend.getClipboard()
+        backend.restoreClipboard()
         return fileName
     if prog == 'emacs':
         # get from voicecode window title the filename part:
@@ -2294,12 +2825,12 @@ def getPathOfOpenFile():
             return
         # get from minibuffer the folder name:
         doKeystroke("{ctrl+x}{ctrl+w}")
-        unimacroutils.saveClipboard()
+        backend.saveClipboard()
         doKeystroke("{shift+exthome}{alt+w}")
         doKeystroke("{ctrl+g}")
         # folder = unimacroutils.getClipboard()
-        fileName = os.path.join(unimacroutils.getClipboard(), fileName)
-        unimacroutils.restoreClipboard()
+        fileName = os.path.join(backend.getClipboard(), fileName)
+        backend.restoreClipboard()
         return fileName
     if prog == 'uedit32':
         # get from window title bar:
@@ -0,0 +1,262 @@
+"""
+This module tests the actioncompiler module, the plans of the action strings of unimacroactions
+"""
+#pylint:disable = W0621
+import random
+import pytest
+
+from dtactions import actioncompiler
+from dtactions.actioncompiler import Keystrokes, MetaAction, Command, NatspeakCommand, Sequence
+
+def do_W(t=None, **kw):
+    return 1
+
+def do_SSK(s, **kw):
+    return 1
+
+@pytest.fixture
+def compiler():
+    return actioncompiler.ActionCompiler({'W': do_W, 'SSK': do_SSK}.get,
+                                         natspeakCommands=['HeardWord', 'SendSystemKeys'])
+
+def test_compile_steps(compiler):
+    """the kinds of steps, in the order doAction tries them
+    """
+    plan = compiler.compile('<<copy>>; W 0.5; SSK({enter}); HeardWord hello; {ctrl+a}x; <<realhome>>{enter}<<paste>>')
+    kinds = [type(step) for step in plan.steps]
+    assert kinds == [MetaAction, Command, Command, NatspeakCommand, Keystrokes, Sequence]
+    assert plan.steps[0] == MetaAction('copy')
+    assert plan.steps[1] == Command('W', do_W, (0.5,))
+    assert plan.steps[2] == Command('SSK', do_SSK, ('{enter}',))
+    assert plan.steps[3] == NatspeakCommand('HeardWord hello')
+    assert plan.steps[4].chunks == ('{ctrl+a}', 'x')
+    assert not plan.steps[4].exact and plan.steps[4].braces
+    assert [type(s) for s in plan.steps[5].steps] == [MetaAction, Keystrokes, MetaAction]
+
+    # USC splits, a command without arguments, a meta action with a number:
+    plan = compiler.compile('W USC {ctrl+p} USC <<gotoline 5>>')
+    assert plan.steps == (Command('W', do_W, None), compiler.compileKeystrokes('{ctrl+p}'),
+                          MetaAction('gotoline 5'))
+    assert compiler.compile('') == actioncompiler.Plan('', ())
+
+def test_compile_cache(compiler):
+    """plans, expansions and keystrokes are compiled once, until clear
+    """
+    action = '<<realhome>>{shift+down}; W 0.1'
+    plan = compiler.compile(action)
+    assert compiler.compile(action) is plan
+    assert compiler.getCacheInfo()['hits'] == 1
+    expansion = compiler.compileExpansion('{ExtHome}; <<paste>>')
+    assert expansion == (compiler.compileKeystrokes('{ExtHome}'), MetaAction('paste'))
+    assert compiler.compileExpansion('{ExtHome}; <<paste>>') is expansion
+    exact = compiler.compileKeystrokes('{shift+tab}')
+    assert exact.exact and exact.keyPart == '{tab}'
+    assert compiler.compileKeystrokes('{shift+tab}') is exact
+    compiler.clear()
+    info = compiler.getCacheInfo()
+    assert info['plans'] == info['steps'] == info['expansions'] == info['keystrokes'] == 0
+    assert compiler.compile(action) == plan and compiler.compile(action) is not plan
+
+def test_compile_cache_bounded():
+    """the caches keep the maxSize most recently used entries, eg of dictated text
+    """
+    compiler = actioncompiler.ActionCompiler({'W': do_W}.get, maxSize=10)
+    plan = compiler.compile('{ctrl+c}; W 0.1')
+    for i in range(100):
+        text = 'dictated text %s'% i
+        compiler.compile(text)
+        compiler.settles(compiler.compileKeystrokes(text))
+        compiler.compileExpansion(text)
+        assert compiler.compile('{ctrl+c}; W 0.1') is plan     # used often, so kept
+    info = compiler.getCacheInfo()
+    assert info['plans'] == info['steps'] == info['expansions'] == info['keystrokes'] == 10
+    assert len(compiler._settlingKeys) == 10      # pylint:disable=W0212
+    assert compiler.compile('dictated text 99').steps == (compiler.compileKeystrokes('dictated text 99'),)
+    assert compiler.compile('dictated text 0').steps[0].keys == 'dictated text 0'
+
+def test_meta_action_cache():
+    """the inifile is searched once per (section list, meta action), numbers via the template
+    """
+    values = {('excel', 'gotoline n'): '{ctrl+g}n{enter}', ('default', 'gotoline n'): '{ctrl+home}{extdown n}',
+              ('default', 'copy'): '{ctrl+c}'}
+    lookups = []
+    def lookup(name, sectionList):
+        lookups.append((tuple(sectionList), name))
+        for s in sectionList:
+            if (s, name) in values:
+                return values[(s, name)]
+        return None
+
+    cache = actioncompiler.MetaActionCache(maxSize=3)
+    excel, other = ['excel', 'default'], ['notepad', 'default']
+    assert cache.get('gotoline 5', excel, lookup) == '{ctrl+g}5{enter}'
+    assert cache.get('gotoline 17', excel, lookup) == '{ctrl+g}17{enter}'
+    assert cache.get('gotoline 5', other, lookup) == '{ctrl+home}{extdown 5}'
+    assert cache.get('copy', excel, lookup) == '{ctrl+c}'
+    assert cache.get('nothing', excel, lookup) is None
+    assert len(lookups) == 4 and cache.getCacheInfo()['size'] == 3
+    # the least recently used ('gotoline n' of excel) is gone, the others are still there:
+    assert cache.get('gotoline 5', other, lookup) == '{ctrl+home}{extdown 5}'
+    assert len(lookups) == 4
+    assert cache.get('gotoline 3', excel, lookup) == '{ctrl+g}3{enter}'
+    assert len(lookups) == 5
+
+    values[('excel', 'gotoline n')] = '{ctrl+g}n{tab}'
+    cache.invalidate('excel')
+    assert cache.get('gotoline 3', excel, lookup) == '{ctrl+g}3{tab}'
+    assert cache.get('gotoline 5', other, lookup) == '{ctrl+home}{extdown 5}'
+    assert len(lookups) == 6
+    cache.clear()
+    assert cache.getCacheInfo()['size'] == 0
+    assert actioncompiler.parseMetaName('selectdown 3') == ('selectdown n', '3', 'selectdown')
+
+def test_meta_action_table(compiler):
+    """nested meta actions are expanded when they resolve to the same section in every section list
+    """
+    sections = {
+        'default': {'realhome': '{home}', 'copy': '{ctrl+c}', 'paste': '{ctrl+v}', 'selectline': '{shift+end}',
+                    'lineinsert': '<<realhome>>{enter}{extup}',   # realhome also in emacs: not expanded
+                    'newline': '<<realhome>>; <<enter>>', 'enter': '{enter}',
+                    'savewait': 'W 0.5; {ctrl+s}', 'save': '<<savewait>>; {esc}', 'saveclose': '<<savewait>>{alt+f4}',
+                    'gotoline n': '{ctrl+home}{extdown n}', 'gotofive': '<<gotoline 5>>; <<selectline>>',
+                    'selectdown n': '<<gotoline n>>{shift+down n}', 'newdown n': '<<newfile>>{down n}',
+                    'newfile': '{ctrl+n}'},
+        'emacs': {'realhome': '{exthome}{ctrl+space}', 'selectall': '{ctrl+x}h', 'copyall': '<<selectall>><<copy>>',
+                  'copy': '{alt+w}'},
+        'emacs shell': {'paste': '{ctrl+y}'},
+        'excel': {'deleteline': '<<selectline>>{del}', 'jump n': '{f5}<<jump n>>'}}
+    table = actioncompiler.MetaActionTable(sections, compiler, deferredNames=['selectline'])
+    expanded = dict(table.flattened)
+    assert expanded == {
+        ('default', 'newline'): '<<realhome>>; {enter}',
+        ('default', 'save'): 'W 0.5; {ctrl+s}; {esc}',
+        ('default', 'gotofive'): '{ctrl+home}{extdown 5}; <<selectline>>',
+        ('default', 'selectdown n'): '{ctrl+home}{extdown n}{shift+down n}',
+        ('emacs', 'copyall'): '{ctrl+x}h{alt+w}'}
+    # not expanded: realhome/copy have other values in other sections, savewait is not keystrokes,
+    # selectline is a metaaction_ function, {ctrl+n} would get the number of "newdown n":
+    for key in 'lineinsert', 'saveclose', 'newdown n':
+        assert table.get('default', key) == sections['default'][key]
+    assert table.get('excel', 'deleteline') == '<<selectline>>{del}'
+    assert table.cycles == {('excel', 'jump n'): ('jump n', 'jump n')}
+
+    sections['default']['twice'] = '<<again>>{enter}'
+    sections['default']['again'] = '{tab}; <<twice>>'
+    sections['default']['twiceother'] = '<<twice>>'
+    table = actioncompiler.MetaActionTable(sections, compiler)
+    assert table.cycles[('default', 'twice')] == ('twice', 'again', 'twice')
+    assert table.cycles[('default', 'again')] == ('again', 'twice', 'again')
+    assert ('default', 'twiceother') not in table.cycles
+    assert table.get('default', 'twiceother') == '<<twice>>'
+    assert table.get('default', 'missing', '') == ''
+
+def test_meta_action_table_update(compiler):
+    """after changes, update gives the same table as expanding all again, and expands only the affected keys
+    """
+    rng = random.Random(25)
+    names = ['k%s'% i for i in range(8)] + ['k n']
+    values = ['{a}', '{b}{c}', 'W 0.1', '', '{f5}{down n}'] + \
+             ['<<%s>>{enter}'% n for n in names] + ['<<%s>>; {tab}'% n for n in names] + \
+             ['<<%s>>; <<%s 3>>'% (n, m) for n in names[:3] for m in names[-2:]]
+    sectionNames = ['default', 'emacs', 'emacs shell', 'excel']
+    sections = {s: {k: rng.choice(values) for k in rng.sample(names, 5)} for s in sectionNames}
+    table = actioncompiler.MetaActionTable(sections, compiler)
+    for _i in range(300):
+        section = rng.choice(sectionNames)
+        keys = dict(sections.get(section) or {})
+        changed = rng.sample(names, rng.choice([1, 1, 3]))
+        r = rng.random()
+        if r < 0.1:
+            keys, changed = (None if section in sections else keys), [None]
+        else:
+            for key in changed:
+                if r < 0.3 and key in keys:
+                    del keys[key]
+                else:
+                    keys[key] = rng.choice(values)
+        if keys is None:
+            del sections[section]
+        else:
+            sections[section] = keys
+        # as the changes of a diff, one by one, with the keys after all changes:
+        for key in changed:
+            table.update(section, keys, key)
+        full = actioncompiler.MetaActionTable(sections, compiler)
+        assert table.flattened == full.flattened
+        assert table.cycles == full.cycles
+
+    sections = {'default': {'copy': '{ctrl+c}', 'copyline': '{home}{shift+end}<<copy>>',
+                            'copytwice': '<<copyline>>; <<copyline>>', 'paste': '{ctrl+v}'},
+                'positions': {'x': '10'}}
+    table = actioncompiler.MetaActionTable(sections, compiler)
+    assert table.get('default', 'copytwice') == '{home}{shift+end}{ctrl+c}; {home}{shift+end}{ctrl+c}'
+    copy = table.copy()
+    assert table.update('positions', {'x': '20'}, 'x') == {('positions', 'x')}
+    assert copy.get('positions', 'x') == '10'
+    # copy in another section: copy is not expanded any more
+    assert copy.update('emacs', {'copy': '{alt+w}'}) == {('emacs', 'copy'), ('default', 'copyline'),
+                                                         ('default', 'copytwice')}
+    assert copy.get('default', 'copytwice') == '{home}{shift+end}<<copy>>; {home}{shift+end}<<copy>>'
+    assert table.get('default', 'copytwice') == '{home}{shift+end}{ctrl+c}; {home}{shift+end}{ctrl+c}'
+
+def test_window_settings_cache():
+    """the settings are built once per (prog, title, toporchild), the least recently used window goes first
+    """
+    builds = []
+    def build(progInfo):
+        builds.append(progInfo[1:4])
+        return actioncompiler.WindowSettings((progInfo[1], 'default'), ('default',), 0.0, 0.0, ('none',))
+
+    cache = actioncompiler.WindowSettingsCache(maxSize=2)
+    book1 = ('C:/excel.exe', 'excel', 'book1.xlsx', 'top', 'XLMAIN', 1234)
+    book1child = ('C:/excel.exe', 'excel', 'book1.xlsx', 'child', 'XLMAIN', 1235)
+    notepad = ('C:/notepad.exe', 'notepad', 'a.txt', 'top', 'Notepad', 99)
+    assert cache.get(book1, build).sectionList == ('excel', 'default')
+    assert cache.get(book1[:5] + (4321,), build) is cache.get(book1, build)  # another handle, same window
+    cache.get(book1child, build)
+    cache.get(book1, build)
+    cache.get(notepad, build)       # book1child is dropped
+    cache.get(book1, build)
+    assert builds == [('excel', 'book1.xlsx', 'top'), ('excel', 'book1.xlsx', 'child'),
+                      ('notepad', 'a.txt', 'top')]
+    cache.get(book1child, build)
+    assert len(builds) == 4
+    assert cache.getCacheInfo()['size'] == 2
+    cache.clear()
+    cache.get(book1, build)
+    assert len(builds) == 5
+
+def test_window_settings_cache_invalidate():
+    """a change drops only the windows whose section lists or settings can depend on it
+    """
+    builds = []
+    def build(progInfo):
+        builds.append(progInfo[1])
+        return actioncompiler.WindowSettings((progInfo[1] + ' top', 'default top'), ('default top',),
+                                             0.0, 0.0, ('none',))
+
+    cache = actioncompiler.WindowSettingsCache(settingKeys=['pause between actions', 'keystrokes  with systemkeys'])
+    excel = ('C:/excel.exe', 'excel', 'book1.xlsx', 'top', 'XLMAIN', 1234)
+    notepad = ('C:/notepad.exe', 'notepad', 'a.txt', 'top', 'Notepad', 99)
+    def getAll():
+        cache.get(excel, build)
+        cache.get(notepad, build)
+    getAll()
+    for section, key in [('positions', 'x'), ('positions', None), ('excel top', 'copy'),
+                         ('default top', 'paste'), ('general', 'top behaves like child')]:
+        cache.invalidate(section, key)
+        getAll()
+    assert builds == ['excel', 'notepad']
+    cache.invalidate('excel top', 'pause between actions')
+    getAll()
+    cache.invalidate('excel book1', None)     # a new section of excel, for a title
+    getAll()
+    assert builds == ['excel', 'notepad', 'excel', 'excel']
+    cache.invalidate('default top', 'keystrokes with systemkeys')
+    getAll()
+    cache.invalidate('default child', None)
+    getAll()
+    assert builds[4:] == ['excel', 'notepad', 'excel', 'notepad']
+
+if __name__ == "__main__":
+    pytest.main(['test_actioncompiler.py'])
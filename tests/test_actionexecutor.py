@@ -0,0 +1,133 @@
+"""
+This module tests the actionexecutor module, async actions with a virtual event loop clock
+"""
+#pylint:disable = W0621
+import asyncio
+import time
+import pytest
+
+from dtactions import actioncompiler
+from dtactions.actionexecutor import ActionExecutor, VirtualClockLoop
+from dtactions.outputbackend import RecordingBackend
+
+class ComingFrom:
+    """as the grammars of unimacro, interrupted can be set while an action runs"""
+    interrupted = False
+
+@pytest.fixture
+def loop():
+    loop = VirtualClockLoop()
+    yield loop
+    loop.close()
+
+@pytest.fixture
+def recorder(loop):
+    return RecordingBackend(clock=loop.time)
+
+@pytest.fixture
+def executor(loop, recorder):
+    def do_W(t=None, **kw):
+        executor.scheduler.wait(0.1 if t is None else t)
+        return 1
+
+    async def async_WWT(title, nWait=20, waitingTime=0.05, executor=None, comingFrom=None, **kw):
+        return await executor.poll(lambda: title in windowTitle, nWait*waitingTime, waitingTime, comingFrom)
+
+    async def async_CHECKMOUSESTEADY(executor=None, comingFrom=None, **kw):
+        return await executor.pollStable(lambda: cursorPos, 10, 2.5, 0.05, comingFrom)
+
+    def do_WWT(*args, **kw):
+        raise AssertionError('the blocking version of WWT should not be called')
+    do_CHECKMOUSESTEADY = do_WWT
+
+    metaActions = {'copy': '{ctrl+c}', 'paste': '{ctrl+v}', 'nothing': '', 'switch': '{alt+tab}; W 0.2'}
+    compiler = actioncompiler.ActionCompiler({'W': do_W, 'WWT': do_WWT, 'CHECKMOUSESTEADY': do_CHECKMOUSESTEADY}.get)
+    executor = ActionExecutor(compiler, recorder, loop=loop, waitingCommands=[do_W],
+                              getMetaAction=lambda name, sectionList, progInfo: metaActions.get(name),
+                              asyncCommands={'WWT': async_WWT, 'CHECKMOUSESTEADY': async_CHECKMOUSESTEADY})
+    return executor
+
+windowTitle = 'Untitled - Notepad'
+cursorPos = (0, 0)
+
+def getTrace(recorder):
+    return [(round(e.time, 3), e.args[0]) for e in recorder.events]
+
+def test_waits_virtual_time(executor, recorder):
+    """the waits take virtual time only, pauses are merged, settling steps get the pause between actions
+    """
+    t0 = time.perf_counter()
+    result = executor.run(executor.doAction('<<copy>>; W 5; {home}x; <<switch>>; <<paste>>; <<nothing>>',
+                                            pauseBA=0.5))
+    assert result == 1
+    assert time.perf_counter() - t0 < 1
+    # (the keystrokes without a pause between them go in one call)
+    assert getTrace(recorder) == [(0.0, '{ctrl+c}'), (5.5, '{home}x{alt+tab}'), (6.2, '{ctrl+v}')]
+
+def test_cancel_in_wait(executor, recorder, loop):
+    """a cancelled action stops in the middle of its wait
+    """
+    task = loop.create_task(executor.doAction('{a}; W 10; {b}'))
+    loop.call_later(1.0, task.cancel)
+    with pytest.raises(asyncio.CancelledError):
+        executor.run(task)
+    assert getTrace(recorder) == [(0.0, '{a}')]
+    assert loop.time() == pytest.approx(1.0)
+    assert executor.scheduler.deadline == 0 and executor.scheduler.depth == 0
+    # the executor can go on:
+    assert executor.run(executor.doAction('{c}')) == 1
+
+def test_poll_window_title(executor, recorder, loop):
+    """WWT polls the title: found in time, or timed out, or interrupted
+    """
+    global windowTitle  #pylint:disable=W0603
+    windowTitle = 'Untitled - Notepad'
+    def newTitle():
+        global windowTitle  #pylint:disable=W0603
+        windowTitle = 'Document1 - Word'
+    loop.call_later(0.3, newTitle)
+    assert executor.run(executor.doAction('WWT Word; {ctrl+end}')) == 1
+    assert getTrace(recorder) == [(0.3, '{ctrl+end}')]
+
+    start = loop.time()
+    assert not executor.run(executor.doAction('WWT Excel; {ctrl+home}'))
+    assert loop.time() - start == pytest.approx(1.0)
+    assert len(recorder.events) == 1
+
+    comingFrom = ComingFrom()
+    loop.call_later(0.2, setattr, comingFrom, 'interrupted', True)
+    start = loop.time()
+    assert not executor.run(executor.doAction('WWT(Excel, 100); {ctrl+home}', comingFrom=comingFrom))
+    assert loop.time() - start == pytest.approx(0.2, abs=0.06)
+    assert len(recorder.events) == 1
+
+def test_poll_stable(executor, loop):
+    """CHECKMOUSESTEADY: the cursor must keep its position for 10 polls
+    """
+    global cursorPos  #pylint:disable=W0603
+    cursorPos = (0, 0)
+    def move(x):
+        global cursorPos  #pylint:disable=W0603
+        cursorPos = (x, x)
+    for i in range(1, 6):
+        loop.call_later(0.1*i, move, i)
+    start = loop.time()
+    assert executor.run(executor.doAction('CHECKMOUSESTEADY')) == (5, 5)
+    assert loop.time() - start == pytest.approx(0.5 + 0.45, abs=0.06)
+
+def test_invalid_meta_action(executor):
+    with pytest.raises(ValueError, match='missing'):
+        executor.run(executor.doAction('<<missing>>'))
+    assert executor.scheduler.depth == 0 and executor.backend.depth == 0
+
+def test_sleep_interrupted(executor, loop):
+    """executor.sleep (for async commands) stops at the next interval after interrupted is set
+    """
+    comingFrom = ComingFrom()
+    loop.call_later(0.32, setattr, comingFrom, 'interrupted', True)
+    start = loop.time()
+    assert executor.run(executor.sleep(3, comingFrom)) is False
+    assert loop.time() - start == pytest.approx(0.35)
+    start = loop.time()
+    assert executor.run(executor.sleep(0.25)) is True
+    assert loop.time() - start == pytest.approx(0.25)
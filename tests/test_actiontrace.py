@@ -0,0 +1,75 @@
+"""
+This module tests the actiontrace module, the spans of the actions, the profile and the Chrome trace
+"""
+import json
+from dtactions.actiontrace import Tracer
+from dtactions.pausescheduler import FakeClock
+
+def doAction(tracer, clock, action, parts):
+    """as unimacroactions.doAction, parts: list of (name, duration)"""
+    tAction = tracer.beginAction(action)
+    for name, duration in parts:
+        t0 = tracer.enabled and tracer.clock()
+        clock.advance(duration)
+        if t0: tracer.add(name, t0, name.upper())
+    tracer.endAction(tAction)
+
+def test_disabled():
+    """nothing is recorded when tracing is off
+    """
+    clock = FakeClock()
+    clock.advance(1)
+    tracer = Tracer(clock=clock)
+    doAction(tracer, clock, '<<copy>>', [('meta', 0.001), ('keystrokes', 0.002)])
+    assert not tracer.spans
+    assert tracer.action is None
+
+def test_ring_buffer_and_nesting():
+    """only the last spans are kept, nested actions belong to the outer one
+    """
+    clock = FakeClock()
+    clock.advance(1)
+    tracer = Tracer(size=5, clock=clock)
+    tracer.enable()
+    outer = tracer.beginAction('<<select all>>; <<copy>>')
+    doAction(tracer, clock, '<<copy>>', [('keystrokes', 0.002)])
+    tracer.endAction(outer)
+    assert [(s.name, s.action, s.detail) for s in tracer.getSpans()] == [
+        ('keystrokes', '<<select all>>; <<copy>>', 'KEYSTROKES'),
+        ('action', '<<select all>>; <<copy>>', None),
+        ('action', '<<select all>>; <<copy>>', '<<select all>>; <<copy>>')]
+    for i in range(10):
+        doAction(tracer, clock, 'action %s'% i, [('command', 0.001)])
+    assert len(tracer.spans) == 5
+    assert tracer.getSpans()[-1].detail == 'action 9'
+    tracer.enable(size=100)
+    assert len(tracer.spans) == 5 and tracer.spans.maxlen == 100
+
+def test_profile_and_chrome_trace(tmp_path):
+    """per action p50/p95, and the trace-event JSON
+    """
+    clock = FakeClock()
+    clock.advance(1)
+    tracer = Tracer(clock=clock)
+    tracer.enable()
+    for i in range(20):
+        slow = 0.1 if i == 19 else 0.0
+        doAction(tracer, clock, '<<copy>>', [('meta', 0.001), ('keystrokes', 0.002 + slow)])
+    doAction(tracer, clock, 'W 1', [('wait', 1.0)])
+    actions, names = tracer.getProfile()
+    assert [a[0] for a in actions] == ['W 1', '<<copy>>']
+    copy = actions[1]
+    assert copy[1] == 20
+    assert round(copy[2], 6) == 0.003 and round(copy[3], 6) == 0.003 and round(copy[4], 6) == 0.103
+    assert dict((n[0], n[1]) for n in names) == {'action': 21, 'meta': 20, 'keystrokes': 20, 'wait': 1}
+    assert 'p95' in tracer.formatProfile()
+
+    path = tracer.writeChromeTrace(tmp_path/'trace.json')
+    with open(path, encoding='utf-8') as f:
+        trace = json.load(f)
+    events = trace['traceEvents']
+    assert len(events) == 62
+    assert events[0] == {'name': 'meta', 'cat': 'actions', 'ph': 'X', 'ts': 0.0, 'dur': 1000.0,
+                         'pid': events[0]['pid'], 'tid': events[0]['tid'],
+                         'args': {'action': '<<copy>>', 'detail': 'META'}}
+    assert events[-1]['name'] == 'action' and events[-1]['dur'] == 1000000.0
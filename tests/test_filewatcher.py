@@ -0,0 +1,205 @@
+"""
+This module tests the filewatcher module, and the background reload of an inifile
+as done in unimacroactions (reloadIni and swapPendingIni)
+"""
+#pylint:disable = W0621, C0415
+import os
+import sys
+import time
+import ctypes
+import threading
+import statistics
+from unittest import mock
+import pytest
+
+import dtactions
+from dtactions import filewatcher
+from dtactions.outputbackend import RecordingBackend
+
+methods = ['stat'] + (['inotify'] if filewatcher.hasInotify() else [])
+
+def waitFor(condition, timeout=3.0):
+    """wait until condition() is true, return the time it took (None if timed out)"""
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < timeout:
+        if condition():
+            return time.perf_counter() - t0
+        time.sleep(0.005)
+    return None
+
+@pytest.mark.parametrize("method", methods)
+def test_filewatcher_changes(tmp_path, method):
+    """a write, an atomic replace and a delete are noticed, other files are ignored
+    """
+    watched = tmp_path/'watched.ini'
+    watched.write_text('[s]\nk = 1\n')
+    calls = []
+    watcher = filewatcher.FileWatcher([watched], calls.append, interval=0.02,
+                                      usePolling=(method == 'stat'))
+    watcher.start()
+    try:
+        assert watcher.getMethod() == method
+        (tmp_path/'other.ini').write_text('[s]\n')
+        time.sleep(0.2)
+        assert not calls
+        watched.write_text('[s]\nk = 22\n')
+        assert waitFor(lambda: len(calls) == 1) is not None
+        tmp = tmp_path/'watched.tmp'
+        tmp.write_text('[s]\nk = 333\n')
+        os.replace(tmp, watched)
+        assert waitFor(lambda: len(calls) == 2) is not None
+        assert watcher.getFileDate(watched) == pytest.approx(os.path.getmtime(watched))
+        watched.unlink()
+        assert waitFor(lambda: len(calls) == 3) is not None
+        assert watcher.getFileDate(watched) == 0
+        assert all(c == {watched} for c in calls)
+    finally:
+        watcher.stop()
+    assert not watcher.isRunning()
+
+# the Windows modules of unimacroactions (also via natlinkcore and the other dtactions modules),
+# stubbed when natlink is not available (see unimacroactions_without_natlink):
+windowsModules = ['natlink', 'natlinkcore.natlinkstatus', 'natlinkcore.config', 'win32api', 'win32gui',
+                  'win32con', 'win32clipboard', 'win32com', 'win32com.client', 'win32process', 'win32ui',
+                  'winxpgui', 'pywintypes', 'winreg', 'debugpy', 'pydebugstring',
+                  'dtactions.autohotkeyactions']
+
+@pytest.fixture()
+def unimacroactions_without_natlink(tmp_path, monkeypatch):
+    """the unimacroactions module, with the natlink and win32 modules stubbed if natlink is not available
+
+    the modules imported here are removed again afterwards, so the stubs do not leak into other tests
+    """
+    monkeypatch.setenv('DTACTIONS_USERDIR', str(tmp_path))
+    monkeypatch.setenv('TEMP', os.environ.get('TEMP', str(tmp_path)))
+    previousModules = set(sys.modules)
+    stubbed = []
+    try:
+        import natlink  # pylint:disable=W0611, E0401
+    except ImportError:
+        stubbed = [name for name in windowsModules if name not in sys.modules]
+        for name in stubbed:
+            monkeypatch.setitem(sys.modules, name, mock.MagicMock())
+        monkeypatch.setattr(ctypes, 'windll', mock.MagicMock(), raising=False)
+    from dtactions import unimacroactions as ua
+    try:
+        yield ua
+    finally:
+        ua.stopWatching()
+        for name in set(sys.modules) - previousModules - set(stubbed):
+            del sys.modules[name]
+            subName = name.split('.')[-1]
+            if name == 'dtactions.' + subName and hasattr(dtactions, subName):
+                delattr(dtactions, subName)
+
+def test_reload_latency(unimacroactions_without_natlink, tmp_path, monkeypatch):
+    """the main thread only swaps in the inifile prepared by the watcher thread, without a stat
+
+    checkIniWatcher (at the start of each action) on an inifile with 2000 nested meta actions:
+    swapping in (swapPendingIni) takes less time than preparing it (diff and meta action
+    table, done by reloadIni in the watcher thread), and the changed meta action is used.
+    """
+    ua = unimacroactions_without_natlink
+    samplePath = tmp_path/'sample.ini'
+    samplePath.write_text('[default]\nmy paste = {ctrl+v}\n')
+    # m<n> uses m<n//2> (no cycles), and likewise in 50 programs with 20 meta actions each:
+    lines = ['[default]', 'm0 = {ctrl+c}'] + ['m%s = <<m%s>>{tab}'% (n, n//2) for n in range(1, 1000)]
+    for p in range(50):
+        lines += ['[prog%s]'% p, 'p%s_0 = {alt+%s}'% (p, p)] + \
+                 ['p%s_%s = <<p%s_%s>>{enter}'% (p, n, p, n//2) for n in range(1, 20)]
+    text = '\n'.join(lines) + '\n'
+    iniPath = tmp_path/'actions.ini'
+    iniPath.write_text(text)
+    monkeypatch.setattr(ua, 'sampleInifile', samplePath)
+    monkeypatch.setattr(ua, 'inifile', iniPath)
+    monkeypatch.setattr(ua, 'checkForChanges', 1)
+    previousIni = ua.ini
+    ua.stopWatching()
+    ua.swapIni(ua.loadIni())
+    assert len(ua.getMetaActionTable().flattened) > 1900
+    recorder = RecordingBackend()
+    previousBackend = ua.setOutputBackend(recorder)
+    desktop = ('', '', 0)     # modInfo, no foreground window
+
+    mainThread = threading.get_ident()
+    mainStats = []
+    osStat = os.stat
+    def countingStat(*args, **kw):
+        if threading.get_ident() == mainThread:
+            mainStats.append(args[0])
+        return osStat(*args, **kw)
+
+    prepareTimes, swapTimes = [], []
+    try:
+        ua.checkIniWatcher()
+        assert ua.watcher.isRunning()
+        for value in range(1, 4):
+            newText = text.replace('m999 = <<m499>>{tab}', 'm999 = <<m499>>{f%s}'% value)
+            # as the watcher thread does it, but timed here (not swapped in):
+            iniPath.write_text(newText)
+            t0 = time.perf_counter()
+            ua.prepareIni(ua.loadIni(), ua.ini, ua.metaActionTable)
+            prepareTimes.append(time.perf_counter() - t0)
+
+            assert waitFor(lambda: ua.pendingIni is not None) is not None
+            monkeypatch.setattr(os, 'stat', countingStat)
+            t0 = time.perf_counter()
+            ua.checkIniWatcher()
+            swapTimes.append(time.perf_counter() - t0)
+            monkeypatch.setattr(os, 'stat', osStat)
+            assert ua.pendingIni is None
+            assert ua.iniFileDate == ua.watcher.getFileDate(iniPath)
+
+            recorder.clear()
+            ua.doAction('<<m999>>; <<p7_3>>', modInfo=desktop, sectionList=['prog7', 'default'])
+            assert recorder.getKeys().endswith('{tab}{f%s}{alt+7}{enter}{enter}'% value)
+        assert not ua.watcher.errors
+    finally:
+        ua.stopWatching()
+        ua.setOutputBackend(previousBackend)
+        ua.swapIni(previousIni)
+    assert not mainStats
+    # the swap only assigns and drops the cached values of m999 (no diff or expansion):
+    assert min(swapTimes) < statistics.median(prepareTimes)
+
+def test_reload_unimacroactions(unimacroactions_without_natlink, tmp_path, monkeypatch):
+    """a changed meta action is used by the first action after the reload of unimacroactions
+
+    the inifile is parsed in the watcher thread (reloadIni), and swapped in by the main
+    thread at the start of the action (swapPendingIni), the output goes to a RecordingBackend
+    """
+    ua = unimacroactions_without_natlink
+    samplePath = tmp_path/'sample.ini'
+    samplePath.write_text('[default]\nmy paste = {ctrl+v}\n')
+    iniPath = tmp_path/'actions.ini'
+    iniPath.write_text('[default]\nmy copy = {ctrl+c}\n')
+    monkeypatch.setattr(ua, 'sampleInifile', samplePath)
+    monkeypatch.setattr(ua, 'inifile', iniPath)
+    monkeypatch.setattr(ua, 'checkForChanges', 1)
+    previousIni = ua.ini
+    ua.stopWatching()
+    ua.swapIni(ua.loadIni())
+    recorder = RecordingBackend()
+    previousBackend = ua.setOutputBackend(recorder)
+    desktop = ('', '', 0)     # modInfo, no foreground window
+    try:
+        ua.doAction('<<my copy>>; <<my paste>>', modInfo=desktop, sectionList=['default'])
+        assert recorder.getKeys() == '{ctrl+c}{ctrl+v}'
+        assert ua.watcher.isRunning()
+        recorder.clear()
+
+        t0 = time.perf_counter()
+        iniPath.write_text('[default]\nmy copy = {ctrl+insert}\n')
+        assert waitFor(lambda: ua.pendingIni is not None) is not None
+        # the watcher thread does not change the ini or the caches:
+        assert ua.ini.get('default', 'my copy') == '{ctrl+c}'
+        assert ua.metaActionTable is not None
+        ua.doAction('<<my copy>>; <<my paste>>', modInfo=desktop, sectionList=['default'])
+        assert time.perf_counter() - t0 < 3
+        assert recorder.getKeys() == '{ctrl+insert}{ctrl+v}'
+        assert ua.pendingIni is None
+        assert not ua.watcher.errors
+    finally:
+        ua.stopWatching()
+        ua.setOutputBackend(previousBackend)
+        ua.swapIni(previousIni)
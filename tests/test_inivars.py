@@ -3,7 +3,11 @@ This module tests the inivars module (the "unimacro inivars") with pytest
 
 Quintijn Hoogenboom, 2021/2022 
 """
-import time
+import io
+import sys
+import json
+import contextlib
+import threading
 from pathlib import Path
 import pytest
 
@@ -15,6 +19,7 @@ thisDir = Path(__file__).parent
 dtactionsDir = thisDir.parent
 
 testDir = Path(thisDir)/'test_inivarsfiles'
+expectedResults = json.loads((testDir/'expected.json').read_text(encoding='utf-8'))
 
 def test_inifile():
     """testing a breaking inifile
@@ -23,8 +28,641 @@ def test_inifile():
     testPath = testDir/testFile
     ini = inivars.IniVars(testPath)
     assert isinstance(ini, inivars.IniVars)
-    
-    
+
+@pytest.mark.parametrize("testFile", sorted(expectedResults))
+@pytest.mark.parametrize("mode", ["strict", "repair"])
+def test_readini_corpus(testFile, mode):
+    """the parser gives the sections and keys (in order) or the IniError (with line number)
+    as recorded in test_inivarsfiles/expected.json
+    """
+    testPath = testDir/testFile
+    expected = expectedResults[testFile][mode]
+    kw = {'repairErrors': True} if mode == 'repair' else {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ini = inivars.IniVars(testPath, **kw)
+    except inivars.IniError as exc:
+        assert 'error' in expected, f'unexpected IniError: {exc}'
+        assert str(exc).replace(str(testPath), '{file}') == expected['error']
+        assert exc.lineNum == expected['lineNum']
+        return
+    assert 'sections' in expected, f'expected IniError: {expected.get("error")}'
+    result = [(s, list(ini.toDict(s).items())) for s in ini.get()]
+    assert result == [(s, list(keys.items())) for s, keys in expected['sections'].items()]
+
+def test_snapshot_cache(tmp_path):
+    """a second load of an unchanged inifile comes from the snapshot, with the same contents
+    """
+    testPath = tmp_path/'snapshot.ini'
+    testPath.write_text('[s]\nk = v\nmulti =\n    line 1\n    line 2\n\n[t u]\nk2 = v2\n')
+    cacheDir = tmp_path/'cache'
+    ini = inivars.IniVars(testPath, snapshotCache=cacheDir)
+    assert not ini._fromSnapshot
+    assert len(list(cacheDir.glob('*.pickle'))) == 1
+
+    ini2 = inivars.IniVars(testPath, snapshotCache=cacheDir)
+    assert ini2._fromSnapshot
+    assert ini2.toDict() == ini.toDict()
+    assert ini2.get('s', 'multi') == 'line 1\nline 2'
+
+    # changed contents (same size) invalidate the snapshot:
+    testPath.write_text(testPath.read_text().replace('v2', 'w2'))
+    ini3 = inivars.IniVars(testPath, snapshotCache=cacheDir)
+    assert not ini3._fromSnapshot
+    assert ini3.get('t u', 'k2') == 'w2'
+
+    # without the option no snapshot is taken:
+    ini4 = inivars.IniVars(testPath)
+    assert not ini4._fromSnapshot
+
+def test_decoded_cache(tmp_path):
+    """typed get functions are cached, return copies, and are invalidated by set, delete and direct assignment
+    """
+    ini = inivars.IniVars(tmp_path/'decoded.ini')
+    ini.set('s', 'd', 'a, b: x, y\nc: z')
+    ini.set('s', 'n', '3')
+    D = ini.getDict('s', 'd')
+    assert D == {'a': ['x', 'y'], 'b': ['x', 'y'], 'c': 'z'}
+    D['a'].append('corrupt')
+    D['new'] = None
+    assert ini.getDict('s', 'd') == {'a': ['x', 'y'], 'b': ['x', 'y'], 'c': 'z'}
+    assert ini.getInt('s', 'n') == 3
+    assert ini.getInt('s', 'n') == 3
+    info = ini.getDecodedCacheInfo()
+    assert (info['hits'], info['misses'], info['size']) == (2, 2, 2)
+
+    # direct assignment in the section, and with a not normalized key:
+    ini['s'][' n '] = '4'
+    assert ini.getInt('s', 'n') == 4
+    # deleting the section drops all its decoded values:
+    ini.delete('s')
+    assert ini.getDecodedCacheInfo()['size'] == 0
+    assert ini.getDict('s', 'd') == {}
+    assert ini.getInt('s', 'n') == 0
+
+@pytest.mark.parametrize("threshold", [0, 1000])
+def test_prefix_index(tmp_path, monkeypatch, threshold):
+    """sections with prefix follow set and delete, with and without the PostfixMatcher
+    """
+    monkeypatch.setattr(inivars, 'postfixMatcherThreshold', threshold)
+    ini = inivars.IniVars(tmp_path/'prefix.ini')
+    for section in ['code', 'code readme', 'code settings', 'default top']:
+        ini.set(section, 'key', section)
+    title = 'readme.txt - project - Visual Studio Code'
+    assert ini.getSectionsWithPrefix('code', title) == ['code readme', 'code']
+    ini.set('code project', 'key', 'project')
+    assert ini.getSectionsWithPrefix('code', title) == ['code project', 'code readme', 'code']
+    assert ini.getFromSectionsWithPrefix('code', title, 'key') == 'project'
+    ini.delete('code project')
+    ini.delete('code readme', 'key')   # deletes the (now empty) section
+    assert ini.getSectionsWithPrefix('code', title) == ['code']
+    assert ini.getSectionPostfixesWithPrefix('code') == ['settings', '']
+
+def test_roundtrip_writer(tmp_path):
+    """only changed sections are rendered again, the layout of other sections is kept
+    """
+    text = ('\n'
+            '[zeta]\n'
+            'b   =   second\n'
+            'a = first\n\n\n'
+            '[alpha]\n'
+            'multi =\n'
+            '    line 1\n\n'
+            '    line 2\n'
+            'z = last\n\n'
+            '[middle]\n'
+            'k = v\n')
+    testPath = tmp_path/'roundtrip.ini'
+    testPath.write_text(text)
+    ini = inivars.IniVars(testPath)
+    ini.write()
+    assert testPath.read_text() == text
+
+    ini.set('alpha', 'z', 'changed')
+    ini.set('new', 'k', 'v')
+    ini.delete('middle')
+    ini.write()
+    # the changed section [alpha] is rendered (a multiline value gets an empty line after it),
+    # [zeta] is kept as it was, [middle] is gone, [new] is appended:
+    expected = ('\n'
+                '[zeta]\n'
+                'b   =   second\n'
+                'a = first\n\n\n'
+                '[alpha]\n'
+                'multi =\n'
+                '    line 1\n\n'
+                '    line 2\n\n'
+                'z = changed\n\n'
+                '[new]\n'
+                'k = v\n')
+    assert testPath.read_text() == expected
+    assert inivars.IniVars(testPath).toDict() == ini.toDict()
+
+def test_write_if_changed_skips_equal_text(tmp_path):
+    """writeIfChanged does not write when the rendered text equals the file
+    """
+    testPath = tmp_path/'skip.ini'
+    testPath.write_text('[s]\nk = v\n')
+    ini = inivars.IniVars(testPath)
+    written = []
+    ini._writeFile = lambda File, text: written.append(text)
+    ini.set('s', 'k', 'other')
+    ini.set('s', 'k', 'v')
+    ini.writeIfChanged()
+    assert not written
+    ini.set('s', 'k', 'other')
+    ini.writeIfChanged()
+    assert written == ['[s]\nk = other\n']
+
+def test_batch_writes_once(tmp_path, monkeypatch):
+    """a batch writes once at the end, via a temporary file and os.replace
+    """
+    testPath = tmp_path/'batch.ini'
+    testPath.write_text('[s]\nk = v\n')
+    replaced = []
+    osReplace = inivars.os.replace
+    def countingReplace(src, dst):
+        replaced.append(dst)
+        osReplace(src, dst)
+    monkeypatch.setattr(inivars.os, 'replace', countingReplace)
+    ini = inivars.IniVars(testPath)
+    with ini.batch():
+        for i in range(100):
+            ini.set('s', 'k%s'% i, str(i))
+            ini.write()
+        with ini.transaction():
+            ini.delete('s', 'k')
+    assert len(replaced) == 1
+    assert sorted(tmp_path.iterdir()) == [testPath]
+    ini2 = inivars.IniVars(testPath)
+    assert ini2.get('s', 'k') == ''
+    assert ini2.get('s', 'k99') == '99'
+
+def test_batch_rollback(tmp_path):
+    """on an exception or an invalid change, nothing is written and the old values come back
+    """
+    testPath = tmp_path/'rollback.ini'
+    testPath.write_text('[s]\nk = v\n\n[other]\nk = w\n')
+    ini = inivars.IniVars(testPath)
+    assert ini.getList('s', 'k') == ['v']
+    before = testPath.read_text()
+    with pytest.raises(KeyError):
+        with ini.batch():
+            ini.set('s', 'k', 'changed')
+            ini.delete('other')
+            ini.set('new', 'k', 'v')
+            raise KeyError('abort')
+    assert ini.get() == ['s', 'other']
+    assert ini.get('s', 'k') == 'v'
+    assert ini.getList('s', 'k') == ['v']
+    assert ini.get('other', 'k') == 'w'
+    assert ini.getSectionsWithPrefix('new') == []
+    assert testPath.read_text() == before
+    # a key that cannot be written back is refused by the validation:
+    with pytest.raises(inivars.IniError):
+        with ini.batch():
+            ini.set('s', 'k', 'changed')
+            ini['s']['[bad]'] = 'x'
+    assert ini.get('s') == ['k']
+    assert ini.get('s', 'k') == 'v'
+    assert testPath.read_text() == before
+
+def test_batch_rollback_order(tmp_path):
+    """a rolled back batch keeps the order of the sections, also for the prefixes and the file
+    """
+    testPath = tmp_path/'order.ini'
+    testPath.write_text('[p a]\nk = 1\n\n[p b]\nk = 2\n\n[p c]\nk = 3\n')
+    ini = inivars.IniVars(testPath)
+    assert ini.getSectionPostfixesWithPrefix('p') == ['c', 'b', 'a']
+    with pytest.raises(ValueError):
+        with ini.batch():
+            ini.delete('p a')
+            ini.set('p b', 'k', 'changed')
+            ini.set('p d', 'k', '4')
+            raise ValueError('abort')
+    assert ini.get() == ['p a', 'p b', 'p c']
+    assert ini.getSectionPostfixesWithPrefix('p') == ['c', 'b', 'a']
+    assert ini.getSectionsWithPrefix('p', 'a b c') == ['p c', 'p b', 'p a']
+    ini.set('p c', 'k2', 'x')
+    ini.write()
+    assert inivars.IniVars(testPath).get() == ['p a', 'p b', 'p c']
+
+def test_batch_concurrent_writers(tmp_path, monkeypatch):
+    """many writers on the same file, each batch is written once, the file is never corrupt,
+    and (with the file lock around read-modify-write) no update is lost
+    """
+    testPath = tmp_path/'concurrent.ini'
+    testPath.write_text('[start]\nk = v\n')
+    nWriters, nBatches, nKeys = 8, 20, 25
+    replaced = []
+    osReplace = inivars.os.replace
+    def countingReplace(src, dst):
+        replaced.append(dst)
+        osReplace(src, dst)
+    monkeypatch.setattr(inivars.os, 'replace', countingReplace)
+    errors = []
+    done = threading.Event()
+
+    def writer(w):
+        try:
+            for b in range(nBatches):
+                # read-modify-write: the file lock is held from reading the file until the write,
+                # so no update of another writer is lost:
+                with inivars.getFileLock(testPath):
+                    ini = inivars.IniVars(testPath)
+                    with ini.batch():
+                        for k in range(nKeys):
+                            ini.set('writer%s'% w, 'key%s'% k, str(b))
+                        ini.set('done', 'writer%s batch%s'% (w, b), 'yes')
+        except Exception as exc:   # pylint:disable=W0703
+            errors.append(exc)
+
+    def reader():
+        while not done.is_set():
+            try:
+                ini = inivars.IniVars(testPath)
+                for s in ini.get():
+                    if s.startswith('writer'):
+                        values = {ini.get(s, k) for k in ini.get(s)}
+                        assert len(ini.get(s)) == nKeys, 'section %s incomplete'% s
+                        assert len(values) == 1, 'section %s torn: %s'% (s, values)
+            except Exception as exc:   # pylint:disable=W0703
+                errors.append(exc)
+                return
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(nWriters)]
+    readerThread = threading.Thread(target=reader)
+    readerThread.start()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    done.set()
+    readerThread.join()
+    assert not errors
+    assert len(replaced) == nWriters*nBatches
+    assert [p.name for p in tmp_path.iterdir()] == ['concurrent.ini']
+    ini = inivars.IniVars(testPath)
+    assert ini.get('start', 'k') == 'v'
+    assert sorted(ini.get('done')) == sorted('writer%s batch%s'% (w, b)
+                                             for w in range(nWriters) for b in range(nBatches))
+    assert all(ini.get('writer%s'% w, 'key0') == str(nBatches - 1) for w in range(nWriters))
+
+def test_compact_sections(tmp_path):
+    """sections are compact dicts, equal key names are shared, the mapping API is unchanged
+    """
+    testPath = tmp_path/'compact.ini'
+    testPath.write_text('[a]\nword = x\n\n[b]\nword = y\n')
+    ini = inivars.IniVars(testPath)
+    a, b = ini['a'], ini['b']
+    assert not hasattr(a, '__dict__')
+    assert a.data is a
+    assert next(iter(a)) is next(iter(b))
+    assert a[' word '] == 'x'
+    assert a['other'] == ''
+    assert dict(a.items()) == {'word': 'x'}
+    # changing methods of the mapping API are written back:
+    a.update({'new key': 'z'})
+    b.pop('word')
+    ini.write()
+    ini2 = inivars.IniVars(testPath)
+    assert ini2.get('a') == ['word', 'new key']
+    assert ini2.get('b') == []
+
+
+@pytest.mark.parametrize("testFile", ['_brackets.ini', 'basic.ini', 'multiline.ini'])
+def test_open_lazy(testFile):
+    """a lazily opened inifile gives the same sections, keys and values, parsed at first access
+    """
+    testPath = testDir/testFile
+    ini = inivars.IniVars(testPath)
+    lazy = inivars.IniVars.openLazy(testPath)
+    assert lazy.get() == ini.get()
+    assert not any(lazy.data.isLoaded(s) for s in lazy.get())
+    for s in ini.get():
+        assert lazy.get(s) == ini.get(s)
+        assert lazy.data.isLoaded(s)
+        for k in ini.get(s):
+            assert lazy.get(s, k) == ini.get(s, k)
+    assert [(name, dict(section)) for name, section in inivars.iterSections(testPath)] == \
+           [(s, ini.toDict(s)) for s in ini.get()]
+
+def test_open_lazy_read_only(tmp_path):
+    """a lazy instance cannot be written, and notices a changed file
+    """
+    testPath = tmp_path/'lazy.ini'
+    testPath.write_bytes('\ufeff[s\xe9]\r\nk = caf\xe9\r\n\r\n[t]\r\nk = v\r\n'.encode('utf-8'))
+    lazy = inivars.IniVars.openLazy(testPath)
+    assert lazy.get('s\xe9', 'k') == 'caf\xe9'
+    with pytest.raises(inivars.IniError):
+        lazy.set('t', 'k', 'other')
+    with pytest.raises(inivars.IniError):
+        lazy['t']['k'] = 'other'
+    with pytest.raises(inivars.IniError):
+        lazy.delete('t')
+    assert lazy.get('t', 'k') == 'v'
+    with pytest.raises(inivars.IniError):
+        lazy.write()
+    lazy = inivars.IniVars.openLazy(testPath)
+    testPath.write_text('[t]\nk = changed and longer\n')
+    with pytest.raises(inivars.IniError):
+        lazy.get('t', 'k')
+
+
+def test_open_lazy_encoding(tmp_path):
+    """the encoding of the whole file is used for each section, as with IniVars
+    """
+    testPath = tmp_path/'mixed.ini'
+    # section s alone would be valid utf-8, the file as a whole is cp1252:
+    testPath.write_bytes('[s]\nk = caf\xe9\n'.encode('utf-8') + '[t]\nk = caf\xe9\n'.encode('cp1252'))
+    ini = inivars.IniVars(testPath)
+    lazy = inivars.IniVars.openLazy(testPath)
+    assert inivars.detectEncoding(testPath) == 'cp1252'
+    for s in 's', 't':
+        assert lazy.get(s, 'k') == ini.get(s, 'k')
+    assert lazy.get('t', 'k') == 'caf\xe9'
+
+def test_layered_inivars(tmp_path):
+    """keys of higher layers override, sections are merged, changes go to the top layer
+    """
+    defaults = tmp_path/'defaults.ini'
+    defaults.write_text('[default]\nk = 1\nk2 = 2\n\n[prog title]\nx = default\n')
+    site = tmp_path/'site.ini'
+    site.write_text('[default]\nk2 = 20\n\n[prog other]\ny = site\n')
+    user = tmp_path/'user.ini'
+    user.write_text('[default]\nk = user\n')
+    ini = inivars.LayeredIniVars([defaults, site, user])
+    assert ini.getFilename() == user
+    assert ini.get() == ['default', 'prog title', 'prog other']
+    assert ini.get('default') == ['k', 'k2']
+    assert ini.get('default', 'k') == 'user'
+    assert ini.getInt('default', 'k2') == 20
+    assert ini.get(['prog title', 'default'], 'x') == 'default'
+    assert ini.get(['prog title', 'default'], 'k') == 'user'
+    assert ini.getSectionsWithPrefix('prog', 'other window') == ['prog other']
+
+    ini.set('prog new', 'z', '3')
+    ini.set('default', 'k2', '30')
+    assert ini.getSectionsWithPrefix('prog', 'new window') == ['prog new']
+    assert ini.getInt('default', 'k2') == 30
+    ini.delete('default', 'k')
+    assert ini.get('default', 'k') == '1'
+    ini.writeIfChanged()
+    assert inivars.IniVars(user).toDict() == {'default': {'k2': '30'}, 'prog new': {'z': '3'}}
+    assert inivars.IniVars(defaults).get('default', 'k2') == '2'
+
+    with pytest.raises(ValueError):
+        with ini.batch():
+            ini.set('default', 'k', 'batch')
+            raise ValueError('abort')
+    assert ini.get('default', 'k') == '1'
+    ini.delete('prog new')
+    assert ini.get() == ['default', 'prog title', 'prog other']
+
+def test_layered_mapping_writes(tmp_path):
+    """changes of the sections as mappings go to the top layer, and are kept after a merge and write
+    """
+    defaults = tmp_path/'defaults.ini'
+    defaults.write_text('[default]\nk = 1\nk2 = 2\n')
+    user = tmp_path/'user.ini'
+    ini = inivars.LayeredIniVars([defaults, user])
+    ini['default']['k'] = 'user'
+    ini['default'].update({'k3': '3'})
+    ini['prog new'] = {'z': '26'}
+    assert ini.get('default', 'k') == 'user' and ini.get('default', 'k3') == '3'
+    assert ini.getInt('prog new', 'z') == 26
+    assert ini.getLayers()[0].get('default', 'k') == '1'
+    ini._mergeLayers()                  # pylint:disable=W0212
+    ini.write()
+    assert inivars.IniVars(user).toDict() == {'default': {'k': 'user', 'k3': '3'}, 'prog new': {'z': '26'}}
+    del ini['default']['k']             # the default comes back
+    assert ini.get('default', 'k') == '1'
+    del ini['prog new']
+    assert ini.get() == ['default']
+    ini.write()
+    assert inivars.IniVars(user).toDict() == {'default': {'k3': '3'}}
+
+def test_layered_batch_rollback(tmp_path):
+    """after a batch that is rolled back, a section added in the batch is not found by prefix
+    """
+    defaults = tmp_path/'defaults.ini'
+    defaults.write_text('[prog title]\nx = default\n')
+    user = tmp_path/'user.ini'
+    user.write_text('[default]\nk = user\n')
+    ini = inivars.LayeredIniVars([defaults, user])
+    assert ini.getSectionsWithPrefix('prog', 'new window') == []
+    assert ini.getList('default', 'k') == ['user']
+    with pytest.raises(ValueError):
+        with ini.batch():
+            ini.set('prog new', 'z', '3')
+            ini.set('default', 'k', 'a; b')
+            assert ini.getSectionsWithPrefix('prog', 'new window') == ['prog new']
+            assert ini.getList('default', 'k') == ['a', 'b']
+            raise ValueError('abort')
+    assert ini.get() == ['prog title', 'default']
+    assert ini.getSectionsWithPrefix('prog', 'new window') == []
+    assert ini.getSectionPostfixesWithPrefix('prog') == ['title']
+    assert ini.getList('default', 'k') == ['user']
+
+
+def test_compile_schema(tmp_path):
+    """all declared values are converted at once, the result is read only
+    """
+    testPath = tmp_path/'schema.ini'
+    testPath.write_text('[general]\npause = 10\nwords = a; b\nmap = x: 1, 2\non = true\n\n'
+                        '[prog title]\nfactor = 2,5\nname = "quoted "\n')
+    ini = inivars.IniVars(testPath)
+    schema = {'general': {'pause': int, 'words': list, 'map': dict, 'on': bool,
+                          'missing': (int, 7), 'missing list': (list, ['x'])},
+              'prog title': {'factor': float, 'name': str}}
+    settings = ini.compileSchema(schema)
+    assert settings.general.pause == 10
+    assert settings.general.words == ('a', 'b')
+    assert settings.general.map['x'] == ('1', '2')
+    assert settings.general.on is True
+    assert settings.general.missing == 7
+    assert settings.general.missing_list == ('x',)
+    assert settings.prog_title.factor == 2.5
+    assert settings.prog_title.name == 'quoted '
+    with pytest.raises(AttributeError):
+        settings.general.pause = 11
+    with pytest.raises(TypeError):
+        settings.general.map['x'] = 'y'
+    ini.set('prog title', 'factor', 'large')
+    with pytest.raises(inivars.IniError):
+        ini.compileSchema(schema)
+    with pytest.raises(inivars.IniError):
+        ini.compileSchema({'general': {'pause': 'int'}})
+    with pytest.raises(inivars.IniError):
+        ini.compileSchema({'general': {'a b': int, 'a-b': int}})
+
+def test_compile_schema_optional_section(tmp_path):
+    """a missing section gets the defaults, also for float keys
+    """
+    testPath = tmp_path/'schema.ini'
+    testPath.write_text('[general]\npause = 10\n')
+    ini = inivars.IniVars(testPath)
+    settings = ini.compileSchema({'t': {'a': int, 'b': float, 'c': (float, 2.5), 'd': bool,
+                                        'e': str, 'f': list, 'g': dict}})
+    assert settings.t.a == 0
+    assert settings.t.b == 0.0
+    assert settings.t.c == 2.5
+    assert settings.t.d is False
+    assert settings.t.e == ''
+    assert settings.t.f == ()
+    assert not settings.t.g
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_load_many(processes):
+    """loadMany gives the same instances and errors (with line numbers) as loading one by one
+    """
+    files = sorted(testDir.glob('*.ini'))*3
+    sequential = {}
+    for f in files:
+        try:
+            sequential[f] = inivars.IniVars(f)
+        except inivars.IniError as exc:
+            sequential[f] = exc
+    loaded = inivars.IniVars.loadMany(files, workers=4, processes=processes, raiseErrors=False)
+    assert list(loaded) == list(sequential)
+    for f, ini in loaded.items():
+        expected = sequential[f]
+        if isinstance(expected, inivars.IniError):
+            assert isinstance(ini, inivars.IniError)
+            assert (ini.lineNum, ini.fileName, str(ini)) == (expected.lineNum, expected.fileName, str(expected))
+        else:
+            assert ini.toDict() == expected.toDict()
+    firstError = next(exc for exc in sequential.values() if isinstance(exc, inivars.IniError))
+    with pytest.raises(inivars.IniError) as excInfo:
+        inivars.IniVars.loadMany(files, workers=4, processes=processes)
+    assert str(excInfo.value) == str(firstError)
+
+
+def test_keys_ordered_from_sections(tmp_path):
+    """get(list of sections) and getKeysOrderedFromSections give each key once, in order
+    """
+    ini = inivars.IniVars(tmp_path/'ordered.ini')
+    expectedAll = []
+    for s in range(200):
+        for k in range(s % 7, 300, 3):
+            ini.set('prog %s'% s, 'key %s'% k, 'value')
+            if 'key %s'% k not in expectedAll:
+                expectedAll.append('key %s'% k)
+    sectionList = ini.get() + ['missing', 'prog 1']
+    assert ini.get(sectionList) == expectedAll
+    assert ini.get(['missing']) == []
+    D = ini.getKeysOrderedFromSections(ini.get() + ['missing'])
+    assert [k for keys in D.values() for k in keys] == expectedAll
+    assert D['prog 0'] == ini.get('prog 0')
+    assert D['missing'] == []
+
+
+def test_diff_apply(tmp_path):
+    """diff gives only the changed sections and keys, apply makes them, listeners see each change
+    """
+    lines = ['[prog %s]\nkey = {ctrl+%s}\nother = %s'% (i, i, i) for i in range(100)]
+    iniPath = tmp_path/'actions.ini'
+    iniPath.write_text('\n'.join(lines) + '\n')
+    old = inivars.IniVars(iniPath)
+    lines[5] = '[prog 5]\nkey = {alt+5}\nother = 5'
+    lines[6] = '[prog 6]\nkey = {ctrl+6}'
+    lines[7] = '[prog 7]\nkey = {ctrl+7}\nother = 7\nnew = yes'
+    del lines[8]
+    lines.append('[prog new]\nkey = {f1}')
+    iniPath.write_text('\n'.join(lines) + '\n')
+    new = inivars.IniVars(iniPath)
+
+    diff = old.diff(new)
+    assert diff.getSections() == {'prog 5', 'prog 6', 'prog 7', 'prog 8', 'prog new'}
+    assert diff.changedKeys == {'prog 5': {'key': ('{ctrl+5}', '{alt+5}')}}
+    assert diff.removedKeys == {'prog 6': ['other']}
+    assert diff.addedKeys == {'prog 7': {'new': 'yes'}}
+    assert diff.removedSections == ['prog 8']
+    assert diff.addedSections == {'prog new': {'key': '{f1}'}}
+    assert not new.diff(new)
+
+    assert old.getSectionsWithPrefix('prog', 'new window') == []
+    assert old.getList('prog 9', 'key') == ['{ctrl+9}']
+    changes = []
+    old.addChangeListener(lambda s, k: changes.append((s, k)))
+    old.apply(diff)
+    assert sorted(changes) == sorted(diff.getChanges())
+    assert old.toDict() == new.toDict()
+    assert old.getSectionsWithPrefix('prog', 'new window') == ['prog new']
+    assert old.getDecodedCacheInfo()['size'] == 1
+    old.writeIfChanged()
+    assert inivars.IniVars(iniPath).toDict() == new.toDict()
+
+    # layered: applied to the top layer, listeners of the merged view see the sections
+    defaults = tmp_path/'defaults.ini'
+    defaults.write_text('[general]\na = 1\nb = 2\n')
+    user = tmp_path/'user.ini'
+    user.write_text('[general]\na = 10\n')
+    layered = inivars.LayeredIniVars([defaults, user])
+    changes = []
+    layered.addChangeListener(lambda s, k: changes.append((s, k)))
+    layered.set('general', 'b', '20')
+    assert changes == [('general', None)]
+    target = inivars.IniVars(tmp_path/'target.ini', text='[general]\na = 10\nb = 20\nc = 30\n')
+    layered.apply(layered.diff(target))
+    assert layered.toDict() == target.toDict()
+    assert changes == [('general', None), ('general', None)]
+    assert layered.getLayers()[-1].toDict() == {'general': {'a': '10', 'b': '20', 'c': '30'}}
+
+
+def test_concurrent_readers(tmp_path):
+    """many readers and one writer: each snapshot is consistent, readers never fail
+    """
+    iniPath = tmp_path/'actions.ini'
+    lines = ['[prog %s]\nkey = {ctrl+%s}'% (i, i) for i in range(200)]
+    iniPath.write_text('[counter]\na = 0\nb = 0\n' + '\n'.join(lines) + '\n')
+    ini = inivars.IniVars.openConcurrent(iniPath)
+    stop = threading.Event()
+    errors = []
+    reads = []
+
+    def reader():
+        n = 0
+        try:
+            while not stop.is_set():
+                snap = ini.snapshot()
+                a, b = snap.getInt('counter', 'a'), snap.getInt('counter', 'b')
+                assert a == b, 'inconsistent snapshot: %s, %s'% (a, b)
+                extra = snap.getSectionsWithPrefix('extra')
+                assert len(extra) <= 1
+                if extra:
+                    assert extra == ['extra %s'% a]
+                assert ini.get(['prog 5', 'default'], 'key') == '{ctrl+5}'
+                n += 1
+        except Exception as exc:   #pylint:disable=W0703
+            errors.append(exc)
+        reads.append(n)
+
+    threads = [threading.Thread(target=reader) for _i in range(4)]
+    # the writer (with file writes in each batch) must get the GIL back soon:
+    switchInterval = sys.getswitchinterval()
+    sys.setswitchinterval(0.0001)
+    try:
+        for t in threads:
+            t.start()
+        for i in range(1, 50):
+            with ini.batch():
+                ini.set('counter', 'a', str(i))
+                ini.set('counter', 'b', str(i))
+                ini.delete('extra %s'% (i - 1))
+                ini.set('extra %s'% i, 'key', 'value')
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+        sys.setswitchinterval(switchInterval)
+    assert not errors
+    assert len(reads) == 4 and all(reads)
+    assert ini.getInt('counter', 'a') == 49
+    assert inivars.IniVars(iniPath).get('extra 49', 'key') == 'value'
+    with pytest.raises(inivars.IniError):
+        ini['counter']['a'] = '0'
     
 if __name__ == "__main__":
     pytest.main(['test_inivars.py'])
@@ -0,0 +1,73 @@
+"""
+This module tests the outputbackend module, the recording of the output of the actions
+"""
+from dtactions import outputbackend
+from dtactions.pausescheduler import PauseScheduler, FakeClock
+
+def test_recording_trace():
+    """the events are in order, the waits advance the time of the following events
+    """
+    clock = FakeClock()
+    backend = outputbackend.RecordingBackend(clock=clock)
+    scheduler = PauseScheduler(sleep=backend.sleep, clock=clock)
+    scheduler.begin('<<copy>>; W 0.2; {ctrl+v}')
+    backend.sendKeys('{ctrl+c}')
+    scheduler.wait(0.2)
+    scheduler.sync()
+    backend.sendKeys('{ctrl+v}')
+    backend.execScript('HeardWord "hello"')
+    backend.doMouse(0, 1, 10, 20)
+    scheduler.end()
+    assert [e.kind for e in backend.events] == ['keys', 'wait', 'keys', 'script', 'mouse']
+    assert [e.time for e in backend.events] == [0.0, 0.0, 0.2, 0.2, 0.2]
+    assert backend.getKeys() == '{ctrl+c}{ctrl+v}'
+    assert backend.getEvents('script') == [('HeardWord "hello"',)]
+    assert backend.getEvents('mouse') == [(0, 1, 10, 20, 'left', 1, 0)]
+    backend.clear()
+    assert backend.events == []
+
+def test_recording_clipboard():
+    """save and restore of the clipboard nest
+    """
+    backend = outputbackend.RecordingBackend()
+    backend.setClipboard('first')
+    backend.saveClipboard()
+    assert backend.getClipboard() == ''
+    backend.setClipboard('second')
+    backend.saveClipboard()
+    backend.restoreClipboard()
+    assert backend.getClipboard() == 'second'
+    backend.restoreClipboard()
+    assert backend.getClipboard() == 'first'
+    assert backend.getEvents('clipboard') == [('first',), ('second',)]
+
+def test_batching():
+    """the soft keystrokes of an action go in one call, other output and waits are boundaries
+    """
+    recorder = outputbackend.RecordingBackend()
+    batch = outputbackend.BatchingBackend(recorder)
+    batch.sendKeys('{esc}')             # outside an action: at once
+    assert recorder.getEvents('keys') == [('{esc}',)]
+    batch.begin()
+    batch.sendKeys('{home}')
+    batch.begin()                       # nested action
+    batch.sendKeys('{shift+end}')
+    batch.end()
+    assert len(recorder.events) == 1
+    batch.sendKeys('{ctrl+c}')
+    batch.sleep(0.1)
+    batch.sendKeys('x')
+    batch.sendKeys('')
+    batch.suspend()                     # a USC command
+    batch.sendKeys('{enter}')
+    batch.resume()
+    batch.doMouse(0, 1, 10, 10)
+    batch.sendKeys('y')
+    batch.sendKeys('z')
+    batch.end()
+    assert [(e.kind, e.args[0]) for e in recorder.events] == [
+        ('keys', '{esc}'), ('keys', '{home}{shift+end}{ctrl+c}'), ('wait', 0.1),
+        ('keys', 'x'), ('keys', '{enter}'), ('mouse', 0), ('keys', 'yz')]
+    assert batch.getMetrics() == {'keyEvents': 8, 'keyCalls': 5, 'outputCalls': 6, 'waits': 1}
+    batch.resetMetrics()
+    assert batch.getMetrics()['keyEvents'] == 0
@@ -0,0 +1,72 @@
+"""
+This module tests the pausescheduler module, the pauses of the actions of unimacroactions
+"""
+#pylint:disable = W0621
+import pytest
+
+from dtactions import actioncompiler
+from dtactions.pausescheduler import PauseScheduler, FakeClock
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def scheduler(clock):
+    return PauseScheduler(sleep=clock.sleep, clock=clock)
+
+def runAction(scheduler, compiler, action, pauseBA):
+    """do the steps as doStep does: sync before each step (not before a wait), settle after the settling ones"""
+    scheduler.begin(action)
+    for step in compiler.compile(action).steps:
+        if not (isinstance(step, actioncompiler.Command) and step.name == 'W'):
+            scheduler.sync()
+        if isinstance(step, actioncompiler.Command):
+            step.func(*(step.args or ()))
+        if compiler.settles(step):
+            scheduler.settle(pauseBA)
+    return scheduler.end()
+
+def test_no_pause_when_zero(scheduler, clock):
+    """pause between actions 0 is no wait at all (it was 0.1 seconds per part)
+    """
+    compiler = actioncompiler.ActionCompiler({}.get)
+    timing = runAction(scheduler, compiler, '{home}; {shift+end}; {ctrl+c}; {end}; {enter}', 0)
+    assert clock.sleeps == []
+    assert timing.idle == 0 and timing.sleeps == 0
+
+def test_pauses_merged(scheduler, clock):
+    """only after the settling steps, back to back pauses give one sleep, explicit waits add up
+    """
+    def do_W(t=None, **kw):
+        scheduler.wait(0.1 if t is None else t)
+        return 1
+    compiler = actioncompiler.ActionCompiler({'W': do_W}.get, settlingCommands=['TASK'])
+    runAction(scheduler, compiler, '{home}; {shift+end}; {end}', 0.2)
+    assert clock.sleeps == []
+    timing = runAction(scheduler, compiler, '{ctrl+c}; W 0.3; {alt+tab}; W 0; {ctrl+v}', 0.2)
+    assert clock.sleeps == [0.5, 0.2]
+    assert timing.sleeps == 2 and timing.idle == pytest.approx(0.7)
+    assert timing.working == pytest.approx(0)
+    assert len(scheduler.timings) == 2
+    assert '{alt+tab}' in scheduler.formatTimings(1)
+
+def test_outside_action(scheduler, clock):
+    """waits outside an action (eg do_W called by a grammar) are done at once
+    """
+    scheduler.wait(0.25)
+    scheduler.settle(0.1)
+    scheduler.wait(0)
+    assert clock.sleeps == [0.25, 0.1]
+
+def test_nested_actions(scheduler, clock):
+    """a nested action (doAction from a USC command) is part of the outer one
+    """
+    scheduler.begin('outer')
+    scheduler.begin('inner')
+    scheduler.settle(0.1)
+    assert scheduler.end() is None
+    assert clock.sleeps == []
+    timing = scheduler.end()
+    assert clock.sleeps == [0.1] and timing.action == 'outer'
+    assert scheduler.depth == 0